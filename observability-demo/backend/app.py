@@ -1,34 +1,113 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 import time
+import itertools
 import logging
 import os
 import random
 from datetime import datetime
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from telemetry import (
+    Exposition, Registry, RequestMetrics, admission_from_env, admit_flask_app, configure_logging,
+    exporter_for, flask_routes, history_flask_app, history_from_env, instrument_flask_app,
+    profile_flask_app, profiler_from_env, route_labels, runtime_from_env, trace_flask_app,
+    tracer_from_env,
 )
+
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
 # Environment variables
 APP_VERSION = os.getenv('APP_VERSION', '1.0.0')
-
-# Metrics tracking
-request_count = 0
-error_count = 0
-response_times = []
+LATENCY_WINDOW_SECONDS = int(os.getenv('LATENCY_WINDOW_SECONDS', '300'))
+API_DATA_MAX_AGE = int(os.getenv('API_DATA_MAX_AGE', '2'))
+API_BATCH_MAX_KEYS = int(os.getenv('API_BATCH_MAX_KEYS', '100'))
+# Simulated cost of each key after the first in /api/data/batch; the
+# 100-500ms request overhead of /api/data is paid once per batch
+API_ITEM_COST = float(os.getenv('API_ITEM_COST', '0.002'))
+
+# How long callers (the frontend's response cache) may reuse /api/data
+API_DATA_CACHE_CONTROL = f'public, max-age={API_DATA_MAX_AGE}' if API_DATA_MAX_AGE > 0 else 'no-store'
+
+# Metrics tracking - every metric lives in the registry and is safe to
+# update from any request thread
+metrics = Registry()
+# JSON log lines written by a background thread; LOG_SAMPLE / LOG_RATE_LIMIT
+# thin out per-route request logs, and drops are counted on /metrics
+configure_logging('backend', metrics)
+# Every request runs in a span continued from the caller's traceparent;
+# TRACE_SAMPLE_RATE / TRACE_EXPORT control what is recorded and where
+tracer = tracer_from_env('backend', metrics)
+trace_flask_app(app, tracer)
+# backend_requests_total, _errors_total (status 400 and up) and
+# _request_duration_seconds for every route, recorded by request hooks
+request_metrics = RequestMetrics(metrics, prefix='backend', error_status=400)
+instrument_flask_app(app, request_metrics, exemplar=tracer.exemplar)
+request_ids = itertools.count(1)
+# Per-route concurrency limits (per process) with load shedding: /api/slow may
+# hold at most 4 threads, so it cannot starve the cheap routes; requests over
+# a limit wait up to ADMISSION_QUEUE_TARGET_MS, then get 503 + Retry-After
+admission = admission_from_env(metrics, limits={'/api/slow': 4, '*': 64})
+admit_flask_app(app, admission)
+batch_keys = metrics.histogram('backend_batch_keys', 'Keys per /api/data/batch request',
+                               buckets=(1, 2, 5, 10, 25, 50, 100))
+metrics.gauge('backend_version', 'Backend version info', ['version']).labels(version=APP_VERSION).set(1)
+metrics.gauge('backend_uptime_seconds', 'Backend uptime in seconds').set_function(
+    lambda: time.time() - start_time)
+# No average response time gauge: each worker's own mean cannot be merged.
+# Use rate(backend_request_duration_seconds_sum) / rate(..._count).
+endpoint_latency = metrics.summary(
+    'backend_request_latency_seconds',
+    f'Backend request latency quantiles over the last {LATENCY_WINDOW_SECONDS}s',
+    ['endpoint'], window_seconds=LATENCY_WINDOW_SECONDS
+)
+request_metrics.listeners.append(
+    lambda endpoint, response_time, error: endpoint_latency.labels(endpoint=endpoint).observe(response_time))
+# Rate, error rate and latency quantiles per route for /api/stats/history
+stats_history = history_from_env(metrics)
+request_metrics.listeners.append(stats_history.observe)
 start_time = time.time()  # Track service start time
+# process_* (CPU, memory, fds, threads), python_gc_* and request thread pool usage
+runtime_metrics = runtime_from_env(metrics, busy=request_metrics.in_flight.value)
+
+ERROR_TYPES = [
+    ("Database timeout", 503),
+    ("Validation failed", 400),
+    ("Service unavailable", 503),
+    ("Internal error", 500)
+]
+
+# Under a pre-fork server (METRICS_MULTIPROC_DIR set) /metrics merges all workers
+metrics_exporter = exporter_for(metrics)
+# Scrapes within METRICS_CACHE_SECONDS of each other share one rendered body
+metrics_exposition = Exposition(
+    metrics_exporter, cache_seconds=float(os.getenv('METRICS_CACHE_SECONDS', '0')))
+# /debug/profile: stack samples of this process as collapsed stacks for
+# flamegraph tools; off unless PROFILE_TOKEN is set, see telemetry.profiler
+profiler = profiler_from_env(metrics)
+profile_flask_app(app, profiler)
+history_flask_app(app, stats_history)
+
+def processing_time(keys=1):
+    """Simulated work: a per-request overhead plus a small cost per extra key"""
+    return random.uniform(0.1, 0.5) + API_ITEM_COST * (keys - 1)
+
+def parse_batch_keys(raw):
+    """Distinct keys of a comma-separated list, in order; ValueError when empty or too long"""
+    keys = list(dict.fromkeys(key.strip() for key in (raw or '').split(',') if key.strip()))
+    if not keys:
+        raise ValueError("keys is required")
+    if len(keys) > API_BATCH_MAX_KEYS:
+        raise ValueError(f"at most {API_BATCH_MAX_KEYS} keys per batch")
+    return keys
+
+def data_item(key):
+    """One record of /api/data/batch"""
+    return {"key": key, "message": "Backend API Connected", "version": APP_VERSION}
 
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
-    global request_count
-    request_count += 1
-    
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
@@ -40,69 +119,76 @@ def health_check():
 @app.route('/api/data')
 def get_data():
     """Main API endpoint that frontend calls"""
-    global request_count, response_times
     start_time = time.time()
-    request_count += 1
     
     # Simulate some processing time
-    processing_time = random.uniform(0.1, 0.5)
-    time.sleep(processing_time)
+    time.sleep(processing_time())
     
     response_time = time.time() - start_time
-    response_times.append(response_time)
-    
-    logger.info(f"API request #{request_count} completed in {response_time:.3f}s")
+    request_id = next(request_ids)
+    trace_id = tracer.current().trace_id
+    logger.info("API request completed", extra={
+        'route': '/api/data', 'request_id': request_id, 'trace_id': trace_id,
+        'latency_ms': round(response_time * 1000, 2)})
     
     return jsonify({
         "message": "Backend API Connected",
         "timestamp": datetime.now().isoformat(),
         "version": APP_VERSION,
-        "request_id": request_count,
+        "request_id": request_id,
+        "trace_id": trace_id,
         "response_time_ms": round(response_time * 1000, 2),
         "status": "success"
-    })
+    }), 200, {'Cache-Control': API_DATA_CACHE_CONTROL}
+
+@app.route('/api/data/batch')
+def get_data_batch():
+    """Many /api/data records in one request, for ``?keys=a,b,c``.
+
+    The simulated request overhead is paid once for the whole batch, so
+    N keys cost far less than N calls to /api/data.
+    """
+    start_time = time.time()
+    try:
+        keys = parse_batch_keys(request.args.get('keys'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    time.sleep(processing_time(len(keys)))
+
+    response_time = time.time() - start_time
+    batch_keys.observe(len(keys))
+
+    request_id = next(request_ids)
+    trace_id = tracer.current().trace_id
+    logger.info("API batch completed", extra={
+        'route': '/api/data/batch', 'request_id': request_id, 'trace_id': trace_id,
+        'keys': len(keys), 'latency_ms': round(response_time * 1000, 2)})
+
+    return jsonify({
+        "items": [data_item(key) for key in keys],
+        "count": len(keys),
+        "timestamp": datetime.now().isoformat(),
+        "request_id": request_id,
+        "trace_id": trace_id,
+        "response_time_ms": round(response_time * 1000, 2),
+        "status": "success"
+    }), 200, {'Cache-Control': API_DATA_CACHE_CONTROL}
 
 @app.route('/metrics')
 def prometheus_metrics():
-    """Prometheus-compatible metrics endpoint - returns TEXT format"""
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-    
-    # Prometheus format metrics (must be text/plain content type)
-    metrics_text = f"""# HELP backend_requests_total Total backend requests
-# TYPE backend_requests_total counter
-backend_requests_total {request_count}
-
-# HELP backend_request_duration_seconds Backend request duration
-# TYPE backend_request_duration_seconds histogram
-backend_request_duration_seconds_sum {sum(response_times)}
-backend_request_duration_seconds_count {len(response_times)}
-
-# HELP backend_errors_total Total backend errors
-# TYPE backend_errors_total counter
-backend_errors_total {error_count}
-
-# HELP backend_version Backend version info
-# TYPE backend_version gauge
-backend_version{{version="{APP_VERSION}"}} 1
-
-# HELP backend_uptime_seconds Backend uptime in seconds
-# TYPE backend_uptime_seconds gauge
-backend_uptime_seconds {time.time()}
-
-# HELP backend_avg_response_time_seconds Average response time
-# TYPE backend_avg_response_time_seconds gauge
-backend_avg_response_time_seconds {avg_response_time}
-"""
-    
-    # IMPORTANT: Must return text/plain content type for Prometheus
-    return metrics_text, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    """Prometheus-compatible metrics endpoint.
+
+    Returns the Prometheus text format, or OpenMetrics (with exemplars and
+    _created samples) when the scraper asks for it, gzipped if accepted.
+    """
+    body, headers = metrics_exposition.respond(
+        request.headers.get('Accept'), request.headers.get('Accept-Encoding'))
+    return body, 200, headers
 
 @app.route('/api/slow')
 def slow_api():
     """Slow API endpoint for testing"""
-    global request_count
-    request_count += 1
-    
     # Simulate slow operation
     time.sleep(2)
     
@@ -115,26 +201,16 @@ def slow_api():
 @app.route('/api/error')
 def error_api():
     """Error API endpoint for testing"""
-    global request_count, error_count
-    request_count += 1
-    error_count += 1
-    
     # Random error simulation
-    error_types = [
-        ("Database timeout", 503),
-        ("Validation failed", 400),
-        ("Service unavailable", 503),
-        ("Internal error", 500)
-    ]
-    
-    error_msg, status_code = random.choice(error_types)
+    error_msg, status_code = random.choice(ERROR_TYPES)
     
-    logger.error(f"API error: {error_msg}")
+    logger.error("API error", extra={'route': '/api/error', 'error': error_msg, 'status': status_code})
     
     return jsonify({
         "error": error_msg,
         "timestamp": datetime.now().isoformat(),
-        "total_errors": error_count
+        # This request is recorded once its response is sent
+        "total_errors": request_metrics.total_errors() + 1
     }), status_code
 
 @app.route('/')
@@ -148,11 +224,18 @@ def root():
             "health": "/health",
             "metrics": "/metrics",
             "data": "/api/data",
+            "data_batch": "/api/data/batch?keys=a,b,c",
             "slow": "/api/slow", 
             "error": "/api/error"
         }
     })
 
+# Latency quantiles exported for every route before its first request
+for route in flask_routes(app):
+    endpoint_latency.labels(endpoint=route)
+# History keeps every route label, whatever the route count
+stats_history.reserve(route_labels(app))
+
 if __name__ == '__main__':
-    logger.info(f"Starting backend service version {APP_VERSION}")
+    logger.info("Starting backend service", extra={'version': APP_VERSION})
     app.run(host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
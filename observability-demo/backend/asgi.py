@@ -0,0 +1,164 @@
+"""Asyncio (ASGI) serving mode for the backend.
+
+Serves the same routes as the Flask app in app.py and shares its metrics
+registry and settings, but the simulated processing time of /api/data and
+/api/slow is awaited instead of sleeping in a worker thread. Capacity is
+then bounded by sockets and CPU rather than by workers x threads, which is
+what capacity tests that use this service as a stand-in dependency need.
+
+    cd backend && uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+import app as backend
+from telemetry import asgi_app, json_response, response_from
+
+logger = backend.logger
+
+
+async def health_check(request_headers, query):
+    return json_response({
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "version": backend.APP_VERSION,
+        "service": "backend-api",
+        "uptime": "operational"
+    })
+
+
+async def get_data(request_headers, query):
+    start_time = time.time()
+
+    # Simulated processing time; yields the event loop instead of a thread
+    await asyncio.sleep(backend.processing_time())
+
+    response_time = time.time() - start_time
+    request_id = next(backend.request_ids)
+    trace_id = backend.tracer.current().trace_id
+    logger.info("API request completed", extra={
+        'route': '/api/data', 'request_id': request_id, 'trace_id': trace_id,
+        'latency_ms': round(response_time * 1000, 2)})
+
+    return json_response({
+        "message": "Backend API Connected",
+        "timestamp": datetime.now().isoformat(),
+        "version": backend.APP_VERSION,
+        "request_id": request_id,
+        "trace_id": trace_id,
+        "response_time_ms": round(response_time * 1000, 2),
+        "status": "success"
+    }, headers={'cache-control': backend.API_DATA_CACHE_CONTROL})
+
+
+async def get_data_batch(request_headers, query):
+    start_time = time.time()
+    try:
+        keys = backend.parse_batch_keys(query.get('keys'))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    await asyncio.sleep(backend.processing_time(len(keys)))
+
+    response_time = time.time() - start_time
+    backend.batch_keys.observe(len(keys))
+
+    request_id = next(backend.request_ids)
+    trace_id = backend.tracer.current().trace_id
+    logger.info("API batch completed", extra={
+        'route': '/api/data/batch', 'request_id': request_id, 'trace_id': trace_id,
+        'keys': len(keys), 'latency_ms': round(response_time * 1000, 2)})
+
+    return json_response({
+        "items": [backend.data_item(key) for key in keys],
+        "count": len(keys),
+        "timestamp": datetime.now().isoformat(),
+        "request_id": request_id,
+        "trace_id": trace_id,
+        "response_time_ms": round(response_time * 1000, 2),
+        "status": "success"
+    }, headers={'cache-control': backend.API_DATA_CACHE_CONTROL})
+
+
+async def prometheus_metrics(request_headers, query):
+    body, headers = backend.metrics_exposition.respond(
+        request_headers.get('accept'), request_headers.get('accept-encoding'))
+    return response_from(body, 200, headers)
+
+
+async def debug_profile(request_headers, query):
+    """Samples from a worker thread, so the event loop's own stacks are captured"""
+    return response_from(*await asyncio.to_thread(
+        backend.profiler.respond, query, request_headers.get('authorization')))
+
+
+async def stats_history(request_headers, query):
+    return response_from(*backend.stats_history.respond(query))
+
+
+async def slow_api(request_headers, query):
+    await asyncio.sleep(2)
+
+    return json_response({
+        "message": "Slow API operation completed",
+        "delay_seconds": 2,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+async def error_api(request_headers, query):
+    error_msg, status_code = random.choice(backend.ERROR_TYPES)
+
+    logger.error("API error", extra={'route': '/api/error', 'error': error_msg, 'status': status_code})
+
+    return json_response({
+        "error": error_msg,
+        "timestamp": datetime.now().isoformat(),
+        # This request is recorded once its response is sent
+        "total_errors": backend.request_metrics.total_errors() + 1
+    }, status_code)
+
+
+async def root(request_headers, query):
+    return json_response({
+        "service": "Observability Demo Backend",
+        "version": backend.APP_VERSION,
+        "status": "running",
+        "endpoints": {
+            "health": "/health",
+            "metrics": "/metrics",
+            "data": "/api/data",
+            "data_batch": "/api/data/batch?keys=a,b,c",
+            "slow": "/api/slow",
+            "error": "/api/error"
+        }
+    })
+
+
+ROUTES = {
+    '/': root,
+    '/health': health_check,
+    '/metrics': prometheus_metrics,
+    '/api/data': get_data,
+    '/api/data/batch': get_data_batch,
+    '/api/slow': slow_api,
+    '/api/error': error_api,
+    '/debug/profile': debug_profile,
+    '/api/stats/history': stats_history,
+}
+
+
+async def startup():
+    logger.info("Starting async backend service", extra={'version': backend.APP_VERSION})
+
+
+app = asgi_app(ROUTES, backend.request_metrics, backend.tracer, logger, startup=startup)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT', '5001')),
+                backlog=16384, log_level='warning')
@@ -0,0 +1,93 @@
+"""Benchmark: keyed backend lookups one call each vs micro-batched.
+
+Starts the async backend (asgi.py) on a local port, then runs ``--callers``
+threads that look up random keys back to back through one BackendClient
+with a ``--pool-size`` connection pool, as the frontend's request threads
+do. In ``single`` mode every lookup is its own /api/data/batch call; in
+``batched`` mode lookups go through a MicroBatcher, so concurrent ones
+share a call. Reports lookups per second, backend calls made and latency.
+
+The backend's simulated 100-500 ms overhead is paid per call, so with
+single calls the pool caps throughput at about pool size / 0.3 s.
+
+    PYTHONPATH=. python benchmarks/bench_batching.py --callers 50 --pool-size 4
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'frontend'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from backend_client import BackendClient  # noqa: E402
+from batching import MicroBatcher  # noqa: E402
+from bench_concurrency import percentile, start_server, stop_server  # noqa: E402
+
+
+def run_mode(mode, base_url, args):
+    client = BackendClient(base_url, pool_size=args.pool_size, retries=0)
+    calls = [0]
+
+    def load_batch(keys):
+        calls[0] += 1
+        response = client.get('/api/data/batch', params={'keys': ','.join(keys)})
+        response.raise_for_status()
+        return {item['key']: item for item in response.json()['items']}
+
+    batcher = MicroBatcher(load_batch, window=args.window_ms / 1000, max_batch=args.max_batch)
+    lookup = batcher.get if mode == 'batched' else (lambda key: load_batch([key])[key])
+    latencies, failures = [], [0]
+    deadline = time.perf_counter() + args.duration
+
+    def caller():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                lookup(f'key-{random.randrange(args.keys)}')
+            except Exception:
+                failures[0] += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=caller) for _ in range(args.callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client.close()
+    return sorted(latencies), calls[0], failures[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='single,batched', help='comma separated: single, batched')
+    parser.add_argument('--callers', type=int, default=50, help='concurrent request threads')
+    parser.add_argument('--pool-size', type=int, default=4, help='backend connections')
+    parser.add_argument('--keys', type=int, default=1000, help='distinct keys looked up')
+    parser.add_argument('--window-ms', type=float, default=2.0, help='batch window')
+    parser.add_argument('--max-batch', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per mode')
+    args = parser.parse_args()
+
+    print(f"{args.callers} callers, {args.pool_size} connections, {args.duration:g}s per mode")
+    print(f"{'mode':<8} {'lookups/s':>10} {'calls':>7} {'keys/call':>10} {'p50 ms':>9} {'p99 ms':>9} {'failed':>7}")
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        process, port = start_server('async', 1, 1, metrics_dir)
+        try:
+            for mode in args.modes.split(','):
+                latencies, calls, failed = run_mode(mode, f'http://127.0.0.1:{port}', args)
+                print(f"{mode:<8} {len(latencies) / args.duration:>10.1f} {calls:>7} "
+                      f"{len(latencies) / max(calls, 1):>10.1f} "
+                      f"{percentile(latencies, 0.5) * 1000:>9.1f} "
+                      f"{percentile(latencies, 0.99) * 1000:>9.1f} {failed:>7}")
+        finally:
+            stop_server(process)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Benchmark: backend throughput versus concurrency, threaded vs asyncio.
+
+Starts the backend twice on local ports, once under gunicorn with gthread
+workers (app.py) and once under uvicorn (asgi.py). For each concurrency
+level it holds that many keep-alive connections open, each sending requests
+back to back for a fixed time. It then reports completed requests per
+second, latency and failures.
+
+With 0.1-0.5 s of simulated work per /api/data call, the threaded server
+tops out at workers x threads / 0.3 s however many clients wait. The async
+server keeps scaling until it runs out of CPU or sockets.
+
+    PYTHONPATH=. python benchmarks/bench_concurrency.py --concurrency 10,100,1000,5000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / 'backend'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                '--threads', str(threads), '--backlog', '16384', 'app:app']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+            '--port', str(port), '--backlog', '16384', '--log-level', 'warning']
+
+
+def start_server(mode, workers, threads, metrics_dir):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=str(ROOT), METRICS_MULTIPROC_DIR=metrics_dir)
+    process = subprocess.Popen(server_command(mode, port, workers, threads), cwd=BACKEND_DIR,
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start on port {port}")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length, close = 0, False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection' and value.strip().lower() == b'close':
+            close = True
+    await reader.readexactly(length)
+    return status, close
+
+
+async def client(port, path, deadline, timeout, results):
+    """Send requests back to back on one keep-alive connection until ``deadline``"""
+    request = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n'.encode()
+    writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection('127.0.0.1', port), timeout)
+            writer.write(request)
+            status, close = await asyncio.wait_for(read_response(reader), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            results['failed'] += 1
+            if writer is not None:
+                writer.close()
+                writer = None
+            await asyncio.sleep(0.05)
+            continue
+        if time.perf_counter() <= deadline:
+            results['latencies'].append(time.perf_counter() - started)
+            if status >= 500:
+                results['failed'] += 1
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_level(port, path, concurrency, duration, timeout):
+    results = {'latencies': [], 'failed': 0}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(port, path, deadline, timeout, results) for _ in range(concurrency)))
+    return results
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='sync,async', help='comma separated: sync, async')
+    parser.add_argument('--concurrency', default='10,100,1000',
+                        help='comma separated connection counts')
+    parser.add_argument('--path', default='/api/data')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per level')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='gunicorn workers (sync)')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker (sync)')
+    args = parser.parse_args()
+
+    fd_limit = raise_fd_limit()
+    levels = [int(c) for c in args.concurrency.split(',')]
+    if max(levels) + 64 > fd_limit:
+        print(f"warning: open file limit is {fd_limit}, high levels will fail to connect")
+
+    print(f"{args.path}, {args.duration:g}s per level; sync = {args.workers} workers x {args.threads} threads")
+    print(f"{'mode':<6} {'conc':>6} {'done':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'failed':>7}")
+    for mode in args.modes.split(','):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            process, port = start_server(mode, args.workers, args.threads, metrics_dir)
+            try:
+                for concurrency in levels:
+                    results = asyncio.run(
+                        run_level(port, args.path, concurrency, args.duration, args.timeout))
+                    latencies = sorted(results['latencies'])
+                    print(f"{mode:<6} {concurrency:>6} {len(latencies):>8} "
+                          f"{len(latencies) / args.duration:>9.1f} "
+                          f"{percentile(latencies, 0.5) * 1000:>9.1f} "
+                          f"{percentile(latencies, 0.99) * 1000:>9.1f} {results['failed']:>7}")
+            finally:
+                stop_server(process)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""Endpoint benchmark suite for both services, with regression checks.
+
+``run`` measures every route of both Flask apps and writes the results as
+JSON. The metrics are throughput, p50/p99 latency, memory allocated per
+request, memory retained per request and RSS growth over the run.
+``compare`` diffs two result files and exits non-zero when a route
+regressed by more than a threshold.
+
+Modes:
+  inprocess  requests go through Flask's test client (no sockets)
+  socket     each app is served by a threaded Werkzeug server on a local
+             port and requests go over real HTTP connections
+
+Allocation figures are always taken by calling the WSGI app directly, so
+server plumbing does not drown them: the Werkzeug dev server alone
+allocates a transient ~10 MB buffer per request.
+
+The frontend's backend is a local stub server (instant /api/data,
+/api/data/batch and /health, ``--stub-delay`` to slow it down) unless ``--backend-url`` points
+it at a real backend.
+
+    PYTHONPATH=. python benchmarks/bench_endpoints.py run --mode inprocess --output base.json
+    PYTHONPATH=. python benchmarks/bench_endpoints.py run --mode inprocess --output new.json
+    PYTHONPATH=. python benchmarks/bench_endpoints.py compare base.json new.json --threshold 10
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from stress_counters import load_app  # noqa: E402
+
+ROUTES = {
+    'frontend': ('/', '/?key=demo', '/health', '/metrics'),
+    'backend': ('/health', '/metrics', '/api/data', '/api/slow', '/api/error'),
+}
+
+# metric: (higher is better, noise floor below which changes are ignored)
+METRICS = {
+    'throughput_rps': (True, 0.0),
+    'p50_ms': (False, 0.1),
+    'p99_ms': (False, 0.1),
+    'alloc_kib_per_request': (False, 1.0),
+    'retained_bytes_per_request': (False, 512.0),
+    'rss_growth_kib': (False, 1024.0),
+}
+
+
+class StubBackend(BaseHTTPRequestHandler):
+    """Stand-in for the backend: answers /api/data(/batch) and /health after ``delay`` seconds"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, keep-alive
+    # clients stall ~40 ms per call on delayed ACKs
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        url = urlsplit(self.path)
+        if url.path == '/api/data':
+            body = {"message": "Backend API Connected (stub)", "status": "success"}
+        elif url.path == '/api/data/batch':
+            keys = parse_qs(url.query).get('keys', [''])[0].split(',')
+            body = {"items": [{"key": key, "message": "Backend API Connected (stub)"} for key in keys],
+                    "count": len(keys), "status": "success"}
+        elif self.path == '/health':
+            body = {"status": "healthy", "service": "backend-stub"}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_in_thread(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def start_stub_backend(delay):
+    handler = type('ConfiguredStub', (StubBackend,), {'delay': delay})
+    server = serve_in_thread(ThreadingHTTPServer(('127.0.0.1', 0), handler))
+    return f'http://127.0.0.1:{server.server_address[1]}', server
+
+
+def rss_kib():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        # ru_maxrss is a high-water mark, but better than nothing off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class InProcessTarget:
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        test_client = self.app.test_client()
+        return lambda path: test_client.get(path).status_code
+
+    def close(self):
+        pass
+
+
+class SocketTarget:
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.app = app
+        self.server = serve_in_thread(make_server('127.0.0.1', 0, app, threaded=True))
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def client(self):
+        import requests
+        session = requests.Session()
+        return lambda path: session.get(self.base_url + path, timeout=30).status_code
+
+    def close(self):
+        self.server.shutdown()
+
+
+def timed_run(target, path, concurrency, duration):
+    """Closed loop: ``concurrency`` threads send back to back for ``duration`` seconds"""
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(index):
+        send = target.client()
+        barrier.wait()
+        own = latencies[index]
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                send(path)
+            except Exception:
+                errors[index] += 1
+                continue
+            own.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    deadline[0] = time.perf_counter() + duration
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    merged = sorted(x for own in latencies for x in own)
+    return merged, sum(errors), elapsed
+
+
+def allocation_run(target, path, max_requests, max_seconds):
+    """Traced memory allocated (peak) and retained per request, sequentially"""
+    send = target.client()
+    send(path)
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        allocated = 0
+        count = 0
+        deadline = time.perf_counter() + max_seconds
+        while count < max_requests and (count == 0 or time.perf_counter() < deadline):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            send(path)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - before
+            count += 1
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return allocated / count / 1024, (current - baseline) / count
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def bench_route(target, path, args):
+    if args.warmup:
+        timed_run(target, path, args.concurrency, args.warmup)
+    rss_before = rss_kib()
+    latencies, errors, elapsed = timed_run(target, path, args.concurrency, args.duration)
+    rss_after = rss_kib()
+    alloc_kib, retained = allocation_run(InProcessTarget(target.app), path,
+                                         args.alloc_requests, args.alloc_seconds)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'alloc_kib_per_request': round(alloc_kib, 2),
+        'retained_bytes_per_request': round(retained, 1),
+        'rss_growth_kib': rss_after - rss_before,
+    }
+
+
+def load_services(args):
+    """Import both apps with benchmark-friendly settings"""
+    os.environ.pop('METRICS_MULTIPROC_DIR', None)
+    os.environ['LOADGEN_RATE'] = '0'
+    os.environ['BACKEND_RETRIES'] = '0'
+    stub = None
+    if args.backend_url:
+        os.environ['BACKEND_URL'] = args.backend_url
+    else:
+        url, stub = start_stub_backend(args.stub_delay / 1000)
+        os.environ['BACKEND_URL'] = url
+    apps = {
+        'backend': load_app('backend_app', 'backend/app.py').app,
+        'frontend': load_app('frontend_app', 'frontend/app.py').app,
+    }
+    # Keep the apps' log formatting cost but not the console flood
+    devnull = open(os.devnull, 'w')
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(devnull)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    return apps, stub
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def selected_routes(spec):
+    if not spec:
+        return [(service, path) for service, paths in ROUTES.items() for path in paths]
+    routes = []
+    for item in spec.split(','):
+        service, _, path = item.partition(':')
+        if service not in ROUTES or path not in ROUTES[service]:
+            raise SystemExit(f"Unknown route {item!r}; use service:path, e.g. backend:/api/data")
+        routes.append((service, path))
+    return routes
+
+
+def run(args):
+    routes = selected_routes(args.routes)
+    apps, stub = load_services(args)
+    target_class = InProcessTarget if args.mode == 'inprocess' else SocketTarget
+    targets = {service: target_class(app) for service, app in apps.items()}
+    results = {}
+    started_rss = rss_kib()
+    try:
+        for service, path in routes:
+            key = f'{service} {path}'
+            results[key] = bench_route(targets[service], path, args)
+            r = results[key]
+            print(f"  {key:<22} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>9.3f} ms  "
+                  f"p99 {r['p99_ms']:>9.3f} ms  {r['alloc_kib_per_request']:>8.1f} KiB/req  "
+                  f"rss {r['rss_growth_kib']:>+6} KiB", file=sys.stderr)
+    finally:
+        for target in targets.values():
+            target.close()
+        if stub is not None:
+            stub.shutdown()
+
+    document = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'mode': args.mode,
+            'backend': args.backend_url or f'stub (delay {args.stub_delay:g} ms)',
+            'concurrency': args.concurrency,
+            'duration_seconds': args.duration,
+            'total_rss_growth_kib': rss_kib() - started_rss,
+        },
+        'results': results,
+    }
+    text = json.dumps(document, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def parse_thresholds(items, default):
+    thresholds = dict.fromkeys(METRICS, default)
+    for item in items or ():
+        metric, _, value = item.partition('=')
+        if metric not in METRICS:
+            raise SystemExit(f"Unknown metric {metric!r}; choose from {', '.join(METRICS)}")
+        thresholds[metric] = float(value)
+    return thresholds
+
+
+def compare(args):
+    baseline = json.loads(Path(args.baseline).read_text())
+    base = baseline['results']
+    candidate = json.loads(Path(args.candidate).read_text())
+    new = candidate['results']
+    for setting in ('mode', 'backend', 'concurrency', 'duration_seconds', 'cpus'):
+        old_setting = baseline['meta'].get(setting)
+        if old_setting != candidate['meta'].get(setting):
+            print(f"warning: {setting} differs ({old_setting} vs {candidate['meta'].get(setting)}), "
+                  f"results may not be comparable")
+    thresholds = parse_thresholds(args.metric_threshold, args.threshold)
+    regressions = []
+    print(f"{'route':<22} {'metric':<27} {'baseline':>11} {'candidate':>11} {'change':>8}")
+    for route in sorted(base.keys() & new.keys()):
+        for metric, (higher_is_better, floor) in METRICS.items():
+            old_value, new_value = base[route].get(metric), new[route].get(metric)
+            if old_value is None or new_value is None:
+                continue
+            delta = new_value - old_value
+            change = delta / abs(old_value) * 100 if old_value else (0.0 if not delta else float('inf'))
+            worse = -change if higher_is_better else change
+            regressed = abs(delta) > floor and worse > thresholds[metric]
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{route:<22} {metric:<27} {old_value:>11} {new_value:>11} {change:>+7.1f}%{flag}")
+            if regressed:
+                regressions.append(f'{route} {metric}')
+    for route in sorted(base.keys() - new.keys()):
+        print(f"{route:<22} missing from {args.candidate}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo regressions beyond thresholds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='benchmark routes and write JSON results')
+    run_parser.add_argument('--mode', choices=('inprocess', 'socket'), default='inprocess')
+    run_parser.add_argument('--routes', help='comma separated service:path, default every route')
+    run_parser.add_argument('--concurrency', type=int, default=8, help='client threads per route')
+    run_parser.add_argument('--duration', type=float, default=5.0, help='measured seconds per route')
+    run_parser.add_argument('--warmup', type=float, default=1.0, help='unmeasured seconds per route')
+    run_parser.add_argument('--alloc-requests', type=int, default=200,
+                            help='requests traced for allocation figures')
+    run_parser.add_argument('--alloc-seconds', type=float, default=3.0,
+                            help='time cap for the traced requests of one route')
+    run_parser.add_argument('--backend-url', help='real backend for the frontend instead of the stub')
+    run_parser.add_argument('--stub-delay', type=float, default=0.0, help='stub backend delay in ms')
+    run_parser.add_argument('--output', help='write JSON here instead of stdout')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='fail when candidate regresses vs baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help='allowed change in percent, for every metric')
+    compare_parser.add_argument('--metric-threshold', action='append', metavar='METRIC=PERCENT',
+                                help='per-metric override, e.g. p99_ms=25 (repeatable)')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark: backend client tail latency with fixed timeouts, adaptive timeouts and hedging.
+
+Runs a local stub backend whose /api/data answers in ``--base-ms`` (plus
+jitter), except for a ``--slow-fraction`` of calls that take
+``--slow-ms``, like a backend with occasional GC pauses or a bad
+replica. ``--callers`` threads then call it through a BackendClient for
+each mode and report latency percentiles, failures and how many extra
+requests the backend saw.
+
+    PYTHONPATH=. python benchmarks/bench_hedging.py --slow-fraction 0.02 --slow-ms 1500
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'frontend'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from backend_client import BackendClient, PoolMetrics  # noqa: E402
+from bench_concurrency import percentile  # noqa: E402
+from telemetry import Registry  # noqa: E402
+
+MODES = {
+    'fixed': {},
+    'adaptive': {'adaptive_paths': ('/api/data',)},
+    'hedged': {'adaptive_paths': ('/api/data',), 'hedge_paths': ('/api/data',)},
+}
+
+
+def start_stub(base, slow, slow_fraction):
+    served = [0]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            served[0] += 1
+            slow_call = random.random() < slow_fraction
+            time.sleep(slow if slow_call else base * random.uniform(0.5, 1.5))
+            payload = json.dumps({"message": "Backend API Connected (stub)"}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.handle_error = lambda request, client_address: None  # cancelled hedges hang up early
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, served
+
+
+def run_mode(mode, base_url, served, args):
+    registry = Registry()
+    client = BackendClient(base_url, pool_size=args.callers * 2, timeouts={'/api/data': 5.0},
+                           retries=0, metrics=PoolMetrics(registry), hedge_budget=args.budget,
+                           **MODES[mode])
+    # Warm up the latency window so deadlines and hedge delays are in force
+    for _ in range(50):
+        client.fetch('/api/data').close()
+    served_before = served[0]
+    latencies, failures = [], [0]
+    deadline = time.perf_counter() + args.duration
+
+    def caller():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                client.fetch('/api/data').close()
+            except Exception:
+                failures[0] += 1
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=caller) for _ in range(args.callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    time.sleep(args.slow_ms / 1000)  # let losing hedges reach the stub's count
+    client.close()
+
+    counts = {name: sum(child.value() for _, child in family.items())
+              for name, family in (('hedges', client.metrics.hedges), ('wins', client.metrics.hedge_wins))}
+    latencies.sort()
+    extra = served[0] - served_before - len(latencies)
+    return latencies, failures[0], counts, extra
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='fixed,adaptive,hedged', help='comma separated: ' + ', '.join(MODES))
+    parser.add_argument('--callers', type=int, default=8, help='concurrent calling threads')
+    parser.add_argument('--base-ms', type=float, default=20.0, help='typical backend latency')
+    parser.add_argument('--slow-ms', type=float, default=1500.0, help='latency of slow calls')
+    parser.add_argument('--slow-fraction', type=float, default=0.02, help='share of slow calls')
+    parser.add_argument('--budget', type=float, default=0.05, help='hedge budget, fraction of calls')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per mode')
+    args = parser.parse_args()
+
+    server, served = start_stub(args.base_ms / 1000, args.slow_ms / 1000, args.slow_fraction)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f"{args.callers} callers; backend {args.base_ms:g} ms, {args.slow_fraction:.1%} of calls "
+          f"{args.slow_ms:g} ms; hedge budget {args.budget:.0%}")
+    print(f"{'mode':<9} {'calls':>7} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'max ms':>8} "
+          f"{'failed':>7} {'hedges':>7} {'wins':>6} {'extra load':>11}")
+    try:
+        for mode in args.modes.split(','):
+            latencies, failed, counts, extra = run_mode(mode, base_url, served, args)
+            print(f"{mode:<9} {len(latencies):>7} {percentile(latencies, 0.5) * 1000:>8.1f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.1f} {percentile(latencies, 0.999) * 1000:>9.1f} "
+                  f"{latencies[-1] * 1000:>8.1f} {failed:>7} {counts['hedges']:>7} {counts['wins']:>6} "
+                  f"{extra / max(len(latencies), 1):>11.1%}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
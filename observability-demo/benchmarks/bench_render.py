@@ -0,0 +1,83 @@
+"""Micro-benchmark: per-request cost of rendering the frontend dashboard.
+
+Compares the old approach (the whole page, CSS included, passed to
+render_template_string on every request) with the precompiled template
+the frontend now renders, with and without gzip.
+
+    PYTHONPATH=. python benchmarks/bench_render.py --iterations 2000
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from stress_counters import load_app  # noqa: E402
+
+
+def sample_context():
+    endpoints = ('/', '/health', '/metrics', '/slow', '/error')
+    return dict(
+        version='1.0.0',
+        current_time='12:00:00',
+        req_count=12345,
+        backend_info='Backend API Connected',
+        avg_response=123.45,
+        error_count=3,
+        endpoint_stats={e: {'count': 10, 'errors': 0, 'avg_time': 0.1, 'windows': {
+            w: {'count': 10, 'errors': 0, 'sum': 1.0, 'mean': 0.1, 'max': 0.2,
+                'rate': 0.5, 'error_rate': 0.0} for w in ('1m', '5m', '15m')}}
+            for e in endpoints},
+        latency={e: {'p50': 1.0, 'p90': 2.0, 'p99': 3.0, 'p999': 4.0} for e in endpoints},
+    )
+
+
+def legacy_template(frontend):
+    """Rebuild the single inline template the frontend used to re-parse per request"""
+    root = Path(frontend.app.root_path)
+    page = (root / 'templates' / 'dashboard.html').read_text()
+    css = (root / 'static' / 'dashboard.css').read_text()
+    return page.replace('<link rel="stylesheet" href="{{ css_url }}">', f'<style>\n{css}</style>')
+
+
+def timed(label, iterations, fn):
+    fn()  # warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        size = len(fn())
+    elapsed = time.perf_counter() - started
+    per_call = elapsed / iterations * 1e6
+    print(f"  {label:<40} {per_call:9.1f} us/request  {size:>7} bytes")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('BACKEND_URL', 'http://127.0.0.1:9')
+    frontend = load_app('frontend_app', 'frontend/app.py')
+    from flask import render_template_string
+
+    context = sample_context()
+    inline = legacy_template(frontend)
+    with frontend.app.test_request_context('/'):
+        print(f"dashboard render ({args.iterations} iterations)")
+        before = timed('render_template_string (before)', args.iterations,
+                       lambda: render_template_string(inline, **context))
+        after = timed('precompiled template (after)', args.iterations,
+                      lambda: frontend.dashboard_template.render(css_url=frontend.CSS_URL, **context))
+        timed('precompiled template + gzip', args.iterations,
+              lambda: gzip.compress(frontend.dashboard_template.render(
+                  css_url=frontend.CSS_URL, **context).encode(), compresslevel=6))
+    print(f"speed-up: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
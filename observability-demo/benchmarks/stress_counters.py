@@ -0,0 +1,141 @@
+"""Hammer both services from many threads and check no metric updates are lost.
+
+Runs the Flask apps in-process with their test clients, so no containers are
+needed. Exits non-zero if any counter or histogram total disagrees with the
+number of requests that were actually sent.
+
+    PYTHONPATH=. python benchmarks/stress_counters.py --threads 32 --requests 500
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from telemetry import Counter, Histogram  # noqa: E402
+
+
+def load_app(name, relative_path):
+    """Import a service's app.py under a unique module name"""
+    service_dir = str((ROOT / relative_path).parent)
+    if service_dir not in sys.path:
+        sys.path.insert(0, service_dir)
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def hammer(threads, per_thread, work):
+    """Run ``work(client_index)`` ``per_thread`` times on each of ``threads`` threads"""
+    barrier = threading.Barrier(threads)
+
+    def run(index):
+        barrier.wait()
+        for _ in range(per_thread):
+            work(index)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+def check(label, actual, expected, failures):
+    status = 'ok' if actual == expected else 'MISMATCH'
+    print(f"  {label:<45} {actual:>10} (expected {expected}) {status}")
+    if actual != expected:
+        failures.append(label)
+
+
+def duration_count(request_metrics):
+    """Observations in a RequestMetrics duration histogram, over every route"""
+    return sum(child.count for _, child in request_metrics.duration.items())
+
+
+def stress_primitives(threads, per_thread, failures):
+    print("telemetry primitives")
+    counter, histogram = Counter(), Histogram()
+
+    def work(_):
+        counter.inc()
+        histogram.observe(0.01)
+
+    hammer(threads, per_thread, work)
+    total = threads * per_thread
+    check('Counter.value()', counter.value(), total, failures)
+    check('Histogram.count', histogram.count, total, failures)
+
+
+def stress_backend(threads, per_thread, failures):
+    print("backend")
+    backend = load_app('backend_app', 'backend/app.py')
+    clients = [backend.app.test_client() for _ in range(threads)]
+
+    def work(index):
+        clients[index].get('/health')
+        clients[index].get('/api/error')
+
+    hammer(threads, per_thread, work)
+    total = threads * per_thread
+    by_endpoint = backend.request_metrics.by_endpoint()
+    check('backend_requests_total', backend.request_metrics.total(), 2 * total, failures)
+    check('backend_requests_total{endpoint="/health"}', by_endpoint['/health'][0], total, failures)
+    check('backend_errors_total', backend.request_metrics.total_errors(), total, failures)
+    check('backend_request_duration_seconds_count', duration_count(backend.request_metrics), 2 * total,
+          failures)
+
+
+def stress_frontend(threads, per_thread, failures):
+    print("frontend")
+    frontend = load_app('frontend_app', 'frontend/app.py')
+    clients = [frontend.app.test_client() for _ in range(threads)]
+
+    def work(index):
+        clients[index].get('/')
+        clients[index].get('/error')
+
+    hammer(threads, per_thread, work)
+    total = threads * per_thread
+    stats = frontend.endpoint_stats()
+    check('http_requests_total', frontend.request_metrics.total(), 2 * total, failures)
+    check('http_errors_total', frontend.request_metrics.total_errors(), total, failures)
+    check('http_requests_total{endpoint="/"}', stats['/']['count'], total, failures)
+    check('http_requests_total{endpoint="/error"}', stats['/error']['count'], total, failures)
+    check('endpoint_window_requests{endpoint="/error",window="1m"}',
+          stats['/error']['windows']['1m']['count'], total, failures)
+    check('http_request_duration_seconds_count', duration_count(frontend.request_metrics), 2 * total,
+          failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=200, help='requests per thread')
+    args = parser.parse_args()
+
+    # Point the frontend at a closed port so backend calls fail fast, and
+    # switch threads as often as possible to provoke lost updates.
+    os.environ.setdefault('BACKEND_URL', 'http://127.0.0.1:9')
+    os.environ.setdefault('BACKEND_RETRIES', '0')
+    sys.setswitchinterval(1e-6)
+
+    failures = []
+    stress_primitives(args.threads, args.requests * 10, failures)
+    stress_backend(args.threads, args.requests, failures)
+    stress_frontend(args.threads, args.requests, failures)
+
+    if failures:
+        print(f"FAILED: {', '.join(failures)}")
+        sys.exit(1)
+    print("All totals match")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,488 +1,390 @@
-from flask import Flask, render_template_string, request, jsonify
-import requests
+from flask import Flask, Response, request, jsonify
 import time
 import logging
 import os
-import threading
+import fcntl
+import hashlib
+import itertools
 import random
+import threading
 from datetime import datetime
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from telemetry import (
+    DEFAULT_WINDOWS, Exposition, Registry, RequestMetrics, SlidingWindowStats, admission_from_env,
+    admit_flask_app, configure_logging, exporter_for, flask_routes, history_flask_app,
+    history_from_env, instrument_flask_app, profile_flask_app, profiler_from_env, route_labels,
+    runtime_from_env, trace_flask_app, tracer_from_env, window_label,
 )
+from backend_client import BackendClient, PoolMetrics
+from batching import BatchMetrics, MicroBatcher
+from compression import init_compression
+from health_prober import HealthProber
+from live_stats import StatsPublisher, StreamFull
+from loadgen import DEFAULT_MIX, LoadGenerator, LoadMetrics, parse_mix
+from response_cache import CacheMetrics, ResponseCache
+
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+init_compression(app)
 
 # Environment variables
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://backend:5001')
 APP_VERSION = os.getenv('APP_VERSION', '1.0.0')
+LATENCY_WINDOW_SECONDS = int(os.getenv('LATENCY_WINDOW_SECONDS', '300'))
+BACKEND_POOL_SIZE = int(os.getenv('BACKEND_POOL_SIZE', '20'))
+BACKEND_RETRIES = int(os.getenv('BACKEND_RETRIES', '2'))
+BACKEND_CACHE_TTL = float(os.getenv('BACKEND_CACHE_TTL', '2'))
+BACKEND_CACHE_SIZE = int(os.getenv('BACKEND_CACHE_SIZE', '256'))
+# Data calls get read timeouts of 3x their recent p99, capped at the
+# configured values, and are hedged when still unanswered at their p95;
+# duplicates are limited to BACKEND_HEDGE_BUDGET of calls (0 disables)
+BACKEND_ADAPTIVE_TIMEOUTS = os.getenv('BACKEND_ADAPTIVE_TIMEOUTS', '1') not in ('0', 'false', 'no')
+BACKEND_HEDGE_BUDGET = float(os.getenv('BACKEND_HEDGE_BUDGET', '0.05'))
+BACKEND_DATA_PATHS = ('/api/data', '/api/data/batch')
+# Keyed page views (/?key=...) wait up to BACKEND_BATCH_WINDOW_MS for other
+# lookups and fetch them together from /api/data/batch
+BACKEND_BATCH_WINDOW_MS = float(os.getenv('BACKEND_BATCH_WINDOW_MS', '2'))
+BACKEND_BATCH_MAX = int(os.getenv('BACKEND_BATCH_MAX', '50'))
+# Background traffic: open-loop Poisson arrivals (default one request every
+# 3s); LOADGEN_RATE=0 turns it off
+LOADGEN_RATE = float(os.getenv('LOADGEN_RATE', '0.33'))
+LOADGEN_WORKERS = int(os.getenv('LOADGEN_WORKERS', '4'))
+LOADGEN_MIX = parse_mix(os.environ['LOADGEN_MIX']) if os.getenv('LOADGEN_MIX') else DEFAULT_MIX
+HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '5'))
+HEALTH_PROBE_HISTORY = int(os.getenv('HEALTH_PROBE_HISTORY', '60'))
+# /stream/stats pushes dashboard stats every STREAM_INTERVAL seconds; each
+# open stream holds a server thread, so at most STREAM_MAX_CLIENTS per process
+STREAM_INTERVAL = float(os.getenv('STREAM_INTERVAL', '1'))
+STREAM_MAX_CLIENTS = int(os.getenv('STREAM_MAX_CLIENTS', '4'))
 
-# Metrics tracking
-request_count = 0
-error_count = 0
-response_times = []
-endpoint_stats = {
-    '/': {'count': 0, 'avg_time': 0, 'errors': 0},
-    '/health': {'count': 0, 'avg_time': 0, 'errors': 0},
-    '/metrics': {'count': 0, 'avg_time': 0, 'errors': 0},
-    '/slow': {'count': 0, 'avg_time': 0, 'errors': 0},
-    '/error': {'count': 0, 'avg_time': 0, 'errors': 0}
-}
+# Dashboard template is compiled once at startup; its stylesheet is served
+# from /static with a content hash in the URL so browsers can cache it
+dashboard_template = app.jinja_env.get_template('dashboard.html')
+with app.open_resource('static/dashboard.css', 'rb') as css_file:
+    CSS_VERSION = hashlib.sha256(css_file.read()).hexdigest()[:12]
+CSS_URL = f'/static/dashboard.css?v={CSS_VERSION}'
+# Fingerprinted URL, so the asset itself can be cached for a year
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 3600
+
+# Simulated failures returned by /error
+ERROR_TYPES = [
+    ("Database Connection Error", 503),
+    ("Validation Error", 400),
+    ("External Service Timeout", 504),
+    ("Internal Server Error", 500),
+    ("Authentication Failed", 401),
+    ("Rate Limit Exceeded", 429)
+]
+
+# Metrics tracking - every metric lives in the registry and is safe to
+# update from request threads and the background load generator
+metrics = Registry()
+# JSON log lines written by a background thread; LOG_SAMPLE / LOG_RATE_LIMIT
+# thin out per-route request logs, and drops are counted on /metrics
+configure_logging('frontend', metrics)
+# Every request runs in a span, and backend calls carry it on as a
+# traceparent header; TRACE_SAMPLE_RATE / TRACE_EXPORT control recording
+tracer = tracer_from_env('frontend', metrics)
+trace_flask_app(app, tracer)
+# Rate, errors and duration of every route, labelled by URL rule and recorded
+# by request hooks, so handlers carry no metrics code. Installed before
+# admission control so shed requests are counted too. /error answers 4xx, so
+# anything from 400 up counts as an error.
+request_metrics = RequestMetrics(metrics, prefix='http', error_status=400)
+instrument_flask_app(app, request_metrics, exemplar=tracer.exemplar)
+request_ids = itertools.count(1)
+# Per-route concurrency limits (per process) with load shedding: /slow may
+# hold at most 4 threads, so it cannot starve the cheap routes; requests over
+# a limit wait up to ADMISSION_QUEUE_TARGET_MS, then get 503 + Retry-After
+admission = admission_from_env(metrics, limits={'/slow': 4, '*': 64})
+admit_flask_app(app, admission)
+metrics.gauge('app_version', 'Application version info', ['version']).labels(version=APP_VERSION).set(1)
+# process_* (CPU, memory, fds, threads), python_gc_* and request thread pool usage
+runtime_metrics = runtime_from_env(metrics, busy=request_metrics.in_flight.value)
+endpoint_latency = metrics.summary(
+    'http_request_latency_seconds',
+    f'HTTP request latency quantiles over the last {LATENCY_WINDOW_SECONDS}s',
+    ['endpoint'], window_seconds=LATENCY_WINDOW_SECONDS
+)
+# Requests, errors and latency over the trailing 1m/5m/15m, for the cards
+# and as gauges. Sum and max merge across workers; mean is sum / requests.
+# One set per route, created for the URL map at startup and for any other
+# (capped) route label on its first request.
+endpoint_windows = {}
+endpoint_windows_lock = threading.Lock()
+window_requests = metrics.gauge(
+    'endpoint_window_requests', 'Requests per endpoint in the trailing window',
+    ['endpoint', 'window'], multiprocess_mode='sum')
+window_errors = metrics.gauge(
+    'endpoint_window_errors', 'Errors per endpoint in the trailing window',
+    ['endpoint', 'window'], multiprocess_mode='sum')
+window_latency_sum = metrics.gauge(
+    'endpoint_window_latency_sum_seconds', 'Total request latency per endpoint in the trailing window',
+    ['endpoint', 'window'], multiprocess_mode='sum')
+window_latency_max = metrics.gauge(
+    'endpoint_window_latency_max_seconds', 'Slowest request per endpoint in the trailing window',
+    ['endpoint', 'window'], multiprocess_mode='max')
+
+def endpoint_window(endpoint):
+    """The endpoint's SlidingWindowStats, registering its gauges on first use"""
+    stats = endpoint_windows.get(endpoint)
+    if stats is None:
+        with endpoint_windows_lock:
+            stats = endpoint_windows.get(endpoint)
+            if stats is None:
+                stats = SlidingWindowStats(DEFAULT_WINDOWS)
+                endpoint_latency.labels(endpoint=endpoint)
+                for seconds in DEFAULT_WINDOWS:
+                    for gauge, field in ((window_requests, 'count'), (window_errors, 'errors'),
+                                         (window_latency_sum, 'sum'), (window_latency_max, 'max')):
+                        gauge.labels(endpoint=endpoint, window=window_label(seconds)).set_function(
+                            lambda seconds=seconds, field=field: stats.window(seconds)[field])
+                endpoint_windows[endpoint] = stats
+    return stats
 
 def update_endpoint_stats(endpoint, response_time, is_error=False):
-    """Update statistics for specific endpoint"""
-    if endpoint in endpoint_stats:
-        stats = endpoint_stats[endpoint]
-        stats['count'] += 1
-        if is_error:
-            stats['errors'] += 1
-        # Update rolling average
-        stats['avg_time'] = (stats['avg_time'] + response_time) / 2
-
-def background_load_generator():
-    """Generate background traffic to simulate real usage"""
-    endpoints = ['/', '/health', '/metrics', '/slow', '/error']
-    weights = [50, 20, 10, 15, 5]  # Weighted distribution
-    
-    while True:
+    """Latency sketch and sliding windows of a route; runs after every request"""
+    endpoint_latency.labels(endpoint=endpoint).observe(response_time)
+    endpoint_window(endpoint).observe(response_time, is_error)
+
+request_metrics.listeners.append(update_endpoint_stats)
+# Rate, error rate and latency quantiles per route at 1s/10s/1m resolution,
+# for the dashboard sparklines and /api/stats/history; see telemetry.history
+stats_history = history_from_env(metrics)
+request_metrics.listeners.append(stats_history.observe)
+
+# Keep-alive connection pools for calls to the backend and for the load
+# generator's calls back into this service. /api/data responses are cached
+# for as long as the backend's Cache-Control allows (BACKEND_CACHE_TTL when
+# it sends none), and concurrent page loads share one upstream call.
+client_metrics = PoolMetrics(metrics)
+backend_cache = ResponseCache(
+    max_entries=BACKEND_CACHE_SIZE, default_ttl=BACKEND_CACHE_TTL,
+    metrics=CacheMetrics(metrics), name='backend'
+)
+backend_client = BackendClient(
+    BACKEND_URL, name='backend', pool_size=BACKEND_POOL_SIZE,
+    timeouts={'/api/data': 5.0, '/api/data/batch': 5.0, '/health': 2.0},
+    retries=BACKEND_RETRIES, metrics=client_metrics,
+    cache=backend_cache, cache_paths=('/api/data',), tracer=tracer,
+    adaptive_paths=BACKEND_DATA_PATHS if BACKEND_ADAPTIVE_TIMEOUTS else (),
+    hedge_paths=BACKEND_DATA_PATHS, hedge_budget=BACKEND_HEDGE_BUDGET
+)
+self_client = BackendClient(
+    'http://localhost:5000', name='self', pool_size=4,
+    timeouts={'/slow': 10.0}, default_timeout=2.0,
+    retries=0, metrics=client_metrics, tracer=tracer
+)
+
+def load_backend_items(keys):
+    """{key: item} for one /api/data/batch call"""
+    response = backend_client.get('/api/data/batch', params={'keys': ','.join(keys)})
+    response.raise_for_status()
+    return {item['key']: item for item in response.json()['items']}
+
+batch_metrics = BatchMetrics(metrics)
+backend_items = MicroBatcher(
+    load_backend_items, window=BACKEND_BATCH_WINDOW_MS / 1000, max_batch=BACKEND_BATCH_MAX,
+    metrics=batch_metrics, name='backend'
+)
+
+# Backend health is probed on a fixed interval in the background; /health
+# and the dashboard read the cached result instead of calling the backend.
+# Under a pre-fork server one worker per host probes and shares the result.
+backend_health = HealthProber(
+    backend_client, '/health', interval=HEALTH_PROBE_INTERVAL,
+    history=HEALTH_PROBE_HISTORY, registry=metrics,
+    shared_dir=os.getenv('METRICS_MULTIPROC_DIR')
+).start()
+
+# Under a pre-fork server (METRICS_MULTIPROC_DIR set) /metrics merges all workers
+metrics_exporter = exporter_for(metrics)
+# Scrapes within METRICS_CACHE_SECONDS of each other share one rendered body
+metrics_exposition = Exposition(
+    metrics_exporter, cache_seconds=float(os.getenv('METRICS_CACHE_SECONDS', '0')))
+# /debug/profile: stack samples of this process as collapsed stacks for
+# flamegraph tools; off unless PROFILE_TOKEN is set, see telemetry.profiler
+profiler = profiler_from_env(metrics)
+profile_flask_app(app, profiler)
+history_flask_app(app, stats_history)
+
+def service_totals():
+    """(requests, errors, mean duration) of the service, summed over every worker under a pre-fork server"""
+    merged = metrics_exporter.collect() if metrics_exporter is not metrics else None
+    return request_metrics.totals(merged)
+
+def endpoint_stats():
+    """Per-endpoint totals, plus count, errors, mean and max per trailing window"""
+    totals = request_metrics.by_endpoint()
+    stats = {}
+    for endpoint, windows in list(endpoint_windows.items()):
+        latency = endpoint_latency.labels(endpoint=endpoint)
+        count, errors = totals.get(endpoint, (0, 0))
+        stats[endpoint] = {
+            'count': count,
+            'errors': errors,
+            'avg_time': latency.sum / latency.count if latency.count else 0,
+            'windows': windows.summary(),
+        }
+    return stats
+
+def latency_percentiles_ms(endpoints=None):
+    """Windowed p50/p90/p99/p99.9 per endpoint (default: every one seen), in milliseconds"""
+    result = {}
+    for endpoint in list(endpoint_windows if endpoints is None else endpoints):
+        q = endpoint_latency.labels(endpoint=endpoint).quantiles()
+        result[endpoint] = {
+            'p50': round(q[0.5] * 1000, 2),
+            'p90': round(q[0.9] * 1000, 2),
+            'p99': round(q[0.99] * 1000, 2),
+            'p999': round(q[0.999] * 1000, 2),
+        }
+    return result
+
+def window_rates(stats):
+    """Request rate per minute over each trailing window, as shown on the cards"""
+    w = stats['windows']
+    return (f"{w['1m']['rate'] * 60:.1f} · {w['5m']['rate'] * 60:.1f} · {w['15m']['rate'] * 60:.1f} "
+            "req/min (1m · 5m · 15m)")
+
+def window_summary(stats):
+    """Mean, max and errors over the last 5 minutes, as shown on the cards"""
+    w = stats['windows']['5m']
+    return f"avg {w['mean'] * 1000:.1f}ms • max {w['max'] * 1000:.1f}ms • {w['errors']} errors (5m)"
+
+app.jinja_env.globals.update(window_rates=window_rates, window_summary=window_summary)
+
+def backend_state_label():
+    """Dashboard label for the cached backend status: LIVE, DOWN or UNKNOWN"""
+    state = backend_health.status()['state']
+    return 'LIVE' if state == 'up' else state.upper()
+
+def live_stats():
+    """The dashboard's changing values, keyed by their ``data-stat`` element"""
+    requests, errors, mean_duration = service_totals()
+    stats = {
+        'req_count': requests,
+        'avg_response': round(mean_duration * 1000, 2),
+        'error_count': errors,
+        'backend_state': backend_state_label(),
+        'current_time': datetime.now().strftime("%H:%M:%S"),
+    }
+    # Both from one list of endpoints, so a route first seen in between is in neither
+    per_endpoint = endpoint_stats()
+    latency = latency_percentiles_ms(per_endpoint)
+    for endpoint, endpoint_stat in per_endpoint.items():
+        stats[f'{endpoint}.count'] = endpoint_stat['count']
+        stats[f'{endpoint}.rates'] = window_rates(endpoint_stat)
+        stats[f'{endpoint}.window'] = window_summary(endpoint_stat)
+        for quantile, value in latency[endpoint].items():
+            stats[f'{endpoint}.{quantile}'] = value
+    return stats
+
+# One sampler thread feeds every /stream/stats client, and only while any are open
+stats_publisher = StatsPublisher(live_stats, interval=STREAM_INTERVAL,
+                                 max_subscribers=STREAM_MAX_CLIENTS, registry=metrics)
+
+def backend_healthy(backend):
+    """True unless the last probe failed; before the first one ('unknown')
+    the service counts as healthy, so a starting container passes its check"""
+    return backend['state'] != 'down'
+
+def health_payload(backend, fresh=False, history=False):
+    """/health body for a backend status snapshot from the prober"""
+    checked_at = backend['checked_at']
+    requests, errors, mean_duration = service_totals()
+    payload = {
+        "status": "healthy" if backend_healthy(backend) else "degraded",
+        "timestamp": datetime.now().isoformat(),
+        "version": APP_VERSION,
+        "backend_status": backend['state'],
+        "backend_response_time_ms": backend['latency_ms'],
+        "backend_checked_at": datetime.fromtimestamp(checked_at).isoformat() if checked_at else None,
+        "backend_check_age_seconds": round(time.time() - checked_at, 3) if checked_at else None,
+        "backend_check_cached": not fresh,
+        "backend_consecutive_failures": backend['consecutive_failures'],
+        "backend_availability_percent": backend['availability_percent'],
+        "backend_error": backend['error'],
+        "request_count": requests,
+        "error_count": errors,
+        "session_stats": {
+            "total_requests": requests,
+            "avg_response_time_ms": round(mean_duration * 1000, 2),
+            "uptime": "healthy"
+        }
+    }
+    if history:
+        payload["backend_history"] = backend['history']
+    return payload
+
+# Registered in every worker so a scrape of any of them merges the series
+loadgen_metrics = LoadMetrics(metrics)
+
+def start_load_generator():
+    """Start the background load generator, once per host"""
+    if LOADGEN_RATE <= 0:
+        return None
+    metrics_dir = os.getenv('METRICS_MULTIPROC_DIR')
+    lock_file = None
+    if metrics_dir:
+        # Every pre-fork worker imports this module; only the one holding
+        # the lock generates traffic, and a replacement worker takes over
+        # when it exits.
+        lock_file = open(os.path.join(metrics_dir, 'load_generator.lock'), 'w')
         try:
-            # Sleep for random interval (1-5 seconds)
-            time.sleep(random.uniform(1, 5))
-            
-            # Select endpoint based on weights
-            endpoint = random.choices(endpoints, weights=weights)[0]
-            
-            # Make internal request
-            try:
-                start_time = time.time()
-                if endpoint == '/':
-                    # Simulate homepage request
-                    pass  # Will be handled by actual endpoint
-                elif endpoint == '/health':
-                    requests.get(f"http://localhost:5000/health", timeout=2)
-                elif endpoint == '/metrics':
-                    requests.get(f"http://localhost:5000/metrics", timeout=2)
-                elif endpoint == '/slow':
-                    requests.get(f"http://localhost:5000/slow", timeout=10)
-                elif endpoint == '/error':
-                    requests.get(f"http://localhost:5000/error", timeout=2)
-                
-                response_time = time.time() - start_time
-                logger.info(f"Background request: {endpoint} completed in {response_time:.3f}s")
-                
-            except Exception as e:
-                logger.warning(f"Background request failed: {endpoint} - {e}")
-                
-        except Exception as e:
-            logger.error(f"Background load generator error: {e}")
-            time.sleep(5)
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+    generator = LoadGenerator(
+        self_client, LOADGEN_RATE, LOADGEN_MIX, workers=LOADGEN_WORKERS,
+        metrics=loadgen_metrics
+    )
+    generator.lock_file = lock_file
+    logger.info("Background load generator started", extra={'rate': LOADGEN_RATE, 'workers': LOADGEN_WORKERS})
+    return generator.start()
 
 # Start background load generator
-load_thread = threading.Thread(target=background_load_generator, daemon=True)
-load_thread.start()
+load_generator = start_load_generator()
 
 @app.route('/')
 def home():
     """Enhanced home page with modern UI"""
-    global request_count, response_times, error_count
     start_time = time.time()
-    request_count += 1
     
     try:
-        logger.info(f"Request #{request_count} from {request.remote_addr}")
-        
-        # Call backend service
+        # Call backend service; keyed views are batched with concurrent ones
         try:
-            response = requests.get(f"{BACKEND_URL}/api/data", timeout=5)
-            backend_data = response.json()
+            key = request.args.get('key')
+            if key:
+                backend_data = backend_items.get(key)
+            else:
+                backend_data = backend_client.get('/api/data').json()
         except:
             backend_data = {"message": "Backend unavailable"}
         
-        # Calculate response time
         response_time = time.time() - start_time
-        response_times.append(response_time)
-        update_endpoint_stats('/', response_time)
-        
-        logger.info(f"Request completed in {response_time:.3f}s")
+        requests, errors, mean_duration = service_totals()
+        logger.info("Request completed", extra={
+            'route': '/', 'request_id': next(request_ids), 'trace_id': tracer.current().trace_id,
+            'remote_addr': request.remote_addr, 'latency_ms': round(response_time * 1000, 2)})
         
-        # Modern HTML template with CSS
-        html_template = """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Observability Demo | Real-Time Monitoring</title>
-            <style>
-                * {
-                    margin: 0;
-                    padding: 0;
-                    box-sizing: border-box;
-                }
-                
-                body {
-                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    min-height: 100vh;
-                    color: #333;
-                    padding: 20px;
-                }
-                
-                .container {
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    background: rgba(255, 255, 255, 0.95);
-                    border-radius: 20px;
-                    box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-                    overflow: hidden;
-                }
-                
-                .header {
-                    background: linear-gradient(135deg, #2c3e50 0%, #34495e 100%);
-                    color: white;
-                    padding: 30px;
-                    text-align: center;
-                    position: relative;
-                }
-                
-                .header::before {
-                    content: '';
-                    position: absolute;
-                    top: 0;
-                    left: 0;
-                    right: 0;
-                    bottom: 0;
-                    background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><circle cx="50" cy="50" r="3" fill="rgba(255,255,255,0.1)"/></svg>') repeat;
-                    opacity: 0.1;
-                }
-                
-                .header h1 {
-                    font-size: 2.5em;
-                    margin-bottom: 10px;
-                    font-weight: 300;
-                    position: relative;
-                    z-index: 1;
-                }
-                
-                .status-badge {
-                    display: inline-block;
-                    padding: 8px 16px;
-                    background: #27ae60;
-                    border-radius: 20px;
-                    font-size: 0.9em;
-                    position: relative;
-                    z-index: 1;
-                }
-                
-                .pulse {
-                    animation: pulse 2s infinite;
-                }
-                
-                @keyframes pulse {
-                    0% { transform: scale(1); }
-                    50% { transform: scale(1.05); }
-                    100% { transform: scale(1); }
-                }
-                
-                .metrics-grid {
-                    display: grid;
-                    grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-                    gap: 20px;
-                    padding: 30px;
-                }
-                
-                .metric-card {
-                    background: white;
-                    border-radius: 15px;
-                    padding: 25px;
-                    box-shadow: 0 10px 25px rgba(0,0,0,0.08);
-                    border-left: 5px solid #3498db;
-                    transition: transform 0.3s ease, box-shadow 0.3s ease;
-                }
-                
-                .metric-card:hover {
-                    transform: translateY(-5px);
-                    box-shadow: 0 15px 35px rgba(0,0,0,0.15);
-                }
-                
-                .metric-card.success { border-left-color: #27ae60; }
-                .metric-card.warning { border-left-color: #f39c12; }
-                .metric-card.error { border-left-color: #e74c3c; }
-                .metric-card.info { border-left-color: #3498db; }
-                
-                .metric-title {
-                    font-size: 1.2em;
-                    font-weight: 600;
-                    margin-bottom: 15px;
-                    color: #2c3e50;
-                    display: flex;
-                    align-items: center;
-                    gap: 10px;
-                }
-                
-                .metric-value {
-                    font-size: 2em;
-                    font-weight: 700;
-                    color: #3498db;
-                    margin-bottom: 10px;
-                    font-family: 'Courier New', monospace;
-                }
-                
-                .metric-details {
-                    font-size: 0.9em;
-                    color: #7f8c8d;
-                    line-height: 1.6;
-                }
-                
-                .endpoints-section {
-                    background: #f8f9fa;
-                    padding: 30px;
-                    border-top: 1px solid #ecf0f1;
-                }
-                
-                .endpoints-grid {
-                    display: grid;
-                    grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-                    gap: 15px;
-                    margin-top: 20px;
-                }
-                
-                .endpoint-card {
-                    background: white;
-                    border-radius: 12px;
-                    padding: 20px;
-                    text-align: center;
-                    transition: all 0.3s ease;
-                    border: 2px solid transparent;
-                    text-decoration: none;
-                    color: inherit;
-                    display: block;
-                }
-                
-                .endpoint-card:hover {
-                    border-color: #3498db;
-                    transform: translateY(-3px);
-                    text-decoration: none;
-                    color: inherit;
-                }
-                
-                .endpoint-emoji {
-                    font-size: 2em;
-                    margin-bottom: 10px;
-                    display: block;
-                }
-                
-                .endpoint-name {
-                    font-weight: 600;
-                    margin-bottom: 8px;
-                    color: #2c3e50;
-                }
-                
-                .endpoint-desc {
-                    font-size: 0.85em;
-                    color: #7f8c8d;
-                    margin-bottom: 10px;
-                }
-                
-                .endpoint-stats {
-                    font-size: 0.8em;
-                    color: #3498db;
-                    font-family: 'Courier New', monospace;
-                }
-                
-                .auto-refresh {
-                    position: fixed;
-                    top: 20px;
-                    right: 20px;
-                    background: rgba(0,0,0,0.8);
-                    color: white;
-                    padding: 10px 15px;
-                    border-radius: 25px;
-                    font-size: 0.9em;
-                    z-index: 1000;
-                }
-                
-                .footer {
-                    text-align: center;
-                    padding: 20px;
-                    background: #34495e;
-                    color: #bdc3c7;
-                    font-size: 0.9em;
-                }
-                
-                .live-indicator {
-                    width: 12px;
-                    height: 12px;
-                    background: #27ae60;
-                    border-radius: 50%;
-                    display: inline-block;
-                    margin-right: 8px;
-                    animation: blink 1s infinite;
-                }
-                
-                @keyframes blink {
-                    0%, 50% { opacity: 1; }
-                    51%, 100% { opacity: 0.3; }
-                }
-                
-                @media (max-width: 768px) {
-                    .metrics-grid {
-                        grid-template-columns: 1fr;
-                        padding: 20px;
-                    }
-                    
-                    .header h1 {
-                        font-size: 2em;
-                    }
-                }
-            </style>
-            <script>
-                // Auto-refresh every 5 seconds
-                setTimeout(() => {
-                    window.location.reload();
-                }, 5000);
-            </script>
-        </head>
-        <body>
-            <div class="auto-refresh">
-                <span class="live-indicator"></span>
-                Auto-refresh: 5s
-            </div>
-            
-            <div class="container">
-                <div class="header">
-                    <h1>🔍 Observability Demo</h1>
-                    <div class="status-badge pulse">
-                        System Operational • v{{ version }}
-                    </div>
-                </div>
-                
-                <div class="metrics-grid">
-                    <div class="metric-card info">
-                        <div class="metric-title">
-                            📊 Total Requests
-                        </div>
-                        <div class="metric-value">{{ req_count }}</div>
-                        <div class="metric-details">
-                            Session requests processed<br>
-                            Last updated: {{ current_time }}
-                        </div>
-                    </div>
-                    
-                    <div class="metric-card success">
-                        <div class="metric-title">
-                            ⚡ Response Time
-                        </div>
-                        <div class="metric-value">{{ avg_response }}ms</div>
-                        <div class="metric-details">
-                            Average response time<br>
-                            Target: < 200ms
-                        </div>
-                    </div>
-                    
-                    <div class="metric-card {{ 'error' if error_count > 0 else 'success' }}">
-                        <div class="metric-title">
-                            🛡️ Error Rate
-                        </div>
-                        <div class="metric-value">{{ error_count }}</div>
-                        <div class="metric-details">
-                            Total errors in session<br>
-                            SLA: < 1% error rate
-                        </div>
-                    </div>
-                    
-                    <div class="metric-card warning">
-                        <div class="metric-title">
-                            🔗 Backend Status
-                        </div>
-                        <div class="metric-value">LIVE</div>
-                        <div class="metric-details">
-                            {{ backend_info }}<br>
-                            Last check: {{ current_time }}
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="endpoints-section">
-                    <h2 style="text-align: center; margin-bottom: 10px; color: #2c3e50;">
-                        🎯 Observability Endpoints
-                    </h2>
-                    <p style="text-align: center; color: #7f8c8d; margin-bottom: 20px;">
-                        These endpoints demonstrate monitoring patterns used in enterprise applications
-                    </p>
-                    
-                    <div class="endpoints-grid">
-                        <a href="/health" class="endpoint-card">
-                            <span class="endpoint-emoji">❤️</span>
-                            <div class="endpoint-name">Health Check</div>
-                            <div class="endpoint-desc">Kubernetes liveness probe</div>
-                            <div class="endpoint-stats">{{ endpoint_stats['/health']['count'] }} requests</div>
-                        </a>
-                        
-                        <a href="/metrics" class="endpoint-card">
-                            <span class="endpoint-emoji">📈</span>
-                            <div class="endpoint-name">Metrics Export</div>
-                            <div class="endpoint-desc">Prometheus-compatible metrics</div>
-                            <div class="endpoint-stats">{{ endpoint_stats['/metrics']['count'] }} requests</div>
-                        </a>
-                        
-                        <a href="/slow" class="endpoint-card">
-                            <span class="endpoint-emoji">🐌</span>
-                            <div class="endpoint-name">Slow Endpoint</div>
-                            <div class="endpoint-desc">Performance testing (3s delay)</div>
-                            <div class="endpoint-stats">{{ endpoint_stats['/slow']['count'] }} requests</div>
-                        </a>
-                        
-                        <a href="/error" class="endpoint-card">
-                            <span class="endpoint-emoji">💥</span>
-                            <div class="endpoint-name">Error Simulation</div>
-                            <div class="endpoint-desc">Random HTTP errors</div>
-                            <div class="endpoint-stats">{{ endpoint_stats['/error']['count'] }} requests</div>
-                        </a>
-                        
-                        <a href="http://localhost:3000" target="_blank" class="endpoint-card" style="border-color: #e74c3c;">
-                            <span class="endpoint-emoji">📊</span>
-                            <div class="endpoint-name">Grafana Dashboard</div>
-                            <div class="endpoint-desc">Real-time monitoring (admin/admin)</div>
-                            <div class="endpoint-stats">External Link</div>
-                        </a>
-                        
-                        <a href="http://localhost:9090" target="_blank" class="endpoint-card" style="border-color: #f39c12;">
-                            <span class="endpoint-emoji">🔍</span>
-                            <div class="endpoint-name">Prometheus</div>
-                            <div class="endpoint-desc">Metrics collection</div>
-                            <div class="endpoint-stats">External Link</div>
-                        </a>
-                    </div>
-                </div>
-                
-                <div class="footer">
-                    <p>🚀 Built for demonstrating enterprise observability patterns</p>
-                    <p>Perfect for understanding how tools like New Relic integrate with microservices</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return render_template_string(html_template,
+        return dashboard_template.render(
+            css_url=CSS_URL,
             version=APP_VERSION,
             current_time=datetime.now().strftime("%H:%M:%S"),
-            req_count=request_count,
+            req_count=requests,
             backend_info=backend_data.get('message', 'Connected'),
-            avg_response=round(sum(response_times) / len(response_times) * 1000, 2) if response_times else 0,
-            error_count=error_count,
-            endpoint_stats=endpoint_stats
+            backend_state=backend_state_label(),
+            avg_response=round(mean_duration * 1000, 2),
+            error_count=errors,
+            endpoint_stats=endpoint_stats(),
+            latency=latency_percentiles_ms()
         )
         
     except Exception as e:
-        error_count += 1
-        response_time = time.time() - start_time
-        update_endpoint_stats('/', response_time, is_error=True)
-        logger.error(f"Application error: {str(e)}")
+        logger.error("Application error", extra={'route': '/', 'error': str(e)})
         
         return f"""
         <div style="text-align: center; padding: 50px; font-family: Arial, sans-serif;">
@@ -495,100 +397,53 @@ def home():
 
 @app.route('/health')
 def health_check():
-    """Enhanced health check with detailed status"""
+    """Health check answered from the background prober's cached status.
+
+    ``?fresh=1`` probes the backend synchronously first and ``?history=1``
+    adds the prober's recent results.
+    """
     try:
-        start_time = time.time()
-        try:
-            response = requests.get(f"{BACKEND_URL}/health", timeout=2)
-            response_time = time.time() - start_time
-            backend_healthy = response.status_code == 200
-        except:
-            response_time = time.time() - start_time
-            backend_healthy = False
-        
-        update_endpoint_stats('/health', response_time, not backend_healthy)
-        
-        health_status = {
-            "status": "healthy" if backend_healthy else "degraded",
-            "timestamp": datetime.now().isoformat(),
-            "version": APP_VERSION,
-            "backend_status": "up" if backend_healthy else "down",
-            "backend_response_time_ms": round(response_time * 1000, 2),
-            "request_count": request_count,
-            "error_count": error_count,
-            "session_stats": {
-                "total_requests": request_count,
-                "avg_response_time_ms": round(sum(response_times) / len(response_times) * 1000, 2) if response_times else 0,
-                "uptime": "healthy"
-            }
-        }
-        
-        status_code = 200 if backend_healthy else 503
+        fresh = request.args.get('fresh') == '1'
+        backend = backend_health.probe() if fresh else backend_health.status()
+        health_status = health_payload(backend, fresh, request.args.get('history') == '1')
+        status_code = 200 if backend_healthy(backend) else 503
         return jsonify(health_status), status_code
         
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        update_endpoint_stats('/health', 0, is_error=True)
+        logger.error("Health check failed", extra={'route': '/health', 'error': str(e)})
         return jsonify({
             "status": "unhealthy",
             "error": str(e),
             "timestamp": datetime.now().isoformat()
         }), 503
 
+@app.route('/stream/stats')
+def stream_stats():
+    """Server-Sent Events: the dashboard's stats, then the keys that change"""
+    try:
+        subscription = stats_publisher.subscribe()
+    except StreamFull:
+        return jsonify({"error": "Too many open streams"}), 503, {'Retry-After': '30'}
+    return Response(subscription, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/metrics')
 def prometheus_metrics():
-    """Prometheus-compatible metrics endpoint"""
-    start_time = time.time()
-    response_time = time.time() - start_time
-    update_endpoint_stats('/metrics', response_time)
-    
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-    
-    # Prometheus format metrics
-    metrics_text = f"""# HELP http_requests_total Total HTTP requests
-# TYPE http_requests_total counter
-http_requests_total{{method="GET",endpoint="/"}} {request_count}
-
-# HELP http_request_duration_seconds HTTP request duration
-# TYPE http_request_duration_seconds histogram
-http_request_duration_seconds_sum {sum(response_times)}
-http_request_duration_seconds_count {len(response_times)}
-
-# HELP http_errors_total Total HTTP errors
-# TYPE http_errors_total counter
-http_errors_total {error_count}
-
-# HELP app_version Application version info
-# TYPE app_version gauge
-app_version{{version="{APP_VERSION}"}} 1
-
-# HELP endpoint_requests_total Requests per endpoint
-# TYPE endpoint_requests_total counter"""
-
-    for endpoint, stats in endpoint_stats.items():
-        clean_endpoint = endpoint.replace('/', '_root') if endpoint == '/' else endpoint.replace('/', '_')
-        metrics_text += f'\nendpoint_requests_total{{endpoint="{endpoint}"}} {stats["count"]}'
-
-    metrics_text += f"""
-
-# HELP backend_status Backend service status
-# TYPE backend_status gauge
-backend_status 1
-"""
-    
-    return metrics_text, 200, {'Content-Type': 'text/plain'}
+    """Prometheus-compatible metrics endpoint (text format or OpenMetrics, gzipped if accepted)"""
+    body, headers = metrics_exposition.respond(
+        request.headers.get('Accept'), request.headers.get('Accept-Encoding'))
+    return body, 200, headers
 
 @app.route('/slow')
 def slow_endpoint():
     """Enhanced slow endpoint with tracking"""
     start_time = time.time()
-    logger.warning("Slow endpoint accessed - simulating performance issue")
+    logger.warning("Slow endpoint accessed - simulating performance issue", extra={'route': '/slow'})
     
     # Simulate slow operation
     time.sleep(3)
     
     response_time = time.time() - start_time
-    update_endpoint_stats('/slow', response_time)
     
     return jsonify({
         "message": "Slow operation completed",
@@ -602,37 +457,29 @@ def slow_endpoint():
 @app.route('/error')
 def error_endpoint():
     """Enhanced error endpoint with tracking"""
-    start_time = time.time()
-    global error_count
-    error_count += 1
-    
-    logger.error("Intentional error triggered for testing")
+    logger.error("Intentional error triggered for testing", extra={'route': '/error'})
     
     # Simulate different types of errors randomly
-    import random
-    error_types = [
-        ("Database Connection Error", 503),
-        ("Validation Error", 400),
-        ("External Service Timeout", 504),
-        ("Internal Server Error", 500),
-        ("Authentication Failed", 401),
-        ("Rate Limit Exceeded", 429)
-    ]
-    
-    error_message, status_code = random.choice(error_types)
-    response_time = time.time() - start_time
-    update_endpoint_stats('/error', response_time, is_error=True)
+    error_message, status_code = random.choice(ERROR_TYPES)
+    # This request is recorded once its response is sent
+    total_errors = request_metrics.total_errors() + 1
+    total_requests = request_metrics.total() + 1
     
     return jsonify({
         "error": error_message,
         "status_code": status_code,
         "timestamp": datetime.now().isoformat(),
-        "total_errors": error_count,
-        "error_rate_percent": round((error_count / request_count) * 100, 2) if request_count > 0 else 0,
+        "total_errors": total_errors,
+        "error_rate_percent": round((total_errors / total_requests) * 100, 2) if total_requests > 0 else 0,
         "note": "This endpoint demonstrates error tracking and alerting"
     }), status_code
 
+# Cards and gauges for every route exist before its first request
+for route in flask_routes(app):
+    endpoint_window(route)
+# History keeps every route label, whatever the route count
+stats_history.reserve(route_labels(app))
+
 if __name__ == '__main__':
-    logger.info(f"Starting enhanced frontend service version {APP_VERSION}")
-    logger.info("Background load generator started - creating realistic traffic patterns")
+    logger.info("Starting enhanced frontend service", extra={'version': APP_VERSION})
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""Asyncio (ASGI) serving mode for the frontend.
+
+Serves the same routes as the Flask app in app.py (/, /health, /metrics,
+/slow, /error) and shares its metrics registry, template and settings, but
+backend calls and the simulated delay are awaited instead of blocking a
+thread, so a single process can hold thousands of concurrent slow requests.
+Backend health comes from the same background prober as the Flask app.
+
+    cd frontend && uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import gzip
+import os
+import random
+import time
+from datetime import datetime
+
+import httpx
+
+import app as frontend
+from batching import AsyncMicroBatcher
+from live_stats import StreamFull
+from telemetry import Response, StreamingResponse, accepts, asgi_app, json_response, response_from
+
+logger = frontend.logger
+
+CSS_PATH = '/static/dashboard.css'
+with open(os.path.join(frontend.app.root_path, 'static', 'dashboard.css'), 'rb') as _css_file:
+    CSS_BODY = _css_file.read()
+CSS_ETAG = f'"{frontend.CSS_VERSION}"'
+
+
+class AsyncBackendClient:
+    """Non-blocking counterpart of BackendClient, built on httpx.
+
+    Uses the same per-endpoint (adaptive) timeouts, hedging budget, pool
+    size and response cache as the synchronous client, and records call
+    outcomes in the same metrics.
+    Concurrent misses for a cacheable path await one shared upstream call.
+    """
+
+    def __init__(self, sync_client, pool_size):
+        self.sync_client = sync_client
+        self.pool_size = pool_size
+        self._client = None
+        self._inflight = {}
+
+    def _http(self):
+        # Created lazily so the client binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.sync_client.base_url,
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+            )
+        return self._client
+
+    async def get(self, path):
+        if not self.sync_client.cacheable(path):
+            return await self.fetch(path)
+        cache = self.sync_client.cache
+        response = cache.lookup(path)
+        if response is not None:
+            return response
+        flight = self._inflight.get(path)
+        if flight is not None:
+            cache.record('coalesced')
+            return await asyncio.shield(flight)
+
+        cache.record('miss')
+        flight = self._inflight[path] = asyncio.get_running_loop().create_future()
+        try:
+            response = await self.fetch(path)
+            cache.store(path, response)
+            flight.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # mark retrieved when nobody was waiting
+            raise
+        finally:
+            del self._inflight[path]
+
+    async def fetch(self, path, params=None):
+        with frontend.tracer.start_span(
+                f'GET {path}', kind='client',
+                attributes={'peer.service': self.sync_client.name, 'http.route': path}) as span:
+            response = await self._hedged(path, params, {'traceparent': span.traceparent})
+            span.set_attribute('http.status_code', response.status_code)
+            span.set_error(response.status_code >= 500)
+            return response
+
+    async def _hedged(self, path, params, headers):
+        """Same hedging policy as BackendClient; the losing copy is cancelled"""
+        client = self.sync_client
+        delay = client.hedge_delay(path)
+        if delay is None:
+            return await self._fetch(path, params, headers)
+        primary = asyncio.ensure_future(self._fetch(path, params, headers))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if not client.hedge_budget.spend():
+            client.record_hedge(path, 'skipped')
+            return await primary
+        client.record_hedge(path, 'sent')
+        hedge = asyncio.ensure_future(self._fetch(path, params, headers))
+        try:
+            done, _ = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((t for t in (primary, hedge) if t in done and t.exception() is None), None)
+            if winner is None:
+                # The first to finish failed, so the other one is the last hope
+                await asyncio.wait({primary, hedge})
+                winner = hedge if hedge.exception() is None else primary
+        except asyncio.CancelledError:
+            primary.cancel()
+            hedge.cancel()
+            raise
+        loser = primary if winner is hedge else hedge
+        client.record_hedge(path, 'won' if winner is hedge else 'wasted')
+        loser.cancel()
+        if not loser.cancelled() and loser.done():
+            loser.exception()  # mark retrieved
+        return winner.result()
+
+    async def _fetch(self, path, params, headers):
+        connect, read = self.sync_client.timeout_for(path)
+        outcome = 'error'
+        started = time.perf_counter()
+        try:
+            response = await self._http().get(path, timeout=httpx.Timeout(read, connect=connect),
+                                              params=params, headers=headers)
+            outcome = str(response.status_code)
+            self.sync_client.observe_latency(path, time.perf_counter() - started)
+            return response
+        except httpx.TimeoutException:
+            outcome = 'timeout'
+            self.sync_client.observe_latency(path, time.perf_counter() - started)
+            raise
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
+        finally:
+            self.sync_client.record_outcome(path, outcome)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+backend = AsyncBackendClient(frontend.backend_client, frontend.BACKEND_POOL_SIZE)
+# Streams are coroutines here rather than server threads, so far more can be open
+frontend.stats_publisher.max_subscribers = int(os.getenv('STREAM_MAX_CLIENTS', '1000'))
+
+
+async def load_backend_items(keys):
+    """{key: item} for one /api/data/batch call"""
+    response = await backend.fetch('/api/data/batch', params={'keys': ','.join(keys)})
+    response.raise_for_status()
+    return {item['key']: item for item in response.json()['items']}
+
+
+backend_items = AsyncMicroBatcher(
+    load_backend_items, window=frontend.BACKEND_BATCH_WINDOW_MS / 1000,
+    max_batch=frontend.BACKEND_BATCH_MAX, metrics=frontend.batch_metrics
+)
+
+
+async def probe_backend():
+    """Awaitable counterpart of HealthProber.probe, recorded in the same history"""
+    started = time.perf_counter()
+    error = None
+    try:
+        response = await backend.get('/health')
+        up = response.status_code == 200
+        if not up:
+            error = f'HTTP {response.status_code}'
+    except httpx.HTTPError as e:
+        up, error = False, type(e).__name__
+    return frontend.backend_health.record(up, time.perf_counter() - started, error)
+
+
+async def home(request_headers, query):
+    """Dashboard page"""
+    start_time = time.time()
+
+    try:
+        key = query.get('key')
+        if key:
+            backend_data = await backend_items.get(key)
+        else:
+            backend_data = (await backend.get('/api/data')).json()
+    except (httpx.HTTPError, ValueError, KeyError):
+        backend_data = {"message": "Backend unavailable"}
+
+    response_time = time.time() - start_time
+    logger.info("Request completed", extra={
+        'route': '/', 'request_id': next(frontend.request_ids),
+        'trace_id': frontend.tracer.current().trace_id, 'latency_ms': round(response_time * 1000, 2)})
+
+    requests, errors, mean_duration = frontend.service_totals()
+    html = frontend.dashboard_template.render(
+        css_url=frontend.CSS_URL,
+        version=frontend.APP_VERSION,
+        current_time=datetime.now().strftime("%H:%M:%S"),
+        req_count=requests,
+        backend_info=backend_data.get('message', 'Connected'),
+        backend_state=frontend.backend_state_label(),
+        avg_response=round(mean_duration * 1000, 2),
+        error_count=errors,
+        endpoint_stats=frontend.endpoint_stats(),
+        latency=frontend.latency_percentiles_ms()
+    )
+    return Response(html, content_type='text/html; charset=utf-8')
+
+
+async def health_check(request_headers, query):
+    """Cached backend status; ``?fresh=1`` probes without blocking the loop"""
+    fresh = query.get('fresh') == '1'
+    if fresh:
+        backend_status = await probe_backend()
+    else:
+        backend_status = frontend.backend_health.status()
+    payload = frontend.health_payload(backend_status, fresh, query.get('history') == '1')
+    return json_response(payload, 200 if frontend.backend_healthy(backend_status) else 503)
+
+
+async def prometheus_metrics(request_headers, query):
+    body, headers = frontend.metrics_exposition.respond(
+        request_headers.get('accept'), request_headers.get('accept-encoding'))
+    return response_from(body, 200, headers)
+
+
+async def slow_endpoint(request_headers, query):
+    start_time = time.time()
+    logger.warning("Slow endpoint accessed - simulating performance issue", extra={'route': '/slow'})
+
+    # Simulated slow operation; yields the event loop instead of a thread
+    await asyncio.sleep(3)
+
+    response_time = time.time() - start_time
+
+    return json_response({
+        "message": "Slow operation completed",
+        "delay_seconds": 3,
+        "actual_response_time_ms": round(response_time * 1000, 2),
+        "purpose": "Performance monitoring demonstration",
+        "timestamp": datetime.now().isoformat(),
+        "note": "This endpoint helps demonstrate APM alerting capabilities"
+    })
+
+
+async def error_endpoint(request_headers, query):
+    logger.error("Intentional error triggered for testing", extra={'route': '/error'})
+
+    error_message, status_code = random.choice(frontend.ERROR_TYPES)
+    # This request is recorded once its response is sent
+    total_errors = frontend.request_metrics.total_errors() + 1
+    total_requests = frontend.request_metrics.total() + 1
+
+    return json_response({
+        "error": error_message,
+        "status_code": status_code,
+        "timestamp": datetime.now().isoformat(),
+        "total_errors": total_errors,
+        "error_rate_percent": round((total_errors / total_requests) * 100, 2) if total_requests > 0 else 0,
+        "note": "This endpoint demonstrates error tracking and alerting"
+    }, status_code)
+
+
+async def debug_profile(request_headers, query):
+    """Samples from a worker thread, so the event loop's own stacks are captured"""
+    return response_from(*await asyncio.to_thread(
+        frontend.profiler.respond, query, request_headers.get('authorization')))
+
+
+async def stats_history(request_headers, query):
+    return response_from(*frontend.stats_history.respond(query))
+
+
+async def stream_stats(request_headers, query):
+    """Server-Sent Events from the shared stats publisher; a stream costs no thread here"""
+    try:
+        subscription = frontend.stats_publisher.subscribe()
+    except StreamFull:
+        return json_response({"error": "Too many open streams"}, 503)
+    return StreamingResponse(subscription.events_async(), 'text/event-stream',
+                             {'cache-control': 'no-cache', 'x-accel-buffering': 'no'},
+                             close=subscription.close)
+
+
+async def stylesheet(request_headers, query):
+    headers = {'etag': CSS_ETAG, 'cache-control': 'public, max-age=31536000'}
+    if request_headers.get('if-none-match') == CSS_ETAG:
+        return Response(b'', 304, 'text/css; charset=utf-8', headers)
+    return Response(CSS_BODY, 200, 'text/css; charset=utf-8', headers)
+
+
+ROUTES = {
+    '/': home,
+    '/health': health_check,
+    '/metrics': prometheus_metrics,
+    '/slow': slow_endpoint,
+    '/error': error_endpoint,
+    '/debug/profile': debug_profile,
+    '/api/stats/history': stats_history,
+    '/stream/stats': stream_stats,
+    CSS_PATH: stylesheet,
+}
+# Metric labels: the Flask app's URL rules, so both servers export the same series
+ROUTE_LABELS = {CSS_PATH: '/static/<path:filename>'}
+
+
+def compress(response, request_headers):
+    """gzip text bodies over 512 bytes, matching the Flask app's behaviour"""
+    response.headers.setdefault('vary', 'Accept-Encoding')
+    if (not isinstance(response, StreamingResponse)
+            and 'content-encoding' not in response.headers
+            and len(response.body) >= 512
+            and response.headers['content-type'].startswith(('text/html', 'text/plain', 'application/json'))
+            and accepts(request_headers.get('accept-encoding'), 'gzip', '*')):
+        response.body = gzip.compress(response.body, compresslevel=6)
+        response.headers['content-encoding'] = 'gzip'
+    return response
+
+
+async def startup():
+    logger.info("Starting async frontend service", extra={'version': frontend.APP_VERSION})
+
+
+app = asgi_app(ROUTES, frontend.request_metrics, frontend.tracer, logger, path_labels=ROUTE_LABELS,
+               after=compress, startup=startup, shutdown=backend.aclose)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT', '5000')),
+                backlog=4096, log_level='warning')
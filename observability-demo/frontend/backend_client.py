@@ -0,0 +1,357 @@
+"""Pooled, keep-alive HTTP client for calls from the frontend to other services"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from telemetry import WindowedQuantiles
+
+# Gateway-style failures worth retrying for idempotent GETs
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class PoolMetrics:
+    """Connection-pool and call metrics shared by every client, labelled by client name"""
+
+    def __init__(self, registry):
+        self.in_use = registry.gauge(
+            'backend_client_connections_in_use', 'Pooled connections currently checked out',
+            ['client'], multiprocess_mode='sum')
+        self.created = registry.counter(
+            'backend_client_connections_created_total', 'New TCP connections opened by the pool',
+            ['client'])
+        self.reused = registry.counter(
+            'backend_client_connections_reused_total', 'Requests sent on an existing keep-alive connection',
+            ['client'])
+        self.wait = registry.histogram(
+            'backend_client_pool_wait_seconds', 'Time spent waiting for a free pooled connection',
+            ['client'], buckets=POOL_WAIT_BUCKETS)
+        self.requests = registry.counter(
+            'backend_client_requests_total', 'Calls made through the backend client',
+            ['client', 'endpoint', 'outcome'])
+        self.retries = registry.counter(
+            'backend_client_retries_total', 'Backend calls retried after a failure',
+            ['client', 'endpoint'])
+        self.timeout = registry.gauge(
+            'backend_client_timeout_seconds', 'Current read timeout, from recent latency when adaptive',
+            ['client', 'endpoint'])
+        self.hedges = registry.counter(
+            'backend_client_hedges_total', 'Duplicate requests sent after the first exceeded its p95',
+            ['client', 'endpoint'])
+        self.hedge_wins = registry.counter(
+            'backend_client_hedge_wins_total', 'Hedged calls answered by the duplicate',
+            ['client', 'endpoint'])
+        self.hedges_wasted = registry.counter(
+            'backend_client_hedges_wasted_total', 'Duplicates whose response was not used',
+            ['client', 'endpoint'])
+        self.hedges_skipped = registry.counter(
+            'backend_client_hedges_skipped_total', 'Hedges not sent because the budget was spent',
+            ['client', 'endpoint'])
+
+
+class LatencyTracker:
+    """Recent response latency of one endpoint, for deadlines and hedge delays.
+
+    Quantiles come from a sliding-window sketch and are recomputed at most
+    every ``refresh`` seconds, so reading them costs nothing per call.
+    """
+
+    def __init__(self, window_seconds=60, min_samples=20, refresh=1.0, clock=time.monotonic):
+        self.min_samples = min_samples
+        self.refresh = refresh
+        self._clock = clock
+        self._window = WindowedQuantiles(window_seconds=window_seconds, slices=6, clock=clock)
+        self._cached = (float('-inf'), None)
+
+    def observe(self, seconds):
+        self._window.observe(seconds)
+
+    def quantiles(self):
+        """(p95, p99) over the window, or None until it holds ``min_samples``"""
+        now = self._clock()
+        computed_at, value = self._cached
+        if now - computed_at >= self.refresh:
+            sketch = self._window.merged()
+            value = None
+            if sketch.count >= self.min_samples:
+                q = sketch.quantiles((0.95, 0.99))
+                value = (q[0.95], q[0.99])
+            self._cached = (now, value)
+        return value
+
+
+class HedgeBudget:
+    """Token bucket that keeps hedges under ``ratio`` of calls.
+
+    Every call earns ``ratio`` of a token and a hedge spends a whole one;
+    at most ``burst`` tokens are saved up for quiet periods.
+    """
+
+    def __init__(self, ratio, burst=10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def spend(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _PoolObserver:
+    """Records checkouts and check-ins of one client's pooled connections"""
+
+    def __init__(self, metrics, name):
+        self.in_use = metrics.in_use.labels(client=name)
+        self.created = metrics.created.labels(client=name)
+        self.reused = metrics.reused.labels(client=name)
+        self.wait = metrics.wait.labels(client=name)
+
+    def checked_out(self, conn, waited):
+        self.wait.observe(waited)
+        self.in_use.inc()
+        # A connection without a socket will do a fresh TCP handshake
+        if getattr(conn, 'sock', None) is None:
+            self.created.inc()
+        else:
+            self.reused.inc()
+
+    def checked_in(self):
+        self.in_use.dec()
+
+
+def _instrumented(pool_class, observer):
+    class InstrumentedPool(pool_class):
+        def _get_conn(self, timeout=None):
+            started = time.perf_counter()
+            conn = super()._get_conn(timeout)
+            observer.checked_out(conn, time.perf_counter() - started)
+            return conn
+
+        def _put_conn(self, conn):
+            observer.checked_in()
+            super()._put_conn(conn)
+
+    return InstrumentedPool
+
+
+class _PooledAdapter(HTTPAdapter):
+    def __init__(self, observer=None, **kwargs):
+        self._observer = observer
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        if self._observer is not None:
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': _instrumented(HTTPConnectionPool, self._observer),
+                'https': _instrumented(HTTPSConnectionPool, self._observer),
+            }
+
+
+class BackendClient:
+    """GET client for one base URL with a bounded keep-alive connection pool.
+
+    The pool blocks when all ``pool_size`` connections are busy, so
+    saturation shows up as pool wait time rather than extra sockets.
+    Connection failures and 502/503/504 responses are retried with full
+    jitter backoff; read timeouts are not, so a slow backend never costs
+    more than one timeout. GETs of ``cache_paths`` go through ``cache``
+    (a ResponseCache), so concurrent callers share one upstream call.
+    With a ``tracer``, each upstream call is a client span sent on as a
+    ``traceparent`` header.
+
+    For ``adaptive_paths``, the read timeout is ``timeout_multiplier`` x
+    the path's recent p99 latency, between ``min_timeout`` and the
+    configured timeout. A timed-out call counts
+    as a sample at the deadline, so the deadline widens again when the
+    backend slows down for everyone. GETs of ``hedge_paths`` still
+    unanswered after their p95 send one duplicate and use whichever
+    answers first, while ``hedge_budget`` (a fraction of calls) allows.
+    """
+
+    def __init__(self, base_url, name='backend', pool_size=10, timeouts=None,
+                 default_timeout=5.0, connect_timeout=1.0, retries=2,
+                 backoff=0.05, backoff_cap=1.0, metrics=None, cache=None, cache_paths=(),
+                 tracer=None, adaptive_paths=(), timeout_multiplier=3.0, min_timeout=0.1,
+                 hedge_paths=(), hedge_budget=0.05):
+        self.base_url = base_url.rstrip('/')
+        self.name = name
+        self.pool_size = pool_size
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.metrics = metrics
+        self.cache = cache
+        self.cache_paths = frozenset(cache_paths)
+        self.tracer = tracer
+        self.adaptive_paths = frozenset(adaptive_paths)
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.hedge_paths = frozenset(hedge_paths) if hedge_budget > 0 else frozenset()
+        self.hedge_budget = HedgeBudget(hedge_budget)
+        self._trackers = {}
+        self._trackers_lock = threading.Lock()
+        self._hedge_pool = None
+
+        observer = _PoolObserver(metrics, name) if metrics else None
+        adapter = _PooledAdapter(observer=observer, pool_connections=1,
+                                 pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def tracker(self, path):
+        """The path's LatencyTracker, or None when nothing uses latency"""
+        if path not in self.adaptive_paths and path not in self.hedge_paths:
+            return None
+        tracker = self._trackers.get(path)
+        if tracker is None:
+            with self._trackers_lock:
+                tracker = self._trackers.get(path)
+                if tracker is None:
+                    tracker = self._trackers[path] = LatencyTracker()
+                    if self.metrics:
+                        self.metrics.timeout.labels(client=self.name, endpoint=path).set_function(
+                            lambda: self.timeout_for(path)[1])
+        return tracker
+
+    def timeout_for(self, path):
+        """(connect, read) timeouts; the read timeout follows recent latency when adaptive"""
+        ceiling = self.timeouts.get(path, self.default_timeout)
+        if path in self.adaptive_paths:
+            quantiles = self.tracker(path).quantiles()
+            if quantiles is not None:
+                read = max(self.min_timeout, quantiles[1] * self.timeout_multiplier)
+                return (self.connect_timeout, min(ceiling, read))
+        return (self.connect_timeout, ceiling)
+
+    def observe_latency(self, path, seconds):
+        tracker = self.tracker(path)
+        if tracker is not None:
+            tracker.observe(seconds)
+
+    def hedge_delay(self, path):
+        """Seconds to wait before hedging a call to ``path``, or None to not hedge it"""
+        if path not in self.hedge_paths:
+            return None
+        self.hedge_budget.earn()
+        quantiles = self.tracker(path).quantiles()
+        return quantiles[0] if quantiles is not None else None
+
+    def record_hedge(self, path, outcome):
+        """Count a hedge decision: 'sent', 'won', 'wasted' or 'skipped'"""
+        if self.metrics:
+            counter = {'sent': self.metrics.hedges, 'won': self.metrics.hedge_wins,
+                       'wasted': self.metrics.hedges_wasted, 'skipped': self.metrics.hedges_skipped}[outcome]
+            counter.labels(client=self.name, endpoint=path).inc()
+
+    def _sleep_before_retry(self, attempt):
+        time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt)))
+
+    def record_outcome(self, path, outcome):
+        if self.metrics:
+            self.metrics.requests.labels(client=self.name, endpoint=path, outcome=outcome).inc()
+
+    def cacheable(self, path, **kwargs):
+        # Only plain GETs of the configured paths; anything else could vary
+        return self.cache is not None and path in self.cache_paths and set(kwargs) <= {'timeout'}
+
+    def get(self, path, **kwargs):
+        """GET ``path`` relative to the base URL, from the cache when allowed"""
+        if self.cacheable(path, **kwargs):
+            return self.cache.get_or_load(path, lambda: self.fetch(path, **kwargs))
+        return self.fetch(path, **kwargs)
+
+    def fetch(self, path, **kwargs):
+        """GET ``path`` from upstream, retrying transient failures and hedging slow calls"""
+        if self.tracer is None:
+            return self._hedged(path, **kwargs)
+        with self.tracer.start_span(f'GET {path}', kind='client',
+                                    attributes={'peer.service': self.name, 'http.route': path}) as span:
+            kwargs['headers'] = {**kwargs.get('headers', {}), 'traceparent': span.traceparent}
+            response = self._hedged(path, **kwargs)
+            span.set_attribute('http.status_code', response.status_code)
+            span.set_error(response.status_code >= 500)
+            return response
+
+    def _hedged(self, path, **kwargs):
+        delay = self.hedge_delay(path)
+        if delay is None:
+            return self._fetch(path, **kwargs)
+        if self._hedge_pool is None:
+            with self._trackers_lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(
+                        max_workers=2 * self.pool_size, thread_name_prefix=f'{self.name}-hedge')
+        primary = self._hedge_pool.submit(self._fetch, path, **kwargs)
+        if wait([primary], timeout=delay).done:
+            return primary.result()
+        if not self.hedge_budget.spend():
+            self.record_hedge(path, 'skipped')
+            return primary.result()
+        self.record_hedge(path, 'sent')
+        hedge = self._hedge_pool.submit(self._fetch, path, **kwargs)
+        done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        winner = next((f for f in (primary, hedge) if f in done and f.exception() is None), None)
+        if winner is None:
+            # The first to finish failed, so the other one is the last hope
+            wait([primary, hedge])
+            winner = hedge if hedge.exception() is None else primary
+        loser = primary if winner is hedge else hedge
+        self.record_hedge(path, 'won' if winner is hedge else 'wasted')
+        loser.add_done_callback(_close_response)
+        return winner.result()
+
+    def _fetch(self, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout_for(path))
+        url = self.base_url + path
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, **kwargs)
+            except requests.ConnectionError:
+                if last_attempt:
+                    self.record_outcome(path, 'error')
+                    raise
+            except requests.Timeout:
+                self.observe_latency(path, time.perf_counter() - started)
+                self.record_outcome(path, 'timeout')
+                raise
+            else:
+                self.observe_latency(path, time.perf_counter() - started)
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    self.record_outcome(path, str(response.status_code))
+                    return response
+                response.close()
+            if self.metrics:
+                self.metrics.retries.labels(client=self.name, endpoint=path).inc()
+            self._sleep_before_retry(attempt)
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        self.session.close()
+
+
+def _close_response(future):
+    # The losing copy of a hedged call still holds a pooled connection
+    if future.exception() is None:
+        future.result().close()
@@ -0,0 +1,138 @@
+"""Micro-batching of concurrent single-key lookups into one batch call"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100)
+
+
+class BatchMetrics:
+    """Batch counters shared by every batcher, labelled by client name"""
+
+    def __init__(self, registry):
+        self.size = registry.histogram(
+            'backend_client_batch_keys', 'Distinct keys sent per batch call', ['client'],
+            buckets=BATCH_SIZE_BUCKETS)
+        self.callers = registry.counter(
+            'backend_client_batched_calls_total', 'Lookups answered by a batch call', ['client'])
+
+
+class _Batch:
+    def __init__(self, full):
+        self.futures = {}  # key -> Future, in arrival order
+        self.callers = 0
+        self.full = full
+
+
+class _Batcher:
+    def __init__(self, load_batch, window, max_batch, metrics, name):
+        self.load_batch = load_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._open = None
+        if metrics is not None:
+            self._size = metrics.size.labels(client=name)
+            self._callers = metrics.callers.labels(client=name)
+        else:
+            self._size = self._callers = None
+
+    def _join(self, key, batch_factory, future_factory):
+        """Add ``key`` to the open batch, opening one if needed; (batch, future, is leader)"""
+        batch = self._open
+        leader = batch is None
+        if leader:
+            batch = self._open = batch_factory()
+        batch.callers += 1
+        future = batch.futures.get(key)
+        if future is None:
+            future = batch.futures[key] = future_factory()
+            if len(batch.futures) >= self.max_batch:
+                self._open = None
+                batch.full.set()
+        return batch, future, leader
+
+    def _close(self, batch):
+        if self._open is batch:
+            self._open = None
+        if self._size is not None:
+            self._size.observe(len(batch.futures))
+            self._callers.inc(batch.callers)
+        return list(batch.futures)
+
+    @staticmethod
+    def _settle(batch, results=None, error=None):
+        for key, future in batch.futures.items():
+            if error is not None:
+                future.set_exception(error)
+            elif key in results:
+                future.set_result(results[key])
+            else:
+                future.set_exception(KeyError(key))
+
+
+class MicroBatcher(_Batcher):
+    """Groups concurrent ``get(key)`` calls from request threads into one ``load_batch(keys)``.
+
+    The first caller opens a batch and waits up to ``window`` seconds, or
+    until ``max_batch`` distinct keys have joined, then makes the one
+    call for everyone; the others just wait for their result. Callers
+    asking for a key already in the open batch share it. ``load_batch``
+    returns {key: value}: a key missing from it raises KeyError, and an
+    exception from the call is raised in every caller of the batch.
+    """
+
+    def __init__(self, load_batch, window=0.002, max_batch=50, metrics=None, name='backend'):
+        super().__init__(load_batch, window, max_batch, metrics, name)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            batch, future, leader = self._join(key, lambda: _Batch(threading.Event()), Future)
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                keys = self._close(batch)
+            try:
+                results = self.load_batch(keys)
+            except Exception as e:
+                self._settle(batch, error=e)
+            else:
+                self._settle(batch, results)
+        return future.result()
+
+
+class AsyncMicroBatcher(_Batcher):
+    """MicroBatcher for coroutines: ``await get(key)``, with an awaitable ``load_batch``.
+
+    Everything runs on one event loop, so no lock is needed. The batch
+    call runs in its own task, so a cancelled caller never strands the
+    others waiting on it.
+    """
+
+    def __init__(self, load_batch, window=0.002, max_batch=50, metrics=None, name='backend'):
+        super().__init__(load_batch, window, max_batch, metrics, name)
+        self._flushes = set()
+
+    async def get(self, key):
+        loop = asyncio.get_running_loop()
+        batch, future, leader = self._join(key, lambda: _Batch(asyncio.Event()), loop.create_future)
+        if leader:
+            task = loop.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        return await asyncio.shield(future)
+
+    async def _flush(self, batch):
+        try:
+            await asyncio.wait_for(batch.full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        keys = self._close(batch)
+        try:
+            results = await self.load_batch(keys)
+        except Exception as e:
+            self._settle(batch, error=e)
+            for future in batch.futures.values():
+                future.exception()  # mark retrieved when every caller was cancelled
+        else:
+            self._settle(batch, results)
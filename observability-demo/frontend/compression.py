@@ -0,0 +1,33 @@
+"""gzip response compression for Flask apps"""
+import gzip
+
+from flask import request
+
+from telemetry import accepts
+
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript')
+
+
+def init_compression(app, min_size=512, level=6, mimetypes=COMPRESSIBLE_TYPES):
+    """Gzip text responses larger than ``min_size`` when the client accepts it.
+
+    Streamed responses (static files, SSE) are left alone.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        response.vary.add('Accept-Encoding')
+        if (response.direct_passthrough
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in mimetypes
+                or not accepts(request.headers.get('Accept-Encoding'), 'gzip', '*')):
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(gzip.compress(data, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    return app
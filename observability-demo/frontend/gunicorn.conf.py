@@ -0,0 +1,41 @@
+"""Production server settings: `gunicorn -c gunicorn.conf.py app:app`
+
+Runs one process per core (override with WEB_CONCURRENCY) with a thread
+pool each. Metrics are shared between workers through
+METRICS_MULTIPROC_DIR, see telemetry.multiprocess.
+"""
+import multiprocessing
+import os
+
+from telemetry.logs import stop_logging
+from telemetry.runtime import set_request_threads
+from telemetry.tracing import stop_tracing
+from telemetry.multiprocess import flush_all, mark_process_dead, reset_directory
+
+os.environ.setdefault('METRICS_MULTIPROC_DIR', '/tmp/metrics')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = 30
+keepalive = 5
+accesslog = None
+
+
+def on_starting(server):
+    reset_directory()
+
+
+def post_worker_init(worker):
+    set_request_threads(worker.cfg.threads)
+
+
+def worker_exit(server, worker):
+    stop_tracing()
+    stop_logging()
+    flush_all()
+
+
+def child_exit(server, worker):
+    mark_process_dead(worker.pid)
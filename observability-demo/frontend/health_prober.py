@@ -0,0 +1,151 @@
+"""Background health prober that caches a dependency's up/down status"""
+import collections
+import fcntl
+import json
+import os
+import threading
+import time
+
+PROBE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# How stale a non-probing worker's copy of the shared status may get
+SHARED_REFRESH_SECONDS = 1.0
+
+
+class HealthProber:
+    """Checks ``client.get(path)`` every ``interval`` seconds on a daemon thread.
+
+    The latest result, a rolling history of the last ``history`` probes and
+    the availability over that history are kept as one immutable snapshot,
+    so ``status()`` is a plain attribute read. Request handlers can report
+    dependency health without making a call, and probe traffic stays at one
+    call per interval no matter how many clients poll /health.
+
+    With ``shared_dir`` (e.g. METRICS_MULTIPROC_DIR under a pre-fork
+    server) the workers of a host elect one prober with a ``flock``; it
+    writes each snapshot to ``{name}_health.json`` there and the others
+    read it, at most ``SHARED_REFRESH_SECONDS`` old. A worker takes over
+    the probing when the one holding the lock exits, so probe traffic is
+    one call per interval per host rather than per worker.
+    """
+
+    def __init__(self, client, path='/health', interval=5.0, history=60, registry=None,
+                 name='backend', shared_dir=None):
+        self.client = client
+        self.path = path
+        self.interval = interval
+        self._leader = shared_dir is None
+        self._shared_path = self._lock_file = None
+        if shared_dir:
+            self._shared_path = os.path.join(shared_dir, f'{name}_health.json')
+            self._lock_file = open(os.path.join(shared_dir, f'{name}_health.lock'), 'w')
+        self._loaded_at = 0.0
+        self._history = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._status = {
+            'state': 'unknown', 'up': False, 'checked_at': None, 'latency_ms': None,
+            'error': None, 'consecutive_failures': 0, 'availability_percent': None, 'history': [],
+        }
+
+        self._probes = self._duration = None
+        if registry is not None:
+            registry.gauge(f'{name}_status', f'{name} status from the last health probe (1 up, 0 down)',
+                           multiprocess_mode='min').set_function(lambda: int(self.status()['up']))
+            self._probes = registry.counter(f'{name}_health_probes_total',
+                                            f'Health probes sent to {name}', ['result'])
+            self._duration = registry.histogram(f'{name}_health_probe_duration_seconds',
+                                                f'Duration of health probes sent to {name}',
+                                                buckets=PROBE_BUCKETS)
+
+    def probe(self):
+        """Check the dependency now, record the result and return the new status"""
+        started = time.perf_counter()
+        error = None
+        try:
+            response = self.client.get(self.path)
+            up = response.status_code == 200
+            if not up:
+                error = f'HTTP {response.status_code}'
+            response.close()
+        except Exception as e:
+            up, error = False, type(e).__name__
+        latency = time.perf_counter() - started
+        return self.record(up, latency, error)
+
+    def record(self, up, latency, error=None):
+        """Add one probe result (from any caller) and publish a new snapshot"""
+        if self._probes is not None:
+            self._probes.labels(result='up' if up else 'down').inc()
+            self._duration.observe(latency)
+        checked_at = time.time()
+        with self._lock:
+            self._history.append((checked_at, up, latency))
+            failures = 0 if up else self._status['consecutive_failures'] + 1
+            history = list(self._history)
+            self._status = {
+                'state': 'up' if up else 'down',
+                'up': up,
+                'checked_at': checked_at,
+                'latency_ms': round(latency * 1000, 2),
+                'error': error,
+                'consecutive_failures': failures,
+                'availability_percent': round(100 * sum(1 for _, ok, _ in history if ok) / len(history), 1),
+                'history': [{'checked_at': t, 'up': ok, 'latency_ms': round(rt * 1000, 2)}
+                            for t, ok, rt in history],
+            }
+            status = self._status
+        if self._shared_path is not None and self._leader:
+            self._write_shared(status)
+        return status
+
+    def _write_shared(self, status):
+        # Readers see either the old file or the new one, never a partial write
+        temporary = f'{self._shared_path}.{os.getpid()}.tmp'
+        try:
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(status, f)
+            os.replace(temporary, self._shared_path)
+        except OSError:
+            pass
+
+    def _read_shared(self):
+        try:
+            with open(self._shared_path, encoding='utf-8') as f:
+                self._status = json.load(f)
+        except (OSError, ValueError):
+            pass  # nothing probed yet, keep the current snapshot
+
+    def status(self):
+        """Latest cached status snapshot; never blocks on the network"""
+        if not self._leader:
+            now = time.monotonic()
+            if now - self._loaded_at >= SHARED_REFRESH_SECONDS:
+                self._loaded_at = now
+                self._read_shared()
+        return self._status
+
+    def elect(self):
+        """True when this process is the one probing: always without ``shared_dir``"""
+        if not self._leader:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._leader = True
+            except OSError:
+                pass
+        return self._leader
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.elect():
+                self.probe()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'{self.path} prober', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,186 @@
+"""Live dashboard stats over Server-Sent Events from one shared publisher"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE = b': keepalive\n\n'
+
+
+class StreamFull(Exception):
+    """Raised by ``subscribe`` when ``max_subscribers`` streams are open"""
+
+
+class StreamMetrics:
+    """Open streams and published events, exported on /metrics"""
+
+    def __init__(self, registry):
+        self.subscribers = registry.gauge(
+            'stats_stream_subscribers', 'Open /stream/stats connections', multiprocess_mode='sum')
+        self.events = registry.counter(
+            'stats_stream_events_total', 'Events encoded by the stats publisher, by type', ['event'])
+        self.rejected = registry.counter(
+            'stats_stream_rejected_total', 'Stream requests refused because the subscriber limit was reached')
+
+
+def encode_event(event, version, data):
+    payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+    return f'id: {version}\nevent: {event}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class StatsPublisher:
+    """Samples ``snapshot()`` every ``interval`` seconds and publishes what changed.
+
+    One daemon thread does the sampling while at least one client is
+    subscribed, and stops when the last one leaves. Each change becomes
+    a ``stats`` event holding only the changed keys, encoded once and
+    written as-is to every subscriber, so the cost per tick does not
+    depend on the number of clients. A client that has just connected,
+    or that missed an event, gets the whole state as one ``snapshot``
+    event instead, so deltas always apply to what the page shows.
+    Streams end after ``max_seconds`` and the browser reconnects, and a
+    comment is sent every ``keepalive`` seconds without changes, so dead
+    connections are noticed.
+    """
+
+    def __init__(self, snapshot, interval=1.0, keepalive=15.0, max_seconds=300.0,
+                 max_subscribers=4, retry_ms=3000, registry=None):
+        self.snapshot = snapshot
+        self.interval = interval
+        self.keepalive = keepalive
+        self.max_seconds = max_seconds
+        self.max_subscribers = max_subscribers
+        self.retry = f'retry: {retry_ms}\n\n'.encode('ascii')
+        self.subscribers = 0
+        self._version = 0
+        self._state = {}
+        self._delta = None
+        self._full = None
+        self._async_waiters = set()
+        self._thread = None
+        self._cond = threading.Condition()
+        self._events = self._rejected = None
+        if registry is not None:
+            metrics = StreamMetrics(registry)
+            metrics.subscribers.set_function(lambda: self.subscribers)
+            self._events = {event: metrics.events.labels(event=event) for event in ('stats', 'snapshot')}
+            self._rejected = metrics.rejected
+
+    def subscribe(self):
+        """Open a stream; raises StreamFull at ``max_subscribers``. Close it when done."""
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                if self._rejected is not None:
+                    self._rejected.inc()
+                raise StreamFull(f'{self.subscribers} streams open')
+            self.subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stats publisher', daemon=True)
+                self._thread.start()
+        return Subscription(self)
+
+    def _unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def publish(self):
+        """Sample the stats once and publish the keys that changed"""
+        state = {key: str(value) for key, value in self.snapshot().items()}
+        with self._cond:
+            delta = {key: value for key, value in state.items() if self._state.get(key) != value}
+            if not delta:
+                return
+            self._version += 1
+            self._state = state
+            self._delta = encode_event('stats', self._version, delta)
+            self._full = None
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, set()
+        if self._events is not None:
+            self._events['stats'].inc()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self.subscribers == 0:
+                    self._thread = None
+                    return
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("Stats snapshot failed")
+            time.sleep(self.interval)
+
+    def _next(self, seen):
+        """(version, event bytes or None) for a subscriber that has seen ``seen``; hold _cond"""
+        if self._version == seen:
+            return seen, None
+        if seen == self._version - 1:
+            return self._version, self._delta
+        if self._full is None:
+            self._full = encode_event('snapshot', self._version, self._state)
+            if self._events is not None:
+                self._events['snapshot'].inc()
+        return self._version, self._full
+
+
+class Subscription:
+    """One client's stream: iterate it from a WSGI server, or ``events_async`` from ASGI"""
+
+    def __init__(self, publisher):
+        self.publisher = publisher
+        self._closed = False
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.publisher._unsubscribe()
+
+    def __iter__(self):
+        publisher = self.publisher
+        deadline = time.monotonic() + publisher.max_seconds
+        seen = 0
+        try:
+            yield publisher.retry
+            while time.monotonic() < deadline:
+                with publisher._cond:
+                    if publisher._version == seen:
+                        publisher._cond.wait(publisher.keepalive)
+                    seen, event = publisher._next(seen)
+                yield event or KEEPALIVE
+        finally:
+            self.close()
+
+    async def events_async(self):
+        publisher = self.publisher
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + publisher.max_seconds
+        seen = 0
+        try:
+            yield publisher.retry
+            while time.monotonic() < deadline:
+                with publisher._cond:
+                    version, event = publisher._next(seen)
+                    if event is None:
+                        future = loop.create_future()
+                        publisher._async_waiters.add((loop, future))
+                if event is not None:
+                    seen = version
+                    yield event
+                    continue
+                try:
+                    await asyncio.wait_for(future, publisher.keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+        finally:
+            self.close()
@@ -0,0 +1,317 @@
+"""Open-loop, rate-controlled HTTP load generator.
+
+A scheduler thread computes when each request *should* be sent (a fixed
+rate, or Poisson arrivals at that rate) and hands it to a pool of worker
+threads. Sending never waits for earlier responses, so a stalled server
+does not slow the offered load. Latency is measured from the intended send
+time (corrected) as well as from the moment a worker actually sent the
+request (uncorrected). The gap between the two is the coordinated omission
+a closed-loop generator would have hidden.
+
+Embedded, the frontend runs one at a low rate for background traffic.
+Standalone it drives capacity tests and writes an HDR-style percentile
+report:
+
+    PYTHONPATH=. python frontend/loadgen.py http://localhost:8080 \\
+        --rate 50 --duration 60 --workers 64 --mix "/=50,/health=20,/slow=15,/error=5"
+"""
+import argparse
+import collections
+import math
+import queue
+import random
+import sys
+import threading
+import time
+
+from telemetry import QuantileSketch
+
+DEFAULT_MIX = {'/': 50, '/health': 20, '/metrics': 10, '/slow': 15, '/error': 5}
+LOADGEN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def parse_mix(text):
+    """Parse "/=50,/health=20" into {'/': 50.0, '/health': 20.0}"""
+    mix = {}
+    for part in text.split(','):
+        path, _, weight = part.strip().rpartition('=')
+        if not path or float(weight) < 0:
+            raise ValueError(f"Invalid mix entry {part!r}, expected PATH=WEIGHT")
+        mix[path] = float(weight)
+    if not any(mix.values()):
+        raise ValueError("Endpoint mix needs at least one positive weight")
+    return mix
+
+
+class LoadMetrics:
+    """Load generator metrics for a registry (e.g. the frontend's /metrics)"""
+
+    def __init__(self, registry):
+        self.requests = registry.counter(
+            'loadgen_requests_total', 'Requests sent by the load generator', ['endpoint', 'outcome'])
+        self.latency = registry.histogram(
+            'loadgen_latency_seconds', 'Load generator latency from the intended send time',
+            ['endpoint'], buckets=LOADGEN_BUCKETS)
+        self.send_lag = registry.histogram(
+            'loadgen_send_lag_seconds', 'Delay between intended and actual send time',
+            buckets=LOADGEN_BUCKETS)
+        self.backlog = registry.gauge(
+            'loadgen_backlog', 'Scheduled requests waiting for a free worker', multiprocess_mode='sum')
+
+
+class _WorkerStats:
+    """Latency sketches and outcome counts owned by one worker thread"""
+
+    def __init__(self):
+        self.corrected = QuantileSketch()
+        self.uncorrected = QuantileSketch()
+        self.max_corrected = 0.0
+        self.max_uncorrected = 0.0
+        self.outcomes = collections.Counter()
+
+
+class LoadGenerator:
+    """Sends GETs through ``client`` at ``rate`` requests/second.
+
+    ``client`` is anything with ``get(path)`` returning a response with a
+    ``status_code`` (a BackendClient). ``mix`` maps paths to weights.
+    ``workers`` bounds concurrency; scheduled requests that find every
+    worker busy queue up (at most ``max_backlog``, beyond which they are
+    counted as dropped) and their queueing time shows in the corrected
+    latency.
+    """
+
+    def __init__(self, client, rate, mix=None, workers=8, arrivals='poisson',
+                 max_backlog=10000, metrics=None, seed=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if arrivals not in ('poisson', 'uniform'):
+            raise ValueError("arrivals must be 'poisson' or 'uniform'")
+        self.client = client
+        self.rate = rate
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.workers = workers
+        self.arrivals = arrivals
+        self.max_backlog = max_backlog
+        self.metrics = metrics
+        self._random = random.Random(seed)
+        self._paths = list(self.mix)
+        self._weights = [self.mix[p] for p in self._paths]
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        self._stats = []
+        self._stats_lock = threading.Lock()
+        self.scheduled = 0
+        self.dropped = 0
+        self.started_at = None
+        self.stopped_at = None
+        if metrics is not None:
+            metrics.backlog.set_function(self._queue.qsize)
+
+    def _next_gap(self):
+        if self.arrivals == 'uniform':
+            return 1.0 / self.rate
+        return self._random.expovariate(self.rate)
+
+    def _schedule(self, deadline):
+        next_send = time.perf_counter()
+        while not self._stop.is_set() and (deadline is None or next_send < deadline):
+            delay = next_send - time.perf_counter()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            path = self._random.choices(self._paths, self._weights)[0]
+            self.scheduled += 1
+            if self._queue.qsize() >= self.max_backlog:
+                self.dropped += 1
+                if self.metrics is not None:
+                    self.metrics.requests.labels(endpoint=path, outcome='dropped').inc()
+            else:
+                self._queue.put((next_send, path))
+            next_send += self._next_gap()
+        for _ in range(self.workers):
+            self._queue.put(None)
+
+    def _work(self):
+        stats = _WorkerStats()
+        with self._stats_lock:
+            self._stats.append(stats)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            intended, path = item
+            sent = time.perf_counter()
+            try:
+                response = self.client.get(path)
+                outcome = str(response.status_code)
+                response.close()
+            except Exception as e:
+                outcome = type(e).__name__
+            done = time.perf_counter()
+            corrected, uncorrected = done - intended, done - sent
+            stats.corrected.add(corrected)
+            stats.uncorrected.add(uncorrected)
+            stats.max_corrected = max(stats.max_corrected, corrected)
+            stats.max_uncorrected = max(stats.max_uncorrected, uncorrected)
+            stats.outcomes[outcome] += 1
+            if self.metrics is not None:
+                self.metrics.requests.labels(endpoint=path, outcome=outcome).inc()
+                self.metrics.latency.labels(endpoint=path).observe(corrected)
+                self.metrics.send_lag.observe(sent - intended)
+
+    def start(self, duration=None):
+        """Start the scheduler and workers; runs until stop() or ``duration`` seconds"""
+        self.started_at = time.perf_counter()
+        deadline = self.started_at + duration if duration else None
+        self._threads = [threading.Thread(target=self._work, name=f'loadgen-worker-{i}', daemon=True)
+                         for i in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._schedule, args=(deadline,),
+                                              name='loadgen-scheduler', daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def join(self):
+        """Wait for the schedule to finish and every sent request to complete"""
+        for thread in self._threads:
+            thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, duration):
+        self.start(duration)
+        self.join()
+        return self.result()
+
+    def result(self):
+        """Merged LoadResult over every worker so far"""
+        corrected, uncorrected = QuantileSketch(), QuantileSketch()
+        outcomes = collections.Counter()
+        max_corrected = max_uncorrected = 0.0
+        with self._stats_lock:
+            stats = list(self._stats)
+        for s in stats:
+            corrected.merge(s.corrected)
+            uncorrected.merge(s.uncorrected)
+            outcomes.update(s.outcomes)
+            max_corrected = max(max_corrected, s.max_corrected)
+            max_uncorrected = max(max_uncorrected, s.max_uncorrected)
+        if self.dropped:
+            outcomes['dropped'] = self.dropped
+        elapsed = ((self.stopped_at or time.perf_counter()) - self.started_at) if self.started_at else 0
+        return LoadResult(self.rate, elapsed, self.scheduled, outcomes,
+                          corrected, uncorrected, max_corrected, max_uncorrected)
+
+
+class LoadResult:
+    """Outcome counts and latency distributions of one load run"""
+
+    def __init__(self, rate, elapsed, scheduled, outcomes, corrected, uncorrected,
+                 max_corrected, max_uncorrected):
+        self.rate = rate
+        self.elapsed = elapsed
+        self.scheduled = scheduled
+        self.outcomes = outcomes
+        self.corrected = corrected
+        self.uncorrected = uncorrected
+        self.max_corrected = max_corrected
+        self.max_uncorrected = max_uncorrected
+
+    @property
+    def completed(self):
+        return self.corrected.count
+
+    def summary(self):
+        lines = [
+            f"Target rate {self.rate:g} req/s, ran {self.elapsed:.1f}s: "
+            f"{self.scheduled} scheduled, {self.completed} completed "
+            f"({self.completed / self.elapsed if self.elapsed else 0:.1f} req/s)",
+            "Outcomes: " + ', '.join(f'{k}={v}' for k, v in sorted(self.outcomes.items())),
+            f"{'':<24}{'p50':>10}{'p90':>10}{'p99':>10}{'p99.9':>10}{'max':>10}  (ms)",
+        ]
+        for label, sketch, peak in (('corrected (intended)', self.corrected, self.max_corrected),
+                                    ('uncorrected (sent)', self.uncorrected, self.max_uncorrected)):
+            q = sketch.quantiles((0.5, 0.9, 0.99, 0.999))
+            lines.append(f"{label:<24}" + ''.join(f'{min(q[p], peak) * 1000:>10.1f}' for p in (0.5, 0.9, 0.99, 0.999))
+                         + f'{peak * 1000:>10.1f}')
+        return '\n'.join(lines)
+
+    def percentile_distribution(self, corrected=True, ticks_per_half_distance=5):
+        """HdrHistogram-style percentile spectrum (values in milliseconds)"""
+        sketch = self.corrected if corrected else self.uncorrected
+        peak = self.max_corrected if corrected else self.max_uncorrected
+        count = sketch.count
+        lines = [f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>16}", '']
+        if not count:
+            return '\n'.join(lines)
+        levels = [0.0]
+        half = 0
+        while 2 ** half <= count:
+            width = 0.5 ** (half + 1)
+            start = 1 - 2 * width
+            levels.extend(start + width * t / ticks_per_half_distance
+                          for t in range(1, ticks_per_half_distance + 1))
+            half += 1
+        values = sketch.quantiles(levels)
+        for p in levels:
+            lines.append(f"{min(values[p], peak) * 1000:>12.3f} {p:>14.12f} "
+                         f"{math.ceil(p * count):>10} {1 / (1 - p):>16.2f}")
+        lines.append(f"{peak * 1000:>12.3f} {1.0:>14.12f} {count:>10}")
+        mean = sketch.sum / count
+        lines.append(f"#[Mean    = {mean * 1000:>12.3f}, Total count    = {count:>12}]")
+        lines.append(f"#[Max     = {peak * 1000:>12.3f}, Relative error = {sketch.relative_accuracy:>12.2%}]")
+        return '\n'.join(lines)
+
+    def report(self):
+        return '\n\n'.join([
+            self.summary(),
+            'Latency from intended send time (coordinated-omission corrected)',
+            self.percentile_distribution(corrected=True),
+            'Latency from actual send time (uncorrected)',
+            self.percentile_distribution(corrected=False),
+        ]) + '\n'
+
+
+def main(argv=None):
+    from backend_client import BackendClient
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url', help='base URL, e.g. http://localhost:8080')
+    parser.add_argument('--rate', type=float, default=10.0, help='target requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to send for')
+    parser.add_argument('--workers', type=int, default=32, help='concurrent requests in flight')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='weighted endpoints, e.g. "/=50,/health=20,/slow=15"')
+    parser.add_argument('--arrivals', choices=('poisson', 'uniform'), default='poisson')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request read timeout')
+    parser.add_argument('--seed', type=int, help='seed for arrivals and the endpoint mix')
+    parser.add_argument('--report', help='write the report to this file as well')
+    args = parser.parse_args(argv)
+
+    client = BackendClient(args.url, name='loadgen', pool_size=args.workers,
+                           default_timeout=args.timeout, retries=0)
+    generator = LoadGenerator(client, args.rate, args.mix, workers=args.workers,
+                              arrivals=args.arrivals, seed=args.seed)
+    print(f"Sending {args.rate:g} req/s to {args.url} for {args.duration:g}s "
+          f"with {args.workers} workers", file=sys.stderr)
+    try:
+        result = generator.run(args.duration)
+    except KeyboardInterrupt:
+        generator.stop()
+        generator.join()
+        result = generator.result()
+    finally:
+        client.close()
+
+    report = result.report()
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(report)
+    print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""TTL/LRU cache for upstream GET responses, with single-flight loading"""
+import collections
+import threading
+import time
+
+
+def parse_cache_control(header):
+    """Split a Cache-Control header into {directive: value or None}"""
+    directives = {}
+    for part in (header or '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.strip().lower()] = value.strip().strip('"') or None
+    return directives
+
+
+def freshness_lifetime(headers, default_ttl):
+    """Seconds a response may be served from a shared cache, or 0 to not store it.
+
+    Follows the shared-cache rules: no-store, no-cache and private are
+    not stored, s-maxage wins over max-age, and the Age header is
+    subtracted. Without Cache-Control, ``default_ttl`` applies.
+    """
+    header = headers.get('Cache-Control')
+    if header is None:
+        return default_ttl
+    directives = parse_cache_control(header)
+    if {'no-store', 'no-cache', 'private'} & directives.keys():
+        return 0
+    max_age = directives.get('s-maxage') or directives.get('max-age')
+    if max_age is None:
+        return default_ttl
+    try:
+        age = float(headers.get('Age') or 0)
+        return max(0.0, float(max_age) - age)
+    except ValueError:
+        return 0
+
+
+class CacheMetrics:
+    """Response cache counters shared by every client, labelled by client name"""
+
+    def __init__(self, registry):
+        self.hits = registry.counter(
+            'backend_client_cache_hits_total', 'Calls answered from the response cache', ['client'])
+        self.misses = registry.counter(
+            'backend_client_cache_misses_total', 'Calls that went upstream to fill the cache', ['client'])
+        self.coalesced = registry.counter(
+            'backend_client_cache_coalesced_total',
+            'Calls that waited for an identical in-flight upstream call instead of making their own',
+            ['client'])
+        self.evictions = registry.counter(
+            'backend_client_cache_evictions_total', 'Cache entries removed, by reason',
+            ['client', 'reason'])
+        self.entries = registry.gauge(
+            'backend_client_cache_entries', 'Responses currently cached', ['client'],
+            multiprocess_mode='sum')
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class ResponseCache:
+    """Bounded LRU of responses, each kept for its own freshness lifetime.
+
+    ``get_or_load`` lets exactly one thread call the loader for a missing
+    key; concurrent callers for the same key wait for that call and share
+    its response (or its exception). Only 200 responses are stored, for
+    as long as their Cache-Control allows (``default_ttl`` when absent).
+    """
+
+    def __init__(self, max_entries=256, default_ttl=0.0, metrics=None, name='backend',
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self._hits = self._misses = self._coalesced = self._evictions = None
+        if metrics is not None:
+            self._hits = metrics.hits.labels(client=name)
+            self._misses = metrics.misses.labels(client=name)
+            self._coalesced = metrics.coalesced.labels(client=name)
+            self._evictions = metrics.evictions
+            self._name = name
+            metrics.entries.labels(client=name).set_function(lambda: len(self._entries))
+
+    def record(self, result):
+        """Count a 'hit', 'miss' or 'coalesced' lookup"""
+        counter = {'hit': self._hits, 'miss': self._misses, 'coalesced': self._coalesced}[result]
+        if counter is not None:
+            counter.inc()
+
+    def _evicted(self, reason):
+        if self._evictions is not None:
+            self._evictions.labels(client=self._name, reason=reason).inc()
+
+    def _fresh(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, response = entry
+        if expires <= self._clock():
+            del self._entries[key]
+            self._evicted('expired')
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def lookup(self, key):
+        """Fresh cached response for ``key`` or None; counts a hit when found"""
+        with self._lock:
+            response = self._fresh(key)
+        if response is not None:
+            self.record('hit')
+        return response
+
+    def store(self, key, response):
+        """Cache ``response`` if it is a 200 with a positive freshness lifetime"""
+        if response.status_code != 200 or self.max_entries <= 0:
+            return False
+        ttl = freshness_lifetime(response.headers, self.default_ttl)
+        if ttl <= 0:
+            return False
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evicted('size')
+        return True
+
+    def get_or_load(self, key, loader):
+        """Cached response for ``key``, else ``loader()``'s, loaded once however many threads ask"""
+        with self._lock:
+            response = self._fresh(key)
+            if response is None:
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+        if response is not None:
+            self.record('hit')
+            return response
+        if not leader:
+            self.record('coalesced')
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        self.record('miss')
+        try:
+            flight.response = loader()
+            self.store(key, flight.response)
+            return flight.response
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
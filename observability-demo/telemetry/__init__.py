@@ -0,0 +1,33 @@
+"""Shared metrics primitives for the observability demo services"""
+from .admission import AdmissionController, Rejected, admission_from_env, admit_flask_app
+from .asgi import Response, StreamingResponse, asgi_app, json_response, response_from
+from .exposition import CONTENT_TYPE_OPENMETRICS, CONTENT_TYPE_TEXT, Exposition, accepts
+from .histogram import DEFAULT_BUCKETS, Histogram
+from .history import TimeSeriesHistory, history_flask_app, history_from_env, parse_duration
+from .instrumentation import RequestMetrics, flask_routes, instrument_flask_app, route_labels
+from .logs import JsonFormatter, LogMetrics, configure_logging, stop_logging
+from .metrics import Counter, Family, Gauge
+from .multiprocess import MultiProcessCollector, exporter_for
+from .profiler import SamplingProfiler, collapse, profile_flask_app, profiler_from_env
+from .quantiles import DEFAULT_QUANTILES, QuantileSketch, WindowedQuantiles
+from .registry import Registry
+from .runtime import RuntimeMetrics, runtime_from_env, set_request_threads
+from .tracing import Tracer, parse_traceparent, stop_tracing, trace_flask_app, tracer_from_env
+from .window import DEFAULT_WINDOWS, SlidingWindowStats, window_label
+
+__all__ = [
+    'Counter', 'Family', 'Gauge', 'Registry',
+    'DEFAULT_BUCKETS', 'Histogram',
+    'DEFAULT_QUANTILES', 'QuantileSketch', 'WindowedQuantiles',
+    'MultiProcessCollector', 'exporter_for',
+    'DEFAULT_WINDOWS', 'SlidingWindowStats', 'window_label',
+    'JsonFormatter', 'LogMetrics', 'configure_logging', 'stop_logging',
+    'Tracer', 'parse_traceparent', 'stop_tracing', 'trace_flask_app', 'tracer_from_env',
+    'Response', 'StreamingResponse', 'asgi_app', 'json_response', 'response_from',
+    'CONTENT_TYPE_OPENMETRICS', 'CONTENT_TYPE_TEXT', 'Exposition', 'accepts',
+    'AdmissionController', 'Rejected', 'admission_from_env', 'admit_flask_app',
+    'RequestMetrics', 'flask_routes', 'instrument_flask_app', 'route_labels',
+    'SamplingProfiler', 'collapse', 'profile_flask_app', 'profiler_from_env',
+    'RuntimeMetrics', 'runtime_from_env', 'set_request_threads',
+    'TimeSeriesHistory', 'history_flask_app', 'history_from_env', 'parse_duration',
+]
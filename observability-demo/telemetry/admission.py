@@ -0,0 +1,228 @@
+"""Admission control: per-route concurrency limits with load shedding.
+
+Each route may run at most ``limit`` requests at once. A request over the
+limit waits for a slot, but only up to ``queue_target`` seconds; after
+that it is rejected with 503, and when the route already has ``limit``
+requests waiting it is rejected at once with 429. Both carry a
+``Retry-After`` based on the route's recent latency. A saturated slow
+route therefore sheds its own excess quickly instead of tying up the
+server threads the cheap routes need.
+
+With ``adaptive`` on, the limit follows AIMD on service latency: it
+grows by 1/limit per request that completes near the route's long-run
+latency while the limit is in use, and shrinks by ``backoff`` (at most
+once per latency period) when the short-run average rises past
+``tolerance`` times the long-run one. The configured limit is the cap.
+"""
+import math
+import os
+import threading
+import time
+
+from .logs import parse_route_rates
+
+QUEUE_DELAY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class AdmissionMetrics:
+    """Limits, occupancy, queueing delay and rejections per route, exported on /metrics"""
+
+    def __init__(self, registry):
+        self.limit = registry.gauge(
+            'admission_concurrency_limit', 'Current concurrency limit', ['route'])
+        self.in_flight = registry.gauge(
+            'admission_in_flight', 'Requests running', ['route'], multiprocess_mode='sum')
+        self.queued = registry.gauge(
+            'admission_queued', 'Requests waiting for a slot', ['route'], multiprocess_mode='sum')
+        self.queue_delay = registry.histogram(
+            'admission_queue_delay_seconds', 'Time admitted requests waited for a slot', ['route'],
+            buckets=QUEUE_DELAY_BUCKETS)
+        self.rejected = registry.counter(
+            'admission_rejected_total', 'Requests shed by admission control, by reason',
+            ['route', 'reason'])
+
+
+class Rejected(Exception):
+    """Raised by ``acquire`` when a request is shed"""
+
+    def __init__(self, route, reason, status, retry_after):
+        super().__init__(f'{route}: {reason}')
+        self.route = route
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _RouteLimiter:
+    def __init__(self, route, cap, controller):
+        self.route = route
+        self.cap = cap
+        self.limit = float(cap)
+        self.in_flight = 0
+        self.waiting = 0
+        self.short = self.long = None
+        self._next_decrease = 0.0
+        self._controller = controller
+        self._cond = threading.Condition()
+        metrics = controller.metrics
+        self._queue_delay = self._queue_full = self._queue_timeout = None
+        if metrics is not None:
+            metrics.limit.labels(route=route).set_function(lambda: self.limit)
+            metrics.in_flight.labels(route=route).set_function(lambda: self.in_flight)
+            metrics.queued.labels(route=route).set_function(lambda: self.waiting)
+            self._queue_delay = metrics.queue_delay.labels(route=route)
+            self._queue_full = metrics.rejected.labels(route=route, reason='queue_full')
+            self._queue_timeout = metrics.rejected.labels(route=route, reason='queue_timeout')
+
+    def retry_after(self):
+        """Whole seconds until a slot is likely free: the long-run latency, at least 1"""
+        return max(1, math.ceil(self.long or 0))
+
+    def _reject(self, reason, status, counter):
+        if counter is not None:
+            counter.inc()
+        return Rejected(self.route, reason, status, self.retry_after())
+
+    def acquire(self):
+        started = time.monotonic()
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                if self.waiting >= int(self.limit):
+                    raise self._reject('queue_full', 429, self._queue_full)
+                deadline = started + self._controller.queue_target
+                self.waiting += 1
+                try:
+                    while self.in_flight >= int(self.limit):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise self._reject('queue_timeout', 503, self._queue_timeout)
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+        if self._queue_delay is not None:
+            self._queue_delay.observe(time.monotonic() - started)
+
+    def release(self, latency):
+        with self._cond:
+            self.in_flight -= 1
+            if self._controller.adaptive:
+                self._adapt(latency)
+            self._cond.notify(max(1, int(self.limit) - self.in_flight))
+
+    def _adapt(self, latency):
+        controller = self._controller
+        if self.long is None:
+            self.short = self.long = latency
+            return
+        self.short += (latency - self.short) * controller.short_alpha
+        self.long += (latency - self.long) * controller.long_alpha
+        now = time.monotonic()
+        if self.short > self.long * controller.tolerance:
+            if now >= self._next_decrease:
+                self.limit = max(controller.min_limit, self.limit * controller.backoff)
+                self._next_decrease = now + self.short
+        elif (self.in_flight + 1) * 2 >= self.limit:
+            self.limit = min(self.cap, self.limit + 1 / self.limit)
+
+
+class AdmissionController:
+    """Per-route limiters; ``limits`` maps routes to caps, with '*' for the rest.
+
+    Routes in ``exempt`` (and routes with a cap of 0) are never limited.
+    """
+
+    def __init__(self, limits=None, queue_target=0.05, adaptive=True, min_limit=1,
+                 tolerance=2.0, backoff=0.9, short_alpha=0.1, long_alpha=0.01,
+                 exempt=(), registry=None):
+        self.limits = dict(limits or {})
+        self.queue_target = queue_target
+        self.adaptive = adaptive
+        self.min_limit = min_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.short_alpha = short_alpha
+        self.long_alpha = long_alpha
+        self.exempt = frozenset(exempt)
+        self.metrics = AdmissionMetrics(registry) if registry is not None else None
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, route):
+        """The route's limiter, or None when it is not limited"""
+        limiter = self._limiters.get(route)
+        if limiter is None and route not in self.exempt:
+            cap = int(self.limits.get(route, self.limits.get('*', 0)))
+            if cap <= 0:
+                return None
+            with self._lock:
+                limiter = self._limiters.get(route)
+                if limiter is None:
+                    limiter = self._limiters[route] = _RouteLimiter(route, cap, self)
+        return limiter
+
+    def acquire(self, route):
+        """Take a slot for ``route``, waiting up to queue_target; raises Rejected.
+
+        Returns the limiter to ``release`` when done, or None for an
+        unlimited route.
+        """
+        limiter = self.limiter(route)
+        if limiter is not None:
+            limiter.acquire()
+        return limiter
+
+
+def admission_from_env(registry=None, limits=None, exempt=('/health', '/metrics')):
+    """AdmissionController configured from the environment.
+
+    ``ADMISSION_LIMITS`` (route=cap list, see ``parse_route_rates``) is
+    laid over ``limits``; ``ADMISSION_QUEUE_TARGET_MS`` (50) and
+    ``ADMISSION_ADAPTIVE`` (1) set the queueing target and AIMD.
+    ``ADMISSION_LIMITS='*=0'`` with no other routes turns it off.
+    """
+    limits = dict(limits or {}, **parse_route_rates(os.getenv('ADMISSION_LIMITS')))
+    return AdmissionController(
+        limits=limits,
+        queue_target=float(os.getenv('ADMISSION_QUEUE_TARGET_MS', '50')) / 1000,
+        adaptive=os.getenv('ADMISSION_ADAPTIVE', '1') not in ('0', 'false', 'no'),
+        exempt=exempt,
+        registry=registry,
+    )
+
+
+def admit_flask_app(app, controller):
+    """Admission control for every request of a Flask app, keyed by its URL rule.
+
+    Shed requests get a JSON error with ``Retry-After`` instead of running
+    the view. The slot is released on teardown, so views that raise
+    still give it back.
+    """
+    from flask import jsonify, request
+
+    @app.before_request
+    def _admit():
+        current = request._get_current_object()
+        if current.url_rule is None:
+            return None
+        route = current.url_rule.rule
+        try:
+            limiter = controller.acquire(route)
+        except Rejected as e:
+            response = jsonify({"error": "Server overloaded, retry later", "route": route,
+                                "reason": e.reason, "retry_after_seconds": e.retry_after})
+            response.status_code = e.status
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        if limiter is not None:
+            current.environ['telemetry.admission'] = (limiter, time.monotonic())
+        return None
+
+    @app.teardown_request
+    def _release(exc):
+        entry = request.environ.pop('telemetry.admission', None)
+        if entry is not None:
+            limiter, started = entry
+            limiter.release(time.monotonic() - started)
+
+    return app
@@ -0,0 +1,151 @@
+"""Small ASGI server scaffolding shared by the services' asyncio modes.
+
+``asgi_app`` turns a ``{path: handler}`` table into an ASGI application
+that records the same RED metrics and server spans as the Flask request
+hooks. A handler is ``async handler(request_headers, query)`` returning a
+``Response``: header names are lower case and ``query`` holds the last
+value of each parameter. Unknown paths answer 404 and are recorded as
+'unmatched', methods other than GET and HEAD answer 405, and a handler
+that raises answers 500.
+"""
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+
+from .instrumentation import UNMATCHED_ROUTE
+
+
+class Response:
+    def __init__(self, body, status=200, content_type='application/json', headers=None):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.status = status
+        self.headers = {'content-type': content_type, **(headers or {})}
+
+
+class StreamingResponse(Response):
+    """Body sent chunk by chunk from an async iterator; ``close`` runs when it ends"""
+
+    def __init__(self, chunks, content_type, headers=None, close=None):
+        super().__init__(b'', 200, content_type, headers)
+        self.chunks = chunks
+        self.close = close
+
+
+def json_response(data, status=200, headers=None):
+    return Response(json.dumps(data), status, headers=headers)
+
+
+def response_from(body, status, headers):
+    """Response for a ``(body, status, headers)`` result, e.g. of ``SamplingProfiler.respond``"""
+    headers = {k.lower(): v for k, v in headers.items()}
+    return Response(body, status, headers['content-type'], headers)
+
+
+async def lifespan(receive, send, startup=None, shutdown=None):
+    """Answer the lifespan protocol, awaiting ``startup()`` and ``shutdown()`` when given"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if startup is not None:
+                await startup()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if shutdown is not None:
+                await shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def _header_list(headers):
+    return [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]
+
+
+async def send_stream(response, receive, send):
+    """Send a StreamingResponse until it ends or the client disconnects"""
+    async def pump():
+        await send({'type': 'http.response.start', 'status': response.status,
+                    'headers': _header_list(response.headers)})
+        async for chunk in response.chunks:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await response.chunks.aclose()
+        if response.close is not None:
+            response.close()
+
+
+async def send_response(response, method, receive, send):
+    """Send a Response (no body for HEAD), or stream a StreamingResponse"""
+    if isinstance(response, StreamingResponse):
+        await send_stream(response, receive, send)
+        return
+    headers = dict(response.headers, **{'content-length': str(len(response.body))})
+    await send({'type': 'http.response.start', 'status': response.status,
+                'headers': _header_list(headers)})
+    await send({'type': 'http.response.body', 'body': b'' if method == 'HEAD' else response.body})
+
+
+def asgi_app(routes, request_metrics, tracer, logger, path_labels=None, after=None,
+             startup=None, shutdown=None):
+    """ASGI application serving ``routes``.
+
+    ``path_labels`` maps a path to the label its requests are recorded
+    under when that differs from the path (e.g. the Flask rule of a static
+    file). ``after(response, request_headers)`` may replace each handler's
+    response, e.g. to compress it. ``startup`` and ``shutdown`` are
+    coroutine functions run from the lifespan protocol.
+    """
+    path_labels = path_labels or {}
+
+    async def app(scope, receive, send):
+        """ASGI entry point"""
+        if scope['type'] == 'lifespan':
+            await lifespan(receive, send, startup, shutdown)
+            return
+        if scope['type'] != 'http':
+            return
+
+        started = time.perf_counter()
+        request_headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+        query = {k: v[-1] for k, v in parse_qs(scope['query_string'].decode('latin-1')).items()}
+        handler = routes.get(scope['path'])
+        route = path_labels.get(scope['path'], scope['path']) if handler is not None else UNMATCHED_ROUTE
+        request_metrics.in_flight.inc()
+        try:
+            with tracer.start_span(
+                    f"{scope['method']} {route}", kind='server', traceparent=request_headers.get('traceparent'),
+                    attributes={'http.method': scope['method'], 'http.route': route}) as span:
+                if handler is None:
+                    response = json_response({"error": "Not found"}, 404)
+                elif scope['method'] not in ('GET', 'HEAD'):
+                    response = json_response({"error": "Method not allowed"}, 405)
+                else:
+                    try:
+                        response = await handler(request_headers, query)
+                        if after is not None:
+                            response = after(response, request_headers)
+                    except Exception:
+                        logger.exception("Application error", extra={'route': scope['path']})
+                        response = json_response({"error": "Internal Server Error"}, 500)
+                span.set_attribute('http.status_code', response.status)
+                span.set_error(response.status >= 500)
+                request_metrics.observe(scope['method'], route, response.status,
+                                        time.perf_counter() - started, tracer.exemplar())
+        finally:
+            request_metrics.in_flight.dec()
+
+        await send_response(response, scope['method'], receive, send)
+
+    return app
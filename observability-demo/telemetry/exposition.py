@@ -0,0 +1,204 @@
+"""Cached /metrics exposition in Prometheus text or OpenMetrics format"""
+import gzip
+import time
+
+from .metrics import Family, format_labels, format_value
+
+CONTENT_TYPE_TEXT = 'text/plain; version=0.0.4; charset=utf-8'
+CONTENT_TYPE_OPENMETRICS = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# OpenMetrics caps the combined length of an exemplar's label names and values
+MAX_EXEMPLAR_LABEL_CHARS = 128
+
+
+def accepts(header, token, wildcard=None):
+    """True when an Accept-style header allows ``token``.
+
+    Used for both Accept and Accept-Encoding. The token's own q-value wins
+    over ``wildcard``'s (e.g. ``*`` for encodings), whatever their order,
+    and ``q=0`` refuses. Without a header nothing is accepted.
+    """
+    qualities = {}
+    for part in (header or '').split(','):
+        value, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, q = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(q)
+                except ValueError:
+                    quality = 0.0
+        qualities.setdefault(value.strip().lower(), quality)
+    if token in qualities:
+        return qualities[token] > 0
+    return wildcard is not None and qualities.get(wildcard, 0) > 0
+
+
+def _escape_help(text, openmetrics):
+    text = text.replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if openmetrics else text
+
+
+def _format_exemplar(exemplar):
+    labels, value, timestamp = exemplar
+    if sum(len(k) + len(str(v)) for k, v in labels.items()) > MAX_EXEMPLAR_LABEL_CHARS:
+        return ''
+    return f' # {format_labels(labels) or "{}"} {format_value(value)} {timestamp:.3f}'
+
+
+def _live_extras(metric):
+    """{label values: (created, exemplars)} of a metric's children in this process"""
+    children = metric.items() if isinstance(metric, Family) else [({}, metric)]
+    return {tuple(labels.values()): (getattr(child, 'created', None),
+                                     child.exemplars() if hasattr(child, 'exemplars') else {})
+            for labels, child in children}
+
+
+class Exposition:
+    """Renders a registry, or a MultiProcessCollector, for /metrics.
+
+    Work is reused at every level:
+    - each series' sample prefixes (name and formatted labels) are built once
+    - a series is only re-rendered when its state or exemplars changed
+    - the body and its gzipped form are kept until the output changes
+    - with ``cache_seconds`` set, scrapes that arrive within that many
+      seconds of the last render are served the same body without taking
+      a snapshot at all
+
+    ``respond`` negotiates OpenMetrics (which adds ``_created`` samples and
+    exemplars) against the Prometheus text format, and gzip. Merged
+    multi-process output takes them from the collector's
+    ``collect_openmetrics``: the earliest creation time and the latest
+    exemplar of any worker.
+
+    Cache entries are immutable tuples replaced with a single dict store,
+    so concurrent scrapes never block each other; at worst two of them
+    render the same change.
+    """
+
+    def __init__(self, source, cache_seconds=0.0, gzip_level=6, gzip_min_size=512,
+                 clock=time.monotonic):
+        self.source = source
+        self.registry = getattr(source, 'registry', source)
+        self.multiprocess = self.registry is not source
+        self.cache_seconds = cache_seconds
+        self.gzip_level = gzip_level
+        self.gzip_min_size = gzip_min_size
+        self._clock = clock
+        self._series = {}
+        self._headers = {}
+        self._bodies = {}
+
+    def _snapshot(self):
+        return self.source.collect() if self.multiprocess else self.registry.snapshot()
+
+    def _header(self, name, documentation, metric_type, openmetrics):
+        key = (openmetrics, name)
+        header = self._headers.get(key)
+        if header is None:
+            family = name
+            if openmetrics and metric_type == 'counter' and name.endswith('_total'):
+                family = name[:-len('_total')]
+            help_text = _escape_help(documentation, openmetrics)
+            header = f'# HELP {family} {help_text}\n# TYPE {family} {metric_type}\n'
+            self._headers[key] = header
+        return header
+
+    def _layout(self, name, metric_type, prototype, created, openmetrics):
+        layout = prototype.sample_layout(name)
+        if not openmetrics:
+            return layout
+        family = name
+        if metric_type == 'counter':
+            family = name[:-len('_total')] if name.endswith('_total') else name
+            layout = [(f'{family}_total', extra) for _, extra in layout]
+        if created is not None and metric_type in ('counter', 'histogram', 'summary'):
+            layout = layout + [(f'{family}_created', None)]
+        return layout
+
+    def _render_series(self, openmetrics, name, metric_type, prototype, labels, key, state,
+                       created, exemplars):
+        # A series first seen without a creation time gets its _created line later
+        cache_key = (openmetrics, name, key, created is not None)
+        cached = self._series.get(cache_key)
+        if cached is None:
+            layout = self._layout(name, metric_type, prototype, created, openmetrics)
+            prefixes = [f'{sample}{format_labels(labels, extra)} ' for sample, extra in layout]
+        else:
+            prefixes, cached_state, cached_exemplars, text = cached
+            if cached_state == state and cached_exemplars == exemplars:
+                return text
+
+        values = prototype.sample_values(state)
+        if len(values) < len(prefixes):
+            values.append(created)
+        lines = []
+        for index, (prefix, value) in enumerate(zip(prefixes, values)):
+            exemplar = exemplars.get(index)
+            suffix = _format_exemplar(exemplar) if exemplar is not None else ''
+            lines.append(f'{prefix}{format_value(value)}{suffix}\n')
+        text = ''.join(lines)
+        self._series[cache_key] = (prefixes, state, exemplars, text)
+        return text
+
+    def _render(self, openmetrics):
+        snapshot = self._snapshot()
+        # Only OpenMetrics needs _created and exemplars: from the live
+        # children, or merged from every worker's file
+        extras = {}
+        merged_extras = self.source.collect_openmetrics() if openmetrics and self.multiprocess else {}
+        chunks = []
+        for name, documentation, metric_type, metric in self.registry.collect():
+            if isinstance(metric, Family):
+                prototype, labelnames = metric.prototype(), metric.labelnames
+            else:
+                prototype, labelnames = metric, ()
+            if openmetrics:
+                extras = (merged_extras.get(name, {}) if self.multiprocess
+                          else _live_extras(metric))
+            if chunks and not openmetrics:
+                chunks.append('\n')
+            chunks.append(self._header(name, documentation, metric_type, openmetrics))
+            for key, state in snapshot.get(name, {}).items():
+                created, exemplars = extras.get(key, (None, {}))
+                chunks.append(self._render_series(
+                    openmetrics, name, metric_type, prototype, dict(zip(labelnames, key)),
+                    key, state, created, exemplars))
+        if openmetrics:
+            chunks.append('# EOF\n')
+        return ''.join(chunks).encode('utf-8')
+
+    def _body(self, openmetrics):
+        """The (rendered_at, body, gzipped body or None) entry to serve"""
+        now = self._clock()
+        entry = self._bodies.get(openmetrics)
+        if entry is not None and self.cache_seconds and now - entry[0] < self.cache_seconds:
+            return entry
+        body = self._render(openmetrics)
+        # An unchanged body keeps its already compressed form
+        gzipped = entry[2] if entry is not None and entry[1] == body else None
+        entry = self._bodies[openmetrics] = (now, body, gzipped)
+        return entry
+
+    def render(self, openmetrics=False):
+        """Uncompressed exposition body as bytes"""
+        return self._body(openmetrics)[1]
+
+    def respond(self, accept=None, accept_encoding=None):
+        """(body, headers) for a scrape with the given Accept and Accept-Encoding"""
+        openmetrics = accepts(accept, 'application/openmetrics-text')
+        headers = {
+            'Content-Type': CONTENT_TYPE_OPENMETRICS if openmetrics else CONTENT_TYPE_TEXT,
+            'Vary': 'Accept, Accept-Encoding',
+        }
+        entry = self._body(openmetrics)
+        rendered_at, body, gzipped = entry
+        if len(body) >= self.gzip_min_size and accepts(accept_encoding, 'gzip', '*'):
+            if gzipped is None:
+                gzipped = gzip.compress(body, compresslevel=self.gzip_level)
+                if self._bodies.get(openmetrics) is entry:
+                    self._bodies[openmetrics] = (rendered_at, body, gzipped)
+            body = gzipped
+            headers['Content-Encoding'] = 'gzip'
+        return body, headers
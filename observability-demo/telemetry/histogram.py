@@ -0,0 +1,119 @@
+"""Fixed-memory bucketed latency histogram"""
+import time
+from bisect import bisect_left
+
+from collections import deque
+
+from .metrics import _Shards, render_samples
+
+# Same defaults as the official Prometheus client libraries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5,
+                   0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def format_le(bound):
+    """Format a bucket upper bound the way Prometheus expects"""
+    if bound == float('inf'):
+        return '+Inf'
+    return repr(float(bound))
+
+
+class Histogram:
+    """Cumulative latency histogram with a fixed set of buckets.
+
+    Memory is constant regardless of how many observations are made:
+    one counter per bucket plus a running sum, sharded per thread so
+    observe() never takes a lock.
+
+    Each bucket also keeps the last ``exemplar_reservoir`` exemplars
+    passed to observe(). Exposition shows the slowest of them, so a
+    bucket's exemplar is a recent worst case rather than whichever
+    request happened to finish last.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, exemplar_reservoir=4):
+        bounds = sorted(float(b) for b in buckets)
+        if not bounds:
+            raise ValueError("Histogram needs at least one bucket")
+        if bounds[-1] != float('inf'):
+            bounds.append(float('inf'))
+        self.buckets = tuple(bounds)
+        # One cell per bucket, followed by the running sum
+        self._shards = _Shards(len(self.buckets) + 1)
+        self.created = time.time()
+        self._exemplars = [deque(maxlen=exemplar_reservoir) for _ in self.buckets]
+
+    def observe(self, value, exemplar=None):
+        """Record a single observation (in seconds).
+
+        ``exemplar`` is an optional label dict (e.g. a trace id) added to
+        its bucket's reservoir.
+        """
+        index = bisect_left(self.buckets, value)
+        cell = self._shards.cell()
+        cell[index] += 1
+        cell[-1] += value
+        if exemplar is not None:
+            self._exemplars[index].append((exemplar, value, time.time()))
+
+    def exemplars(self):
+        """{bucket index: (labels, value, timestamp)} of each bucket's slowest kept exemplar"""
+        # tuple() copies a deque atomically; max() over the live deque would
+        # fail if observe() appended to it mid-iteration
+        return {index: max(tuple(reservoir), key=lambda entry: entry[1])
+                for index, reservoir in enumerate(self._exemplars) if reservoir}
+
+    def exemplar_reservoirs(self):
+        """{bucket index: [(labels, value, timestamp), ...]} oldest first"""
+        return {index: list(reservoir) for index, reservoir in enumerate(self._exemplars) if reservoir}
+
+    @property
+    def sum(self):
+        return self._shards.merged()[-1]
+
+    @property
+    def count(self):
+        return sum(self._shards.merged()[:-1])
+
+    def mean(self):
+        """Average of all observations, 0 when empty"""
+        _, total, count = self.snapshot()
+        return total / count if count else 0
+
+    def snapshot(self):
+        """Return (cumulative bucket counts, sum, count) merged across threads"""
+        merged = self._shards.merged()
+        cumulative = []
+        running = 0
+        for c in merged[:-1]:
+            running += c
+            cumulative.append(running)
+        return cumulative, merged[-1], running
+
+    def state(self):
+        """Additive state: per-bucket (non-cumulative) counts and the sum"""
+        merged = self._shards.merged()
+        state = {f'b{i}': c for i, c in enumerate(merged[:-1])}
+        state['sum'] = merged[-1]
+        return state
+
+    def sample_layout(self, name):
+        """(sample name, extra labels) of every exposed line, buckets first"""
+        layout = [(f'{name}_bucket', {'le': format_le(bound)}) for bound in self.buckets]
+        layout += [(f'{name}_sum', None), (f'{name}_count', None)]
+        return layout
+
+    def sample_values(self, state):
+        """Cumulative bucket counts, then sum and count, from a state()"""
+        values = []
+        count = 0
+        for i in range(len(self.buckets)):
+            count += state.get(f'b{i}', 0)
+            values.append(count)
+        values += [state.get('sum', 0), count]
+        return values
+
+    def render(self, name, labels=None, state=None):
+        """Render Prometheus text exposition lines for this histogram"""
+        state = self.state() if state is None else state
+        return render_samples(labels, self.sample_layout(name), self.sample_values(state))
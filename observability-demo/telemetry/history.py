@@ -0,0 +1,299 @@
+"""In-process request history at several resolutions, for trend views and sparklines.
+
+Each series (a route, plus ``*`` for all traffic) keeps one ring buffer
+per tier, e.g. 1s points for 10 minutes, 10s points for 6 hours and 1m
+points for 7 days. A point holds the step's request and error counts,
+latency sum, and p50/p99 in parallel ``array`` columns. Memory is
+therefore fixed per series. The series kept are those ``reserve``d
+(e.g. every route label of the app), or as many as fit ``max_bytes``
+when that is set. Observations go into a quantile sketch of the finest tier's open
+step; when that step closes its sketch is merged into the open steps of
+the coarser tiers, which is exact for sketches, so every tier's p50/p99
+are true per-step quantiles (within the sketch's relative accuracy) and
+not averages of finer ones. A step is written when the first observation
+or read after it arrives, and steps nobody wrote are read as no traffic.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from array import array
+
+from .quantiles import QuantileSketch
+
+TOTAL_SERIES = '*'
+DEFAULT_TIERS = ((1, 600), (10, 2160), (60, 10080))  # (step, points): 10m, 6h, 7d
+_DURATION = re.compile(r'^(\d+(?:\.\d+)?)([smhd]?)$')
+_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_NO_EPOCH = -1 << 63  # marks never-written slots
+_UNITS_PER_SECOND = 100000  # latency columns hold 10µs units
+_UNITS_PER_MS = 100
+
+
+def parse_duration(text):
+    """Seconds in '90', '90s', '10m', '6h' or '7d'; ValueError otherwise"""
+    match = _DURATION.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration {text!r}")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+def parse_tiers(text):
+    """((step, points), ...) from 'step:span' pairs, e.g. '1s:10m,10s:6h,1m:7d'"""
+    tiers = []
+    for part in text.split(','):
+        step, _, span = part.partition(':')
+        step, span = parse_duration(step), parse_duration(span)
+        if step <= 0 or span < step:
+            raise ValueError(f"Invalid history tier {part!r}")
+        tiers.append((step, int(span // step)))
+    return tuple(sorted(tiers))
+
+
+class HistoryMetrics:
+    """Memory held by the history store and series it refused, exported on /metrics"""
+
+    def __init__(self, registry):
+        self.memory = registry.gauge(
+            'history_memory_bytes', 'Bytes held by history ring buffers', multiprocess_mode='sum')
+        self.series = registry.gauge(
+            'history_series', 'Series kept in the history store', multiprocess_mode='sum')
+        self.rejected = registry.counter(
+            'history_series_rejected_total', 'Observations for series dropped by the memory budget')
+
+
+class _Tier:
+    """Ring of ``points`` steps of ``step`` seconds, one array per column.
+
+    Latencies are kept as whole 10µs units, which is finer than the
+    sketch's accuracy and reads back as short decimal milliseconds.
+    """
+
+    def __init__(self, step, points, relative_accuracy):
+        self.step = step
+        self.points = points
+        self.epochs = array('q', [_NO_EPOCH]) * points
+        self.requests = array('I', [0]) * points
+        self.errors = array('I', [0]) * points
+        self.mean = array('I', [0]) * points
+        self.p50 = array('I', [0]) * points
+        self.p99 = array('I', [0]) * points
+        self.open_epoch = None
+        self.open = QuantileSketch(relative_accuracy)
+        self.open_errors = 0
+
+    @staticmethod
+    def bytes_for(points):
+        return points * (8 + 4 * 5)
+
+    def advance(self, now, coarser=()):
+        """Write the open step if ``now`` is past it, first folding it into ``coarser`` tiers.
+
+        True when the open step changed.
+        """
+        epoch = int(now // self.step)
+        if self.open_epoch == epoch:
+            return False
+        if self.open_epoch is not None and self.open.count:
+            for tier in coarser:
+                tier.advance(self.open_epoch * self.step)
+                tier.open.merge(self.open)
+                tier.open_errors += self.open_errors
+            position = self.open_epoch % self.points
+            quantiles = self.open.quantiles((0.5, 0.99))
+            self.epochs[position] = self.open_epoch
+            self.requests[position] = self.open.count
+            self.errors[position] = self.open_errors
+            self.mean[position] = round(self.open.sum / self.open.count * _UNITS_PER_SECOND)
+            self.p50[position] = round(quantiles[0.5] * _UNITS_PER_SECOND)
+            self.p99[position] = round(quantiles[0.99] * _UNITS_PER_SECOND)
+            self.open.clear()
+            self.open_errors = 0
+        self.open_epoch = epoch
+        return True
+
+    def add(self, value, error):
+        self.open.add(value)
+        self.open_errors += error
+
+    def read(self, first_epoch, last_epoch):
+        """Columns for the closed steps first_epoch..last_epoch; no-traffic steps are 0 / None"""
+        step, points, epochs = self.step, self.points, self.epochs
+        written = [(epoch % points if epochs[epoch % points] == epoch else None)
+                   for epoch in range(first_epoch, last_epoch + 1)]
+
+        def rates(column):
+            if step == 1:
+                return [0 if p is None else column[p] for p in written]
+            return [0 if p is None else round(column[p] / step, 3) for p in written]
+
+        def milliseconds(column):
+            return [None if p is None else column[p] / _UNITS_PER_MS for p in written]
+
+        return {'rate': rates(self.requests), 'error_rate': rates(self.errors),
+                'mean_ms': milliseconds(self.mean), 'p50_ms': milliseconds(self.p50),
+                'p99_ms': milliseconds(self.p99)}
+
+
+def _advance(tiers, now):
+    """Bring every tier of a series up to ``now``, finest first"""
+    if tiers[0].advance(now, tiers[1:]):
+        # Steps nest, so coarser tiers can only move when the finest one does
+        for tier in tiers[1:]:
+            tier.advance(now)
+
+
+class TimeSeriesHistory:
+    """Request rate, error rate and latency quantiles per series over several tiers.
+
+    ``observe(series, seconds, error)`` has the RequestMetrics listener
+    signature, so the store can be fed by appending it to ``listeners``.
+    ``scope`` is reported with every query: 'worker' when each process of
+    a pre-fork server keeps its own history, so a response only covers
+    the requests of the worker that answered it.
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS, max_bytes=None, relative_accuracy=0.02,
+                 clock=time.time, registry=None, scope='process'):
+        self.tiers = tuple(tiers)
+        if any(self.tiers[i + 1][0] % self.tiers[i][0] for i in range(len(self.tiers) - 1)):
+            raise ValueError("Each history tier's step must be a multiple of the previous one")
+        self.relative_accuracy = relative_accuracy
+        self.series_bytes = sum(_Tier.bytes_for(points) for _, points in self.tiers)
+        self.max_bytes = max_bytes
+        self.max_series = 1 if max_bytes is None else max(1, max_bytes // self.series_bytes)
+        self.scope = scope
+        self._reserved = {TOTAL_SERIES}
+        self._series = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rejected = None
+        if registry is not None:
+            metrics = HistoryMetrics(registry)
+            metrics.memory.set_function(lambda: len(self._series) * self.series_bytes)
+            metrics.series.set_function(lambda: len(self._series))
+            self._rejected = metrics.rejected
+
+    @property
+    def span(self):
+        """Seconds covered by the coarsest tier"""
+        step, points = self.tiers[-1]
+        return step * points
+
+    def reserve(self, names):
+        """Make room for ``names`` and the ``*`` total, unless ``max_bytes`` fixes the budget.
+
+        Buffers are still only allocated on a series' first request.
+        """
+        with self._lock:
+            self._reserved.update(names)
+            if self.max_bytes is None:
+                self.max_series = len(self._reserved)
+
+    def _tiers_for(self, series):
+        tiers = self._series.get(series)
+        if tiers is None and len(self._series) < self.max_series:
+            tiers = self._series[series] = [_Tier(step, points, self.relative_accuracy)
+                                            for step, points in self.tiers]
+        return tiers
+
+    def observe(self, series, seconds, error=False):
+        """Record one request of ``series`` (and of the ``*`` total)"""
+        now = self._clock()
+        with self._lock:
+            for name in (TOTAL_SERIES, series):
+                tiers = self._tiers_for(name)
+                if tiers is None:
+                    if self._rejected is not None:
+                        self._rejected.inc()
+                    continue
+                _advance(tiers, now)
+                tiers[0].add(seconds, bool(error))
+
+    def series(self):
+        with self._lock:
+            return list(self._series)
+
+    def query(self, names, range_seconds, step=None):
+        """{'step', 'start', 'series': {name: columns}} of the last ``range_seconds``.
+
+        Uses the finest tier that covers the range, or the first with at
+        least ``step`` seconds per point. The open step is left out, so
+        the last point is the most recent complete one.
+        """
+        if not 0 < range_seconds <= self.span:
+            raise ValueError(f"range must be in (0, {self.span:g}] seconds")
+        index = next(i for i, (tier_step, points) in enumerate(self.tiers)
+                     if tier_step * points >= range_seconds and (step is None or tier_step >= step))
+        tier_step, points = self.tiers[index]
+        count = max(1, math.ceil(range_seconds / tier_step))
+        now = self._clock()
+        last_epoch = int(now // tier_step) - 1
+        first_epoch = last_epoch - count + 1
+        result = {}
+        with self._lock:
+            for name in names:
+                tiers = self._series.get(name)
+                if tiers is None:
+                    result[name] = _empty_columns(count)
+                    continue
+                _advance(tiers, now)
+                result[name] = tiers[index].read(first_epoch, last_epoch)
+        return {'step_seconds': tier_step, 'start': first_epoch * tier_step, 'series': result}
+
+    def respond(self, query):
+        """Serve ``/api/stats/history``: (body, status, headers).
+
+        ``?series=/,/health`` (default ``*``, all traffic) and
+        ``?range=10m`` (default 10m); ``?step=10s`` asks for coarser points.
+        """
+        names = [name for name in query.get('series', TOTAL_SERIES).split(',') if name][:20]
+        try:
+            range_seconds = parse_duration(query.get('range', '10m'))
+            step = parse_duration(query['step']) if query.get('step') else None
+            body = self.query(names, range_seconds, step)
+        except (ValueError, StopIteration) as e:
+            message = str(e) or 'no tier has that step'
+            return json.dumps({"error": message}), 400, {'Content-Type': 'application/json'}
+        body['range_seconds'] = range_seconds
+        body['scope'] = self.scope
+        if self.scope == 'worker':
+            body['pid'] = os.getpid()
+        return (json.dumps(body, separators=(',', ':')), 200,
+                {'Content-Type': 'application/json', 'Cache-Control': 'no-store'})
+
+
+def _empty_columns(count):
+    return {'rate': [0] * count, 'error_rate': [0] * count, 'mean_ms': [None] * count,
+            'p50_ms': [None] * count, 'p99_ms': [None] * count}
+
+
+def history_from_env(registry=None):
+    """TimeSeriesHistory configured from the environment.
+
+    ``HISTORY_TIERS`` ('1s:10m,10s:6h,1m:7d') sets the resolutions and
+    ``HISTORY_MAX_MB`` (unset: room for every ``reserve``d series) caps
+    the memory for all series. Under a pre-fork server
+    (``METRICS_MULTIPROC_DIR`` set) the scope is 'worker'.
+    """
+    tiers = parse_tiers(os.environ['HISTORY_TIERS']) if os.getenv('HISTORY_TIERS') else DEFAULT_TIERS
+    max_mb = os.getenv('HISTORY_MAX_MB')
+    return TimeSeriesHistory(
+        tiers=tiers,
+        max_bytes=int(float(max_mb) * (1 << 20)) if max_mb else None,
+        registry=registry,
+        scope='worker' if os.getenv('METRICS_MULTIPROC_DIR') else 'process',
+    )
+
+
+def history_flask_app(app, history, rule='/api/stats/history'):
+    """Serve ``history.respond`` on ``rule`` of a Flask app"""
+    from flask import request
+
+    def stats_history():
+        return history.respond(request.args)
+
+    app.add_url_rule(rule, 'stats_history', stats_history)
+    return app
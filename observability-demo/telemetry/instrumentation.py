@@ -0,0 +1,183 @@
+"""Automatic RED metrics (rate, errors, duration) for every route of a service.
+
+``instrument_flask_app`` times each request from a before_request hook to
+an after_request hook, one clock read at each edge, and labels it with
+the method, the matched URL rule (``/items/<int:id>``, not the raw path)
+and the status code. Handlers need no metrics code of their own. Unknown
+methods are recorded as 'other' and unmatched paths as 'unmatched', and
+past ``max_series`` label sets everything new is folded into
+``endpoint="other"``, so scanners cannot blow up the series count.
+"""
+import threading
+import time
+
+KNOWN_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+OVERFLOW_ROUTE = 'other'
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class RequestMetrics:
+    """``{prefix}_requests_total``, ``_errors_total`` and ``_request_duration_seconds`` by route.
+
+    Responses with a status of ``error_status`` or more count as errors.
+    ``listeners`` are called as ``listener(route, seconds, error)`` after
+    every request, with the route already capped, for per-route views
+    such as sliding windows.
+    """
+
+    def __init__(self, registry, prefix='http', max_series=200, error_status=500, buckets=None,
+                 listeners=()):
+        self.requests = registry.counter(
+            f'{prefix}_requests_total', 'Requests by method, route template and status',
+            ['method', 'endpoint', 'status'])
+        self.errors = registry.counter(
+            f'{prefix}_errors_total', f'Requests answered with status {error_status} or above',
+            ['method', 'endpoint'])
+        self.duration = registry.histogram(
+            f'{prefix}_request_duration_seconds', 'Request duration by method and route template',
+            ['method', 'endpoint'], buckets=buckets)
+        self.in_flight = registry.gauge(
+            f'{prefix}_requests_in_flight', 'Requests being served', multiprocess_mode='sum')
+        self.overflow = registry.counter(
+            f'{prefix}_requests_over_series_limit_total',
+            'Requests recorded as endpoint="other" because the series limit was reached')
+        self._names = (f'{prefix}_requests_total', f'{prefix}_errors_total',
+                       f'{prefix}_request_duration_seconds')
+        self.max_series = max_series
+        self.error_status = error_status
+        self.listeners = list(listeners)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, method, route, status):
+        with self._lock:
+            children = self._children.get((method, route, status))
+            if children is not None:
+                return children
+            overflow = len(self._children) >= self.max_series
+            label = OVERFLOW_ROUTE if overflow else route
+            error = status >= self.error_status
+            children = (
+                label,
+                self.requests.labels(method=method, endpoint=label, status=status),
+                self.errors.labels(method=method, endpoint=label) if error else None,
+                self.duration.labels(method=method, endpoint=label),
+                overflow,
+            )
+            if not overflow:
+                self._children[(method, route, status)] = children
+            return children
+
+    def observe(self, method, route, status, seconds, exemplar=None):
+        """Record one finished request"""
+        if method not in KNOWN_METHODS:
+            method = 'other'
+        children = self._children.get((method, route, status))
+        if children is None:
+            children = self._resolve(method, route, status)
+        label, requests, errors, duration, overflow = children
+        requests.inc()
+        if errors is not None:
+            errors.inc()
+        duration.observe(seconds, exemplar)
+        if overflow:
+            self.overflow.inc()
+        for listener in self.listeners:
+            listener(label, seconds, errors is not None)
+
+    def total(self):
+        """Requests recorded in this process"""
+        return sum(child.value() for _, child in self.requests.items())
+
+    def total_errors(self):
+        return sum(child.value() for _, child in self.errors.items())
+
+    def by_endpoint(self):
+        """{route: (requests, errors)} recorded in this process"""
+        totals = {}
+        for labels, child in self.requests.items():
+            requests, errors = totals.get(labels['endpoint'], (0, 0))
+            totals[labels['endpoint']] = (requests + child.value(), errors)
+        for labels, child in self.errors.items():
+            requests, errors = totals.get(labels['endpoint'], (0, 0))
+            totals[labels['endpoint']] = (requests, errors + child.value())
+        return totals
+
+    def mean_duration(self):
+        """Average request duration over every route, 0 when empty"""
+        total = count = 0
+        for _, child in self.duration.items():
+            _, child_sum, child_count = child.snapshot()
+            total += child_sum
+            count += child_count
+        return total / count if count else 0
+
+    def totals(self, snapshot=None):
+        """(requests, errors, mean duration) over every route.
+
+        ``snapshot`` is a registry snapshot, e.g. every worker's merged by a
+        MultiProcessCollector; without one only this process is counted.
+        """
+        if snapshot is None:
+            return self.total(), self.total_errors(), self.mean_duration()
+        requests, errors, duration = (snapshot.get(name, {}) for name in self._names)
+        total = count = 0
+        for state in duration.values():
+            *_, child_sum, child_count = self.duration.prototype().sample_values(state)
+            total += child_sum
+            count += child_count
+        return (sum(state.get('value', 0) for state in requests.values()),
+                sum(state.get('value', 0) for state in errors.values()),
+                total / count if count else 0)
+
+
+def flask_routes(app):
+    """Route templates of a Flask app's URL map, static files excluded"""
+    return [rule.rule for rule in app.url_map.iter_rules() if rule.endpoint != 'static']
+
+
+def route_labels(app):
+    """Every endpoint label RequestMetrics can record for a Flask app: its URL rules, 'unmatched' and 'other'"""
+    return [rule.rule for rule in app.url_map.iter_rules()] + [UNMATCHED_ROUTE, OVERFLOW_ROUTE]
+
+
+def instrument_flask_app(app, request_metrics, exemplar=None, clock=time.perf_counter):
+    """Record RED metrics for every request of a Flask app.
+
+    Install it before any hook that can answer early (admission control),
+    so shed requests are timed and counted too. ``exemplar`` is an
+    optional callable giving the exemplar labels of the current request.
+    """
+    from flask import request
+
+    @app.before_request
+    def _start_request_timer():
+        request.environ['telemetry.started'] = clock()
+        request.environ['telemetry.in_flight'] = True
+        request_metrics.in_flight.inc()
+
+    @app.after_request
+    def _record_request(response):
+        environ = request.environ
+        started = environ.pop('telemetry.started', None)
+        if started is not None:
+            rule = request.url_rule
+            request_metrics.observe(
+                environ['REQUEST_METHOD'], rule.rule if rule is not None else UNMATCHED_ROUTE,
+                response.status_code, clock() - started, exemplar() if exemplar else None)
+        return response
+
+    @app.teardown_request
+    def _record_failed_request(exc):
+        # after_request is skipped when the error handling itself fails
+        environ = request.environ
+        if environ.pop('telemetry.in_flight', False):
+            request_metrics.in_flight.dec()
+        started = environ.pop('telemetry.started', None)
+        if started is not None:
+            rule = request.url_rule
+            request_metrics.observe(
+                environ['REQUEST_METHOD'], rule.rule if rule is not None else UNMATCHED_ROUTE,
+                500, clock() - started, exemplar() if exemplar else None)
+
+    return app
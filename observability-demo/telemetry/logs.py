@@ -0,0 +1,207 @@
+"""Structured logging written by a background thread, sampled per route.
+
+``configure_logging`` replaces ``logging.basicConfig``. Request threads
+only run the sampling filter and put the record on a bounded queue; a
+QueueListener thread formats it as one compact JSON line and writes it.
+When the queue is full the record is dropped rather than blocking the
+request, and every drop is counted by reason.
+
+Records that carry a ``route`` (pass ``extra={'route': ...}``) can be
+sampled and rate limited per route. Only records below WARNING are
+sampled; the rate limit applies at every level. Records without a route
+always pass.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listeners = []
+
+
+def parse_route_rates(spec):
+    """Parse '/=0.1,/health=0.01,*=1' into {route: rate}; '*' sets the default"""
+    rates = {}
+    for part in (spec or '').split(','):
+        route, _, rate = part.strip().rpartition('=')
+        if route:
+            rates[route] = float(rate)
+    return rates
+
+
+class LogMetrics:
+    """Counters for the logging pipeline, exported on /metrics"""
+
+    def __init__(self, registry):
+        self.written = registry.counter(
+            'log_records_written_total', 'Log records written by the log writer thread')
+        self.dropped = registry.counter(
+            'log_records_dropped_total', 'Log records not written, by reason', ['reason'])
+        for reason in ('sampled', 'rate_limited', 'queue_full'):
+            self.dropped.labels(reason=reason)
+        self.queue_depth = registry.gauge(
+            'log_queue_depth', 'Log records waiting for the writer thread', multiprocess_mode='sum')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, then any extra fields"""
+
+    def __init__(self, static_fields=None):
+        super().__init__()
+        self.static_fields = dict(static_fields or {})
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            **self.static_fields,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a ``sample`` fraction of each route's records, at most ``rate_limit`` per second.
+
+    ``sample`` and ``rate_limit`` map routes to values, with '*' as the
+    default for routes not listed. A rate limit of 0 means unlimited.
+    """
+
+    def __init__(self, sample=None, rate_limit=None, metrics=None, clock=time.monotonic):
+        super().__init__()
+        self.sample = dict(sample or {})
+        self.rate_limit = dict(rate_limit or {})
+        self._clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._sampled = self._limited = None
+        if metrics is not None:
+            self._sampled = metrics.dropped.labels(reason='sampled')
+            self._limited = metrics.dropped.labels(reason='rate_limited')
+
+    def _allow(self, route):
+        # Token bucket per route, holding up to one second's worth of records
+        limit = self.rate_limit.get(route, self.rate_limit.get('*', 0))
+        if limit <= 0:
+            return True
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(route, (limit, now))
+            tokens = min(limit, tokens + (now - updated) * limit)
+            allowed = tokens >= 1
+            self._buckets[route] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def filter(self, record):
+        route = getattr(record, 'route', None)
+        if route is None:
+            return True
+        if (record.levelno < logging.WARNING
+                and random.random() >= self.sample.get(route, self.sample.get('*', 1.0))):
+            if self._sampled is not None:
+                self._sampled.inc()
+            return False
+        if not self._allow(route):
+            if self._limited is not None:
+                self._limited.inc()
+            return False
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the writer thread"""
+
+    def __init__(self, log_queue, metrics=None):
+        super().__init__(log_queue)
+        self._dropped = metrics.dropped.labels(reason='queue_full') if metrics is not None else None
+
+    def prepare(self, record):
+        # Same process, so the record itself can cross threads unformatted
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self._dropped is not None:
+                self._dropped.inc()
+
+
+class _CountingHandler(logging.StreamHandler):
+    def __init__(self, stream, counter):
+        super().__init__(stream)
+        self._counter = counter
+
+    def emit(self, record):
+        super().emit(record)
+        if self._counter is not None:
+            self._counter.inc()
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than fail when stopping with a full queue
+        self.queue.put(self._sentinel)
+
+
+def configure_logging(service, registry=None, level=None, queue_size=None,
+                      sample=None, rate_limit=None, stream=None):
+    """Route the root logger through a sampled, non-blocking queue to a JSON writer thread.
+
+    Settings left as None come from the environment: ``LOG_LEVEL``
+    (INFO), ``LOG_QUEUE_SIZE`` (10000), ``LOG_SAMPLE`` and
+    ``LOG_RATE_LIMIT`` (route=value lists, see ``parse_route_rates``).
+    Returns the started QueueListener; ``stop_logging`` (also run at
+    exit) drains and stops it.
+    """
+    level = level or os.getenv('LOG_LEVEL', 'INFO').upper()
+    queue_size = queue_size or int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    sample = parse_route_rates(os.getenv('LOG_SAMPLE')) if sample is None else sample
+    rate_limit = parse_route_rates(os.getenv('LOG_RATE_LIMIT')) if rate_limit is None else rate_limit
+
+    metrics = LogMetrics(registry) if registry is not None else None
+    log_queue = queue.Queue(maxsize=queue_size)
+    if metrics is not None:
+        metrics.queue_depth.set_function(log_queue.qsize)
+
+    writer = _CountingHandler(stream or sys.stderr, metrics.written if metrics is not None else None)
+    writer.setFormatter(JsonFormatter({'service': service}))
+    handler = DroppingQueueHandler(log_queue, metrics)
+    handler.addFilter(SamplingFilter(sample, rate_limit, metrics))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = _Listener(log_queue, writer)
+    listener.start()
+    _listeners.append(listener)
+    return listener
+
+
+def stop_logging():
+    """Write out queued records and stop every writer thread (e.g. from a worker-exit hook)"""
+    while _listeners:
+        listener = _listeners.pop()
+        if listener._thread is not None:
+            listener.stop()
+
+
+atexit.register(stop_logging)
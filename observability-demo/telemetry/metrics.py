@@ -0,0 +1,207 @@
+"""Thread-sharded metric primitives"""
+import threading
+import time
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=None):
+    """Render a label set as ``{a="b",...}`` (empty string when no labels)"""
+    pairs = list((labels or {}).items()) + list((extra or {}).items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{escape_label_value(v)}"' for k, v in pairs) + '}'
+
+
+def format_value(value):
+    """Render a sample value; infinities and NaN use the exposition spellings"""
+    if isinstance(value, float):
+        if value != value:
+            return 'NaN'
+        if value in (float('inf'), float('-inf')):
+            return '+Inf' if value > 0 else '-Inf'
+    return str(value)
+
+
+def render_samples(labels, layout, values):
+    """Join a metric's (sample name, extra labels) layout with its values"""
+    return '\n'.join(f'{sample}{format_labels(labels, extra)} {format_value(value)}'
+                     for (sample, extra), value in zip(layout, values))
+
+
+class _Shards:
+    """Per-thread cells of numbers, merged when read.
+
+    Writers only ever touch the cell owned by their own thread, so the hot
+    path needs no lock and no increment can be lost. Cells of threads that
+    have exited are folded into a single retired cell so memory stays
+    bounded even with Werkzeug's thread-per-request server.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells = []
+        self._retired = [0] * size
+        self._prune_at = 64
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            return self._register()
+
+    def _register(self):
+        cell = [0] * self._size
+        with self._lock:
+            if len(self._cells) >= self._prune_at:
+                self._prune()
+                self._prune_at = max(64, 2 * len(self._cells))
+            self._cells.append((threading.current_thread(), cell))
+        self._local.cell = cell
+        return cell
+
+    def _prune(self):
+        alive = []
+        for thread, cell in self._cells:
+            if thread.is_alive():
+                alive.append((thread, cell))
+            else:
+                for i, v in enumerate(cell):
+                    self._retired[i] += v
+        self._cells = alive
+
+    def merged(self):
+        """Element-wise sum of every cell, live and retired"""
+        with self._lock:
+            self._prune()
+            total = list(self._retired)
+            for _, cell in self._cells:
+                for i, v in enumerate(cell):
+                    total[i] += v
+        return total
+
+
+class Counter:
+    """Monotonic counter; increments are lock-free per thread"""
+
+    def __init__(self):
+        self._shards = _Shards(1)
+        self.created = time.time()
+        self._exemplar = None
+
+    def inc(self, amount=1, exemplar=None):
+        """Add ``amount``; ``exemplar`` is an optional label dict (e.g. a trace id)"""
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        self._shards.cell()[0] += amount
+        if exemplar is not None:
+            self._exemplar = (exemplar, amount, time.time())
+
+    def exemplars(self):
+        """{sample index: (labels, value, timestamp)} for OpenMetrics exposition"""
+        return {0: self._exemplar} if self._exemplar is not None else {}
+
+    def value(self):
+        return self._shards.merged()[0]
+
+    def state(self):
+        """Additive state, mergeable across processes by summing"""
+        return {'value': self.value()}
+
+    def sample_layout(self, name):
+        return [(name, None)]
+
+    def sample_values(self, state):
+        return [state.get('value', 0)]
+
+    def render(self, name, labels=None, state=None):
+        state = self.state() if state is None else state
+        return render_samples(labels, self.sample_layout(name), self.sample_values(state))
+
+
+class Gauge:
+    """Value that can go up and down, or be computed at scrape time.
+
+    ``multiprocess_mode`` says how values from several worker processes
+    are combined: ``max``, ``min`` or ``sum``.
+    """
+
+    def __init__(self, multiprocess_mode='max'):
+        if multiprocess_mode not in ('max', 'min', 'sum'):
+            raise ValueError(f"Unknown multiprocess mode {multiprocess_mode}")
+        self.multiprocess_mode = multiprocess_mode
+        self._value = 0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Compute the gauge by calling ``function`` on every read"""
+        self._function = function
+
+    def value(self):
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+    def state(self):
+        return {'value': self.value()}
+
+    def sample_layout(self, name):
+        return [(name, None)]
+
+    def sample_values(self, state):
+        return [state.get('value', 0)]
+
+    def render(self, name, labels=None, state=None):
+        state = self.state() if state is None else state
+        return render_samples(labels, self.sample_layout(name), self.sample_values(state))
+
+
+class Family:
+    """A labelled metric: one child per distinct label set"""
+
+    def __init__(self, factory, labelnames):
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children = {}
+        self._prototype = None
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **labels):
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"Expected labels {self.labelnames}, got {key}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._factory())
+        return child
+
+    def items(self):
+        """Snapshot of (labels dict, child) pairs in creation order"""
+        with self._lock:
+            children = list(self._children.items())
+        return [(dict(zip(self.labelnames, key)), child) for key, child in children]
+
+    def prototype(self):
+        """Unlabelled instance used to render merged state of any child"""
+        if self._prototype is None:
+            self._prototype = self._factory()
+        return self._prototype
@@ -0,0 +1,301 @@
+"""Share metrics between pre-fork worker processes (gunicorn, uwsgi).
+
+Each worker periodically writes a snapshot of its registry into its own
+memory-mapped file in ``METRICS_MULTIPROC_DIR``. Whichever worker serves
+/metrics merges every file, so counters, histograms and summaries add up
+across workers no matter which one Prometheus happens to hit.
+
+Counter, histogram and summary totals are kept after a worker exits so
+they never go backwards. Gauges, and the bins of windowed summaries
+(whose quantiles only describe the last few minutes), go to separate
+files, which ``mark_process_dead`` removes from the server's child-exit
+hook.
+
+What only OpenMetrics shows, each series' creation time and exemplars,
+cannot be summed, so each worker also writes them as a small JSON file
+(``openmetrics_{pid}.json``, replaced whole when it changes). The merge
+keeps the earliest creation time and, per sample, the most recent
+exemplar of any worker.
+"""
+import atexit
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import weakref
+
+from .metrics import Family
+
+_HEADER = struct.Struct('<I4x')
+_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+_INITIAL_SIZE = 1 << 16
+
+_collectors = weakref.WeakSet()
+
+
+def _entries(data, used):
+    """Yield (key, value, value offset) for every entry in a store buffer"""
+    pos = _HEADER.size
+    while pos < used:
+        (length,) = _LENGTH.unpack_from(data, pos)
+        padded = length + (-(_LENGTH.size + length) % 8)
+        key = bytes(data[pos + _LENGTH.size:pos + _LENGTH.size + length]).decode('utf-8')
+        value_pos = pos + _LENGTH.size + padded
+        (value,) = _VALUE.unpack_from(data, value_pos)
+        yield key, value, value_pos
+        pos = value_pos + _VALUE.size
+
+
+class MmapedValues:
+    """Append-only key -> float64 store in a memory-mapped file.
+
+    Layout: an 8-byte header holding the number of bytes used, then
+    entries of ``<uint32 key length><key, padded to 8><float64 value>``.
+    Only the owning process writes; any process may read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        self._positions = {key: pos for key, _, pos in _entries(self._map, self._used)}
+
+    def write(self, key, value):
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._append(key)
+        _VALUE.pack_into(self._map, pos, value)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padded = len(encoded) + (-(_LENGTH.size + len(encoded)) % 8)
+        size = _LENGTH.size + padded + _VALUE.size
+        while self._used + size > self._capacity:
+            self._grow()
+        _LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _LENGTH.size:self._used + _LENGTH.size + len(encoded)] = encoded
+        pos = self._used + _LENGTH.size + padded
+        _VALUE.pack_into(self._map, pos, 0.0)
+        # Publish the entry only once it is fully written
+        self._used += size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = pos
+        return pos
+
+    def _grow(self):
+        self._capacity *= 2
+        self._map.close()
+        self._file.truncate(self._capacity)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def read_values(path):
+    """Return {key: value} from a store file written by any process"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        return {}
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    return {key: value for key, value, _ in _entries(data, used)}
+
+
+class MultiProcessCollector:
+    """Flushes this worker's registry to disk and merges all workers' files"""
+
+    def __init__(self, registry, directory, flush_interval=1.0):
+        self.registry = registry
+        self.directory = directory
+        self.flush_interval = flush_interval
+        pid = os.getpid()
+        self._values = MmapedValues(os.path.join(directory, f'metrics_{pid}.db'))
+        self._gauges = MmapedValues(os.path.join(directory, f'gauges_{pid}.db'))
+        self._windows = MmapedValues(os.path.join(directory, f'windows_{pid}.db'))
+        self._stores = {store.path: store for store in (self._values, self._gauges, self._windows)}
+        self._openmetrics_path = os.path.join(directory, f'openmetrics_{pid}.json')
+        self._written = set()
+        self._openmetrics_written = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        _collectors.add(self)
+
+    def start(self):
+        """Flush in the background every ``flush_interval`` seconds"""
+        thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+        thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def _metric_types(self):
+        return {name: metric_type for name, _, metric_type, _ in self.registry.collect()}
+
+    def flush(self):
+        """Write this process's current values to its files"""
+        snapshot = self.registry.snapshot()
+        types = self._metric_types()
+        with self._lock:
+            written = set()
+            for name, series in snapshot.items():
+                metric_type = types[name]
+                for labels, state in series.items():
+                    for field, value in state.items():
+                        if metric_type == 'gauge':
+                            store = self._gauges
+                        elif metric_type == 'summary' and field.startswith('w'):
+                            store = self._windows
+                        else:
+                            store = self._values
+                        key = json.dumps([name, list(labels), field])
+                        store.write(key, value)
+                        written.add((store.path, key))
+            # Zero fields that disappeared, e.g. sketch bins leaving the window
+            for path, key in self._written - written:
+                self._stores[path].write(key, 0.0)
+            self._written = written
+            self._flush_openmetrics()
+
+    def _openmetrics_state(self):
+        """{name: {label values as JSON: [created, {sample index: exemplar}]}} of this process"""
+        state = {}
+        for name, _, metric_type, metric in self.registry.collect():
+            if metric_type == 'gauge':
+                continue
+            children = metric.items() if isinstance(metric, Family) else [({}, metric)]
+            series = {}
+            for labels, child in children:
+                exemplars = child.exemplars() if hasattr(child, 'exemplars') else {}
+                series[json.dumps(list(labels.values()))] = [
+                    getattr(child, 'created', None),
+                    {str(index): list(exemplar) for index, exemplar in exemplars.items()},
+                ]
+            state[name] = series
+        return state
+
+    def _flush_openmetrics(self):
+        data = json.dumps(self._openmetrics_state(), separators=(',', ':'))
+        if data == self._openmetrics_written:
+            return
+        # Readers see either the old file or the new one, never a partial write
+        temporary = self._openmetrics_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temporary, self._openmetrics_path)
+        self._openmetrics_written = data
+
+    def _gauge_modes(self):
+        modes = {}
+        for name, _, metric_type, metric in self.registry.collect():
+            if metric_type == 'gauge':
+                prototype = metric.prototype() if isinstance(metric, Family) else metric
+                modes[name] = prototype.multiprocess_mode
+        return modes
+
+    def collect(self):
+        """Merge every worker's files into a registry snapshot"""
+        self.flush()
+        modes = self._gauge_modes()
+        merged = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.db'))):
+            is_gauge = os.path.basename(path).startswith('gauges_')
+            try:
+                values = read_values(path)
+            except (OSError, ValueError, UnicodeDecodeError):
+                continue
+            for key, value in values.items():
+                name, labels, field = json.loads(key)
+                if value.is_integer():
+                    value = int(value)
+                state = merged.setdefault(name, {}).setdefault(tuple(labels), {})
+                if field not in state:
+                    state[field] = value
+                elif not is_gauge or modes.get(name) == 'sum':
+                    state[field] += value
+                elif modes.get(name) == 'min':
+                    state[field] = min(state[field], value)
+                else:
+                    state[field] = max(state[field], value)
+        return merged
+
+    def collect_openmetrics(self):
+        """{name: {label values: (created, {sample index: exemplar})}} merged across workers.
+
+        Call after ``collect()``, which flushes this worker's own state.
+        """
+        merged = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, 'openmetrics_*.json'))):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, series in data.items():
+                for key, (created, exemplars) in series.items():
+                    entry = merged.setdefault(name, {}).setdefault(tuple(json.loads(key)), [None, {}])
+                    if created is not None and (entry[0] is None or created < entry[0]):
+                        entry[0] = created
+                    for index, (labels, value, timestamp) in exemplars.items():
+                        current = entry[1].get(int(index))
+                        if current is None or timestamp > current[2]:
+                            entry[1][int(index)] = (labels, value, timestamp)
+        return {name: {key: tuple(entry) for key, entry in series.items()}
+                for name, series in merged.items()}
+
+    def render(self):
+        return self.registry.render(self.collect())
+
+
+def exporter_for(registry, directory=None):
+    """Return the object /metrics should render from.
+
+    That is the registry itself in a single process, or a started
+    MultiProcessCollector when ``METRICS_MULTIPROC_DIR`` is set.
+    """
+    directory = directory or os.getenv('METRICS_MULTIPROC_DIR')
+    if not directory:
+        return registry
+    os.makedirs(directory, exist_ok=True)
+    return MultiProcessCollector(registry, directory).start()
+
+
+def flush_all():
+    """Flush every collector in this process (e.g. from a worker-exit hook)"""
+    for collector in list(_collectors):
+        collector.flush()
+
+
+def mark_process_dead(pid, directory=None):
+    """Drop a dead worker's gauges and summary windows; its totals are kept so they stay monotonic"""
+    directory = directory or os.environ['METRICS_MULTIPROC_DIR']
+    for prefix in ('gauges', 'windows'):
+        path = os.path.join(directory, f'{prefix}_{pid}.db')
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def reset_directory(directory=None):
+    """Create an empty metrics directory before the first worker starts"""
+    directory = directory or os.environ['METRICS_MULTIPROC_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for pattern in ('*.db', '*.json'):
+        for path in glob.glob(os.path.join(directory, pattern)):
+            os.remove(path)
+
+
+atexit.register(flush_all)
@@ -0,0 +1,98 @@
+"""Minimal local OTLP/HTTP trace collector for development.
+
+Accepts OTLP JSON on POST /v1/traces and appends one JSON line per span
+(the same fields FileSink writes) to ``--output``, or prints them:
+
+    python -m telemetry.otlp_stub --port 4318 --output spans.jsonl
+    TRACE_EXPORT=http://localhost:4318/v1/traces python backend/app.py
+"""
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _attribute_value(value):
+    for key in ('stringValue', 'boolValue', 'doubleValue'):
+        if key in value:
+            return value[key]
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return None
+
+
+def spans_from_otlp(payload):
+    """Flatten an OTLP/JSON ExportTraceServiceRequest into span records"""
+    kinds = {1: 'internal', 2: 'server', 3: 'client'}
+    for resource_spans in payload.get('resourceSpans', []):
+        resource = {a['key']: _attribute_value(a['value'])
+                    for a in resource_spans.get('resource', {}).get('attributes', [])}
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            for span in scope_spans.get('spans', []):
+                start, end = int(span['startTimeUnixNano']), int(span['endTimeUnixNano'])
+                yield {
+                    'trace_id': span['traceId'],
+                    'span_id': span['spanId'],
+                    'parent_id': span.get('parentSpanId') or None,
+                    'service': resource.get('service.name'),
+                    'name': span['name'],
+                    'kind': kinds.get(span.get('kind'), 'internal'),
+                    'start': start / 1e9,
+                    'duration_ms': round((end - start) / 1e6, 3),
+                    'error': span.get('status', {}).get('code') == 2,
+                    'attributes': {a['key']: _attribute_value(a['value'])
+                                   for a in span.get('attributes', [])},
+                }
+
+
+def make_handler(output):
+    lock = threading.Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_error(404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n'
+                                for record in spans_from_otlp(payload))
+            except (ValueError, KeyError, TypeError):
+                self.send_error(400)
+                return
+            with lock:
+                output.write(lines)
+                output.flush()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, format, *args):
+            pass
+
+    return CollectorHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4318)
+    parser.add_argument('--output', help='append span JSON lines here instead of stdout')
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(output))
+    print(f"OTLP collector stub listening on http://{args.host}:{args.port}/v1/traces", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
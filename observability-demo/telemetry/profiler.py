@@ -0,0 +1,247 @@
+"""In-process sampling profiler with collapsed-stack output.
+
+A profile samples the Python stack of every thread ``hz`` times a second
+(``sys._current_frames``) and counts identical stacks. The result is the
+collapsed-stack format, one ``root;caller;callee count`` line per stack,
+which flamegraph.pl, inferno and speedscope read directly. Frames are
+named ``function (package/file.py:first_line)`` and each stack is rooted
+at its thread's name with the digits replaced by ``N``, so pool threads
+add up into one tower.
+
+Nothing runs while no profile is being taken. On-demand profiles sample
+from the requesting thread itself, one at a time. The optional continuous
+mode runs one low-rate sampler thread and keeps the last
+``history_seconds`` as a ring of ``slice_seconds`` slices.
+"""
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+MAX_DEPTH = 128
+CONTENT_TYPE_COLLAPSED = 'text/plain; charset=utf-8'
+
+_frame_labels = {}
+_DIGITS = re.compile(r'\d+')
+
+
+def frame_label(code):
+    """``function (package/file.py:line)`` for a code object, cached"""
+    label = _frame_labels.get(code)
+    if label is None:
+        parts = code.co_filename.replace('\\', '/').rsplit('/', 2)
+        label = _frame_labels[code] = f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+    return label
+
+
+def thread_label(name):
+    return _DIGITS.sub('N', name)
+
+
+def sample_stacks(counts, skip=()):
+    """Add the current stack of every thread not in ``skip`` (idents) to ``counts``"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for ident, frame in sys._current_frames().items():
+        if ident in skip:
+            continue
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            stack.append(frame_label(frame.f_code))
+            frame = frame.f_back
+        stack.append(thread_label(names.get(ident, 'unknown')))
+        stack.reverse()
+        counts[';'.join(stack)] += 1
+
+
+def collapse(counts):
+    """Collapsed-stack text, most frequent stacks first"""
+    return ''.join(f'{stack} {count}\n' for stack, count in counts.most_common())
+
+
+class ProfilerMetrics:
+    """Samples taken and time spent taking them, by mode, exported on /metrics"""
+
+    def __init__(self, registry):
+        self.samples = registry.counter(
+            'profiler_samples_total', 'Stack samples taken, by profiling mode', ['mode'])
+        self.sampling = registry.counter(
+            'profiler_sampling_seconds_total', 'Time spent sampling stacks, by profiling mode', ['mode'])
+
+
+class ProfilerBusy(Exception):
+    """Raised by ``profile`` while another on-demand profile is running"""
+
+
+class SamplingProfiler:
+    """On-demand and continuous stack sampling for one process.
+
+    ``token`` guards ``respond``: without one the endpoint answers 404,
+    and requests must send ``Authorization: Bearer <token>``.
+    """
+
+    def __init__(self, token=None, max_seconds=60, max_hz=1000, continuous_hz=0,
+                 history_seconds=300, slice_seconds=10, registry=None):
+        self.token = token
+        self.max_seconds = max_seconds
+        self.max_hz = max_hz
+        self.continuous_hz = continuous_hz
+        self.slice_seconds = slice_seconds
+        self.history_seconds = history_seconds
+        self._slices = deque(maxlen=max(1, int(history_seconds // slice_seconds)))
+        self._current = Counter()
+        self._history_lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        metrics = ProfilerMetrics(registry) if registry is not None else None
+        self._samples = {}
+        self._sampling = {}
+        if metrics is not None:
+            for mode in ('on_demand', 'continuous'):
+                self._samples[mode] = metrics.samples.labels(mode=mode)
+                self._sampling[mode] = metrics.sampling.labels(mode=mode)
+
+    def _sample(self, counts, skip, mode):
+        started = time.perf_counter()
+        sample_stacks(counts, skip)
+        if mode in self._samples:
+            self._samples[mode].inc()
+            self._sampling[mode].inc(time.perf_counter() - started)
+
+    def profile(self, seconds, hz):
+        """Sample every other thread for ``seconds`` at ``hz``; a Counter of stacks"""
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy('a profile is already running')
+        try:
+            counts = Counter()
+            skip = {threading.get_ident()}
+            if self._thread is not None:
+                skip.add(self._thread.ident)
+            interval = 1 / hz
+            deadline = time.monotonic() + seconds
+            next_sample = time.monotonic()
+            while next_sample < deadline:
+                self._sample(counts, skip, 'on_demand')
+                next_sample += interval
+                delay = next_sample - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_sample = time.monotonic()  # fell behind: skip missed ticks
+            return counts
+        finally:
+            self._busy.release()
+
+    def history(self, seconds=None):
+        """Merged continuous samples of roughly the last ``seconds`` (all kept by default)"""
+        since = time.monotonic() - (seconds if seconds is not None else self.history_seconds)
+        merged = Counter()
+        with self._history_lock:
+            for ended, counts in self._slices:
+                if ended > since:
+                    merged.update(counts)
+            merged.update(self._current)
+        return merged
+
+    def start(self):
+        """Start the continuous sampler thread, when ``continuous_hz`` is set"""
+        if self.continuous_hz > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        skip = {threading.get_ident()}
+        interval = 1 / self.continuous_hz
+        slice_ends = time.monotonic() + self.slice_seconds
+        while not self._stop.wait(interval):
+            with self._history_lock:
+                self._sample(self._current, skip, 'continuous')
+                now = time.monotonic()
+                if now >= slice_ends:
+                    self._slices.append((now, self._current))
+                    self._current = Counter()
+                    slice_ends = now + self.slice_seconds
+
+    def authorized(self, authorization):
+        scheme, _, credentials = (authorization or '').partition(' ')
+        return (self.token is not None and scheme.lower() == 'bearer'
+                and hmac.compare_digest(credentials.strip().encode(), self.token.encode()))
+
+    def respond(self, query, authorization=None):
+        """Serve ``/debug/profile``: (body, status, headers).
+
+        ``?seconds=N&hz=M`` takes an on-demand profile (10 s at 100 Hz by
+        default); ``?mode=continuous&seconds=N`` returns the last N
+        seconds of the continuous profile instead, up to
+        ``history_seconds`` rather than ``max_seconds``.
+        """
+        if self.token is None:
+            return _error('Not found', 404)
+        if not self.authorized(authorization):
+            return _error('Unauthorized', 401, {'WWW-Authenticate': 'Bearer'})
+        try:
+            seconds = float(query.get('seconds', '10'))
+            hz = float(query.get('hz', '100'))
+        except ValueError:
+            return _error('seconds and hz must be numbers', 400)
+
+        mode = query.get('mode', 'on_demand')
+        if mode == 'continuous':
+            # The ring, not the on-demand cap, bounds how far back a read goes
+            if not 0 < seconds <= self.history_seconds:
+                return _error(f'seconds must be in (0, {self.history_seconds}]', 400)
+            if self._thread is None:
+                return _error('Continuous profiling is off', 409)
+            counts = self.history(seconds)
+        elif mode == 'on_demand':
+            if not 0 < seconds <= self.max_seconds or not 0 < hz <= self.max_hz:
+                return _error(f'seconds must be in (0, {self.max_seconds}] and hz in (0, {self.max_hz}]', 400)
+            try:
+                counts = self.profile(seconds, hz)
+            except ProfilerBusy as e:
+                return _error(str(e), 409)
+        else:
+            return _error('mode must be on_demand or continuous', 400)
+        headers = {'Content-Type': CONTENT_TYPE_COLLAPSED, 'Cache-Control': 'no-store',
+                   'X-Profile-Samples': str(sum(counts.values()))}
+        return collapse(counts), 200, headers
+
+
+def _error(message, status, headers=None):
+    return json.dumps({"error": message}), status, {'Content-Type': 'application/json', **(headers or {})}
+
+
+def profiler_from_env(registry=None):
+    """SamplingProfiler configured from the environment, with continuous mode started when set.
+
+    ``PROFILE_TOKEN`` enables ``/debug/profile`` (unset: 404),
+    ``PROFILE_MAX_SECONDS`` (60) caps on-demand profiles,
+    ``PROFILE_CONTINUOUS_HZ`` (0: off) is the continuous sampling rate and
+    ``PROFILE_HISTORY_SECONDS`` (300) how much of it is kept.
+    """
+    return SamplingProfiler(
+        token=os.getenv('PROFILE_TOKEN') or None,
+        max_seconds=float(os.getenv('PROFILE_MAX_SECONDS', '60')),
+        continuous_hz=float(os.getenv('PROFILE_CONTINUOUS_HZ', '0')),
+        history_seconds=float(os.getenv('PROFILE_HISTORY_SECONDS', '300')),
+        registry=registry,
+    ).start()
+
+
+def profile_flask_app(app, profiler, rule='/debug/profile'):
+    """Serve ``profiler.respond`` on ``rule`` of a Flask app"""
+    from flask import request
+
+    def debug_profile():
+        return profiler.respond(request.args, request.headers.get('Authorization'))
+
+    app.add_url_rule(rule, 'debug_profile', debug_profile)
+    return app
@@ -0,0 +1,191 @@
+"""Mergeable streaming quantile sketches with bounded relative error"""
+import math
+import threading
+import time
+
+from .metrics import render_samples
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch (DDSketch / HDR style).
+
+    Every value is mapped to a bucket whose width grows geometrically, so
+    any reported quantile is within ``relative_accuracy`` of the true
+    value. Memory is bounded by ``max_bins``; when exceeded the lowest
+    buckets are collapsed together, which only affects the low quantiles.
+    Two sketches with the same accuracy can be merged exactly.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048, min_value=1e-6):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._bins = {}
+        self._zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def _index(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index):
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value, count=1):
+        """Record ``value`` (seconds), ``count`` times"""
+        if value < self.min_value:
+            self._zero_count += count
+        else:
+            index = self._index(value)
+            self._bins[index] = self._bins.get(index, 0) + count
+            if len(self._bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        self.sum += value * count
+
+    def _collapse(self):
+        keys = sorted(self._bins)
+        excess = len(keys) - self.max_bins
+        target = keys[excess]
+        for key in keys[:excess]:
+            self._bins[target] += self._bins.pop(key)
+
+    def merge(self, other):
+        """Fold another sketch with the same accuracy into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, c in other._bins.items():
+            self._bins[index] = self._bins.get(index, 0) + c
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+        self._zero_count += other._zero_count
+        self.count += other.count
+        self.sum += other.sum
+
+    def clear(self):
+        self._bins.clear()
+        self._zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        """Return {q: value} for each requested quantile (0 when empty)"""
+        if not self.count:
+            return {q: 0 for q in qs}
+        ranks = sorted((q * (self.count - 1), q) for q in qs)
+        result = {}
+        seen = self._zero_count
+        items = iter(sorted(self._bins.items()))
+        index = None
+        for rank, q in ranks:
+            if rank < seen and index is None:
+                result[q] = 0
+                continue
+            while seen <= rank:
+                index, c = next(items)
+                seen += c
+            result[q] = self._value(index)
+        return result
+
+    def quantile(self, q):
+        return self.quantiles((q,))[q]
+
+    def state(self):
+        """Bin counts as an additive dict, e.g. for sharing across processes"""
+        state = {f'b{index}': c for index, c in self._bins.items()}
+        state['zero'] = self._zero_count
+        return state
+
+    def load_state(self, state):
+        """Add bin counts previously produced by state()"""
+        for key, c in state.items():
+            if not c:
+                continue
+            if key == 'zero':
+                self._zero_count += c
+            elif key.startswith('b'):
+                index = int(key[1:])
+                self._bins[index] = self._bins.get(index, 0) + c
+            else:
+                continue
+            self.count += c
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+
+
+class WindowedQuantiles:
+    """Quantile sketch over a sliding time window.
+
+    The window is split into ``slices`` sub-sketches kept in a ring; old
+    slices are reset as time moves on, so quantiles reflect only the last
+    ``window_seconds``. Sum and count are kept cumulative so the series can
+    be exported as a Prometheus summary.
+    """
+
+    def __init__(self, window_seconds=300, slices=5, relative_accuracy=0.01,
+                 clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self.relative_accuracy = relative_accuracy
+        self._slice_seconds = window_seconds / slices
+        self._sketches = [QuantileSketch(relative_accuracy) for _ in range(slices)]
+        self._epochs = [None] * slices
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.created = time.time()
+
+    def observe(self, value):
+        epoch = int(self._clock() // self._slice_seconds)
+        position = epoch % len(self._sketches)
+        with self._lock:
+            sketch = self._sketches[position]
+            if self._epochs[position] != epoch:
+                sketch.clear()
+                self._epochs[position] = epoch
+            sketch.add(value)
+            self.count += 1
+            self.sum += value
+
+    def merged(self):
+        """Return a single sketch covering the current window"""
+        oldest = int(self._clock() // self._slice_seconds) - len(self._sketches)
+        result = QuantileSketch(self.relative_accuracy)
+        with self._lock:
+            for epoch, sketch in zip(self._epochs, self._sketches):
+                if epoch is not None and epoch > oldest:
+                    result.merge(sketch)
+        return result
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        return self.merged().quantiles(qs)
+
+    def state(self):
+        """Windowed bin counts plus the cumulative sum and count"""
+        state = {f'w{key}': c for key, c in self.merged().state().items()}
+        state['sum'] = self.sum
+        state['count'] = self.count
+        return state
+
+    def sample_layout(self, name, qs=DEFAULT_QUANTILES):
+        layout = [(name, {'quantile': q}) for q in qs]
+        layout += [(f'{name}_sum', None), (f'{name}_count', None)]
+        return layout
+
+    def sample_values(self, state, qs=DEFAULT_QUANTILES):
+        """Windowed quantiles, then the cumulative sum and count, from a state()"""
+        sketch = QuantileSketch(self.relative_accuracy)
+        sketch.load_state({key[1:]: c for key, c in state.items() if key.startswith('w')})
+        values = sketch.quantiles(qs)
+        return [values[q] for q in qs] + [state.get('sum', 0), state.get('count', 0)]
+
+    def render(self, name, labels=None, state=None, qs=DEFAULT_QUANTILES):
+        """Render Prometheus summary exposition lines for this window"""
+        state = self.state() if state is None else state
+        return render_samples(labels, self.sample_layout(name, qs), self.sample_values(state, qs))
@@ -0,0 +1,77 @@
+"""Registry that groups metrics and renders them for /metrics"""
+import threading
+
+from .histogram import DEFAULT_BUCKETS, Histogram
+from .metrics import Counter, Family, Gauge
+from .quantiles import WindowedQuantiles
+
+
+class Registry:
+    """Collection of named metrics rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._names = set()
+        self._lock = threading.Lock()
+
+    def register(self, name, documentation, metric_type, factory, labelnames=()):
+        """Create and register a metric (a Family when labels are given)"""
+        metric = Family(factory, labelnames) if labelnames else factory()
+        with self._lock:
+            if name in self._names:
+                raise ValueError(f"Metric {name} already registered")
+            self._names.add(name)
+            self._metrics.append((name, documentation, metric_type, metric))
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(name, documentation, 'counter', Counter, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), multiprocess_mode='max'):
+        return self.register(name, documentation, 'gauge',
+                             lambda: Gauge(multiprocess_mode), labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=None):
+        buckets = buckets or DEFAULT_BUCKETS
+        return self.register(name, documentation, 'histogram',
+                             lambda: Histogram(buckets), labelnames)
+
+    def summary(self, name, documentation, labelnames=(), window_seconds=300):
+        return self.register(name, documentation, 'summary',
+                             lambda: WindowedQuantiles(window_seconds=window_seconds),
+                             labelnames)
+
+    def collect(self):
+        """Snapshot of (name, documentation, type, metric) tuples"""
+        with self._lock:
+            return list(self._metrics)
+
+    def snapshot(self):
+        """Return {name: {label values: state}} for every registered metric"""
+        snapshot = {}
+        for name, _, _, metric in self.collect():
+            if isinstance(metric, Family):
+                snapshot[name] = {tuple(labels.values()): child.state()
+                                  for labels, child in metric.items()}
+            else:
+                snapshot[name] = {(): metric.state()}
+        return snapshot
+
+    def render(self, snapshot=None):
+        """Render every registered metric in Prometheus text format.
+
+        ``snapshot`` defaults to this process's own values; pass a merged
+        snapshot to render metrics aggregated from several processes.
+        """
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        blocks = []
+        for name, documentation, metric_type, metric in self.collect():
+            if isinstance(metric, Family):
+                prototype, labelnames = metric.prototype(), metric.labelnames
+            else:
+                prototype, labelnames = metric, ()
+            lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}']
+            for key, state in snapshot.get(name, {}).items():
+                lines.append(prototype.render(name, dict(zip(labelnames, key)), state))
+            blocks.append('\n'.join(lines))
+        return '\n\n'.join(blocks) + '\n'
@@ -0,0 +1,253 @@
+"""Process and Python runtime metrics, read at scrape time.
+
+Uptime, CPU seconds, memory, file descriptors and threads come from one
+read of ``/proc/self/stat`` plus a listing of ``/proc/self/fd``; other
+platforms fall back to ``os.times`` and ``resource``. Readings are
+cached for ``cache_seconds``, so a scrape, or a multi-process flush,
+costs at most one read per interval however many gauges it renders.
+GC collections and pause times are recorded by a ``gc.callbacks`` hook
+as they happen, and the request thread pool's utilization is its busy
+threads over its size.
+"""
+import gc
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from .histogram import Histogram
+from .metrics import Counter, _Shards
+
+GC_PAUSE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+_collectors = weakref.WeakSet()
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _boot_time():
+    try:
+        with open('/proc/stat', 'rb') as f:
+            for line in f:
+                if line.startswith(b'btime '):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class _ReadCounter(Counter):
+    """Counter whose value is read from a monotonic source at scrape time"""
+
+    _function = None
+
+    def set_function(self, function):
+        self._function = function
+
+    def value(self):
+        return self._function() if self._function is not None else super().value()
+
+
+class _CollectorShards(_Shards):
+    """Thread shards plus one cell that only garbage collections write.
+
+    The interpreter runs one collection at a time, so the cell has a
+    single writer and, like a thread's own cell, needs no lock.
+    """
+
+    def __init__(self, size):
+        super().__init__(size)
+        self.collector_cell = [0] * size
+
+    def merged(self):
+        total = super().merged()
+        for i, v in enumerate(self.collector_cell):
+            total[i] += v
+        return total
+
+
+class _GCPauseHistogram(Histogram):
+    """Histogram that can be fed from a ``gc.callbacks`` hook.
+
+    A GC callback can run while its thread holds any lock, including the
+    shards' own, so ``observe_pause`` writes straight into a dedicated
+    cell instead of registering a thread cell. Memory stays fixed however
+    long nobody reads the histogram.
+    """
+
+    def __init__(self, buckets):
+        super().__init__(buckets)
+        self._shards = _CollectorShards(len(self.buckets) + 1)
+
+    def observe_pause(self, value):
+        cell = self._shards.collector_cell
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+
+class ProcessReader:
+    """Cached readings of this process's resource usage"""
+
+    def __init__(self, cache_seconds=1.0, proc='/proc/self'):
+        self.cache_seconds = cache_seconds
+        self.proc = proc
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self._has_proc = os.path.exists(os.path.join(proc, 'stat'))
+        self._start_time = time.time()
+        if self._has_proc:
+            boot = _boot_time()
+            stat = self._read_stat()
+            if boot is not None and stat is not None:
+                self._start_time = boot + int(stat[19]) / self._ticks
+        self._readings = {}
+        self._read_at = None
+        self._lock = threading.Lock()
+
+    def _read_stat(self):
+        try:
+            with open(os.path.join(self.proc, 'stat'), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        # The command name may contain spaces; fields resume after its ')'
+        return data[data.rindex(b')') + 2:].split()
+
+    def _read(self):
+        readings = {'start_time': self._start_time}
+        stat = self._read_stat() if self._has_proc else None
+        if stat is not None:
+            readings.update(
+                cpu_user=int(stat[11]) / self._ticks,
+                cpu_system=int(stat[12]) / self._ticks,
+                threads=int(stat[17]),
+                virtual_memory=int(stat[20]),
+                resident_memory=int(stat[21]) * self._page_size,
+            )
+            try:
+                readings['open_fds'] = len(os.listdir(os.path.join(self.proc, 'fd')))
+            except OSError:
+                pass
+        else:
+            times = os.times()
+            readings.update(cpu_user=times.user, cpu_system=times.system,
+                            threads=threading.active_count())
+            if resource is not None:
+                # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+                readings['resident_memory'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        if resource is not None:
+            readings['max_fds'] = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        return readings
+
+    def readings(self):
+        """{field: value}, read at most once per ``cache_seconds``"""
+        now = time.monotonic()
+        with self._lock:
+            if self._read_at is None or now - self._read_at >= self.cache_seconds:
+                self._readings = self._read()
+                self._read_at = now
+            return self._readings
+
+    def get(self, field):
+        return self.readings().get(field, 0)
+
+
+class RuntimeMetrics:
+    """``process_*`` and ``python_gc_*`` metrics plus request thread pool utilization.
+
+    ``busy`` returns the requests being served (e.g. a RequestMetrics
+    ``in_flight`` gauge's value) and ``request_threads`` is the size of
+    the pool serving them, when there is a fixed one.
+    """
+
+    def __init__(self, registry, cache_seconds=1.0, busy=None, request_threads=None):
+        self.reader = reader = ProcessReader(cache_seconds)
+        self.request_threads = request_threads
+        self._busy = busy
+
+        registry.gauge('process_start_time_seconds', 'Start time of the process since the epoch',
+                       multiprocess_mode='min').set_function(lambda: reader.get('start_time'))
+        registry.gauge('process_uptime_seconds', 'Seconds since the process started').set_function(
+            lambda: time.time() - reader.get('start_time'))
+        cpu = registry.register('process_cpu_seconds_total', 'CPU time used by the process, by mode',
+                                'counter', _ReadCounter, ['mode'])
+        for mode in ('user', 'system'):
+            cpu.labels(mode=mode).set_function(lambda mode=mode: reader.get(f'cpu_{mode}'))
+        for name, field, documentation in (
+                ('process_resident_memory_bytes', 'resident_memory', 'Resident set size'),
+                ('process_virtual_memory_bytes', 'virtual_memory', 'Virtual memory size'),
+                ('process_open_fds', 'open_fds', 'Open file descriptors'),
+                ('process_threads', 'threads', 'OS threads in the process')):
+            registry.gauge(name, documentation, multiprocess_mode='sum').set_function(
+                lambda field=field: reader.get(field))
+        registry.gauge('process_max_fds', 'Limit on open file descriptors',
+                       multiprocess_mode='min').set_function(lambda: reader.get('max_fds'))
+
+        collections = registry.register('python_gc_collections_total', 'Garbage collections, by generation',
+                                        'counter', _ReadCounter, ['generation'])
+        pauses = registry.register(
+            'python_gc_pause_seconds', 'Time the interpreter was stopped for garbage collection',
+            'histogram', lambda: _GCPauseHistogram(GC_PAUSE_BUCKETS), ['generation'])
+        self._pauses = []
+        for generation in range(len(gc.get_stats())):
+            collections.labels(generation=generation).set_function(
+                lambda generation=generation: gc.get_stats()[generation]['collections'])
+            self._pauses.append(pauses.labels(generation=generation))
+        self._gc_started = None
+        gc.callbacks.append(self._on_gc)
+
+        registry.gauge('request_threads_busy', 'Request threads serving a request',
+                       multiprocess_mode='sum').set_function(self.busy)
+        registry.gauge('request_threads_max', 'Size of the request thread pool, 0 when unbounded',
+                       multiprocess_mode='sum').set_function(lambda: self.request_threads or 0)
+        registry.gauge('request_threads_utilization',
+                       'Busy share of the request thread pool').set_function(self.utilization)
+        _collectors.add(self)
+
+    def _on_gc(self, phase, info):
+        # Runs inside the collector, on whichever thread triggered it
+        if phase == 'start':
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            self._pauses[info['generation']].observe_pause(time.perf_counter() - self._gc_started)
+            self._gc_started = None
+
+    def busy(self):
+        return self._busy() if self._busy is not None else 0
+
+    def utilization(self):
+        """Busy threads over pool size (0 without a fixed pool)"""
+        if not self.request_threads:
+            return 0
+        return min(1.0, self.busy() / self.request_threads)
+
+    def close(self):
+        """Stop recording GC pauses"""
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+
+
+def runtime_from_env(registry, busy=None):
+    """RuntimeMetrics configured from the environment.
+
+    ``RUNTIME_METRICS_CACHE_SECONDS`` (1.0) is how long readings are
+    reused and ``REQUEST_THREADS`` the request thread pool size (unset:
+    unknown until a server hook calls ``set_request_threads``).
+    """
+    threads = os.getenv('REQUEST_THREADS')
+    return RuntimeMetrics(
+        registry,
+        cache_seconds=float(os.getenv('RUNTIME_METRICS_CACHE_SECONDS', '1.0')),
+        busy=busy,
+        request_threads=int(threads) if threads else None,
+    )
+
+
+def set_request_threads(threads):
+    """Set the pool size of every RuntimeMetrics in this process (e.g. from a worker-init hook)"""
+    for collector in list(_collectors):
+        collector.request_threads = threads
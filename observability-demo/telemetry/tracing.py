@@ -0,0 +1,388 @@
+"""Lightweight distributed tracing with W3C trace-context propagation.
+
+Spans are created per request (``trace_flask_app``, or by hand with
+``Tracer.start_span``) and for outgoing calls, which send the span as a
+``traceparent`` header. Sampling is decided once, at the root of a trace:
+a new trace is sampled with probability ``sample_rate``, and everything
+downstream follows the flag carried in ``traceparent``. Unsampled spans
+still propagate context but are never recorded.
+
+Finished sampled spans go into a fixed-size ring buffer; when it is full
+the oldest span is overwritten (and counted). A BatchExporter thread
+drains the buffer every ``interval`` seconds and hands batches to a sink:
+JSON lines in a local file, or OTLP/HTTP JSON to a collector such as
+``python -m telemetry.otlp_stub``.
+"""
+import atexit
+import collections
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_exporters = []
+
+# OTLP span kinds
+_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+
+def parse_traceparent(header):
+    """(trace_id, parent span_id, sampled) from a ``traceparent`` header, or None if invalid"""
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) < 4:
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    if (len(version) != 2 or version == 'ff' or (version == '00' and len(parts) != 4)
+            or len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2):
+        return None
+    try:
+        if int(trace_id, 16) == 0 or int(span_id, 16) == 0:
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id.lower(), span_id.lower(), sampled
+
+
+class TraceMetrics:
+    """Span counters for /metrics"""
+
+    def __init__(self, registry):
+        self.started = registry.counter(
+            'tracing_spans_started_total', 'Spans started, by sampling decision', ['sampled'])
+        self.exported = registry.counter('tracing_spans_exported_total', 'Spans handed to the trace sink')
+        self.dropped = registry.counter(
+            'tracing_spans_dropped_total', 'Sampled spans never exported, by reason', ['reason'])
+        for reason in ('buffer_full', 'export_failed'):
+            self.dropped.labels(reason=reason)
+        self.buffered = registry.gauge(
+            'tracing_buffer_spans', 'Finished spans waiting for export', multiprocess_mode='sum')
+
+
+class Span:
+    """One timed operation in a trace; use as a context manager or call ``end()``"""
+
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'kind', 'sampled',
+                 'start_ns', 'end_ns', 'attributes', 'error', '_token')
+
+    def __init__(self, tracer, trace_id, span_id, parent_id, name, kind, sampled, attributes):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {}) if sampled else {}
+        self.error = False
+        self._token = None
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-{"01" if self.sampled else "00"}'
+
+    def set_attribute(self, key, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_error(self, error=True):
+        self.error = error
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled:
+                self.tracer._record(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.error = True
+            self.set_attribute('exception.type', exc_type.__name__)
+        self.end()
+        _current_span.reset(self._token)
+
+
+class Tracer:
+    """Creates spans for one service and buffers the finished sampled ones.
+
+    ``recording`` is off until an exporter is attached, so a service with
+    no sink still propagates context without keeping anything.
+    """
+
+    def __init__(self, service, sample_rate=1.0, buffer_size=4096, registry=None):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.recording = False
+        self._buffer = collections.deque(maxlen=buffer_size)
+        self.metrics = TraceMetrics(registry) if registry is not None else None
+        if self.metrics is not None:
+            self._sampled = self.metrics.started.labels(sampled='true')
+            self._unsampled = self.metrics.started.labels(sampled='false')
+            self._overwritten = self.metrics.dropped.labels(reason='buffer_full')
+            self.metrics.buffered.set_function(lambda: len(self._buffer))
+
+    @staticmethod
+    def current():
+        """The active span in this thread or task, if any"""
+        return _current_span.get()
+
+    @staticmethod
+    def exemplar():
+        """{'trace_id': ...} of the active span for a metric exemplar, if it is sampled.
+
+        Unsampled traces are never exported, so an exemplar pointing at
+        one would lead nowhere.
+        """
+        span = _current_span.get()
+        if span is not None and span.sampled:
+            return {'trace_id': span.trace_id}
+        return None
+
+    def start_span(self, name, kind='internal', traceparent=None, parent=None, attributes=None):
+        """Start a span under ``traceparent`` (an incoming header), ``parent``, or the active span"""
+        context = parse_traceparent(traceparent) if traceparent else None
+        if context is None and parent is None:
+            parent = _current_span.get()
+        if context is not None:
+            trace_id, parent_id, sampled = context
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id = f'{random.getrandbits(128):032x}', None
+            sampled = random.random() < self.sample_rate
+        span = Span(self, trace_id, f'{random.getrandbits(64):016x}', parent_id, name, kind,
+                    sampled, attributes)
+        if self.metrics is not None:
+            (self._sampled if sampled else self._unsampled).inc()
+        return span
+
+    @staticmethod
+    def activate(span):
+        """Make ``span`` the active span; returns a token for ``deactivate``"""
+        return _current_span.set(span)
+
+    @staticmethod
+    def deactivate(token):
+        _current_span.reset(token)
+
+    def _record(self, span):
+        if not self.recording:
+            return
+        if len(self._buffer) == self._buffer.maxlen and self.metrics is not None:
+            self._overwritten.inc()
+        self._buffer.append(span)
+
+    def drain(self, limit):
+        """Remove and return up to ``limit`` buffered spans, oldest first"""
+        batch = []
+        try:
+            while len(batch) < limit:
+                batch.append(self._buffer.popleft())
+        except IndexError:
+            pass
+        return batch
+
+
+def span_record(span, service):
+    """Flat dict for one span, as written by FileSink"""
+    return {
+        'trace_id': span.trace_id,
+        'span_id': span.span_id,
+        'parent_id': span.parent_id,
+        'service': service,
+        'name': span.name,
+        'kind': span.kind,
+        'start': span.start_ns / 1e9,
+        'duration_ms': round((span.end_ns - span.start_ns) / 1e6, 3),
+        'error': span.error,
+        'attributes': span.attributes,
+    }
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_payload(spans, service):
+    """OTLP/JSON ExportTraceServiceRequest for a batch of spans"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service}}]},
+        'scopeSpans': [{
+            'scope': {'name': 'telemetry.tracing'},
+            'spans': [{
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                **({'parentSpanId': span.parent_id} if span.parent_id else {}),
+                'name': span.name,
+                'kind': _KINDS[span.kind],
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns),
+                'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items()],
+                'status': {'code': 2 if span.error else 0},
+            } for span in spans],
+        }],
+    }]}
+
+
+class FileSink:
+    """Appends spans as JSON lines; each batch is a single write, so workers can share a file"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, spans, service):
+        lines = ''.join(json.dumps(span_record(span, service), separators=(',', ':')) + '\n'
+                        for span in spans)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+class OtlpHttpSink:
+    """POSTs batches as OTLP/HTTP JSON, e.g. to http://localhost:4318/v1/traces"""
+
+    def __init__(self, url, timeout=2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, spans, service):
+        body = json.dumps(otlp_payload(spans, service), separators=(',', ':')).encode('utf-8')
+        request = urllib.request.Request(
+            self.url, data=body, method='POST', headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def sink_for(spec):
+    """Sink for a TRACE_EXPORT value: an http(s) URL for OTLP, else a file path"""
+    if not spec:
+        return None
+    if spec.startswith(('http://', 'https://')):
+        return OtlpHttpSink(spec)
+    return FileSink(spec[len('file:'):] if spec.startswith('file:') else spec)
+
+
+class BatchExporter:
+    """Background thread that drains a tracer's buffer into a sink in batches"""
+
+    def __init__(self, tracer, sink, interval=1.0, batch_size=512):
+        self.tracer = tracer
+        self.sink = sink
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        metrics = tracer.metrics
+        self._exported = metrics.exported if metrics is not None else None
+        self._failed = metrics.dropped.labels(reason='export_failed') if metrics is not None else None
+
+    def start(self):
+        self.tracer.recording = True
+        thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+        thread.start()
+        _exporters.append(self)
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Export everything buffered so far"""
+        with self._lock:
+            while True:
+                batch = self.tracer.drain(self.batch_size)
+                if not batch:
+                    return
+                try:
+                    self.sink(batch, self.tracer.service)
+                except Exception:
+                    if self._failed is not None:
+                        self._failed.inc(len(batch))
+                else:
+                    if self._exported is not None:
+                        self._exported.inc(len(batch))
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+
+def tracer_from_env(service, registry=None):
+    """Tracer configured from the environment, with its exporter started when there is a sink.
+
+    ``TRACE_SAMPLE_RATE`` (0.1) is the fraction of new traces recorded,
+    ``TRACE_EXPORT`` a file path or OTLP/HTTP URL (unset: propagate only),
+    ``TRACE_BUFFER_SIZE`` (4096) the ring buffer size and
+    ``TRACE_EXPORT_INTERVAL`` (1.0) the seconds between batches.
+    """
+    tracer = Tracer(service, sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+                    buffer_size=int(os.getenv('TRACE_BUFFER_SIZE', '4096')), registry=registry)
+    sink = sink_for(os.getenv('TRACE_EXPORT'))
+    if sink is not None:
+        BatchExporter(tracer, sink, interval=float(os.getenv('TRACE_EXPORT_INTERVAL', '1.0'))).start()
+    return tracer
+
+
+def trace_flask_app(app, tracer):
+    """Run every request of a Flask app in a server span continued from its ``traceparent``"""
+    from flask import request
+
+    @app.before_request
+    def _start_trace_span():
+        # Resolve the request proxy once; the span lives in the WSGI environ
+        current = request._get_current_object()
+        route = current.url_rule.rule if current.url_rule is not None else 'unmatched'
+        span = tracer.start_span(
+            f'{current.method} {route}', kind='server', traceparent=current.environ.get('HTTP_TRACEPARENT'),
+            attributes={'http.method': current.method, 'http.route': route})
+        current.environ['telemetry.span'] = (span, tracer.activate(span))
+
+    @app.after_request
+    def _trace_status(response):
+        entry = request.environ.get('telemetry.span')
+        if entry is not None:
+            entry[0].set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                entry[0].set_error()
+        return response
+
+    @app.teardown_request
+    def _end_trace_span(exc):
+        entry = request.environ.pop('telemetry.span', None)
+        if entry is None:
+            return
+        span, token = entry
+        if exc is not None:
+            span.set_error()
+            span.set_attribute('exception.type', type(exc).__name__)
+        span.end()
+        tracer.deactivate(token)
+
+    return app
+
+
+def stop_tracing():
+    """Export buffered spans and stop every exporter (e.g. from a worker-exit hook)"""
+    while _exporters:
+        _exporters.pop().stop()
+
+
+atexit.register(stop_tracing)
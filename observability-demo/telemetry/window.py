@@ -0,0 +1,95 @@
+"""Fixed-memory sliding-window request statistics"""
+import threading
+import time
+
+DEFAULT_WINDOWS = (60, 300, 900)
+
+
+def window_label(seconds):
+    """Short label for a window length: 60 -> '1m', 900 -> '15m', 90 -> '90s'"""
+    if seconds % 3600 == 0:
+        return f'{seconds // 3600}h'
+    if seconds % 60 == 0:
+        return f'{seconds // 60}m'
+    return f'{seconds}s'
+
+
+class _Ring:
+    """One window split into ``slots`` time slots, reused as time moves on"""
+
+    def __init__(self, window_seconds, slots):
+        self.window_seconds = window_seconds
+        self.slot_seconds = window_seconds / slots
+        self.epochs = [None] * slots
+        self.counts = [0] * slots
+        self.errors = [0] * slots
+        self.sums = [0.0] * slots
+        self.maxes = [0.0] * slots
+
+    def add(self, now, value, error):
+        epoch = int(now // self.slot_seconds)
+        position = epoch % len(self.epochs)
+        if self.epochs[position] != epoch:
+            self.epochs[position] = epoch
+            self.counts[position] = self.errors[position] = 0
+            self.sums[position] = self.maxes[position] = 0.0
+        self.counts[position] += 1
+        self.errors[position] += error
+        self.sums[position] += value
+        if value > self.maxes[position]:
+            self.maxes[position] = value
+
+    def totals(self, now):
+        oldest = int(now // self.slot_seconds) - len(self.epochs)
+        count = errors = 0
+        total = peak = 0.0
+        for position, epoch in enumerate(self.epochs):
+            if epoch is not None and epoch > oldest:
+                count += self.counts[position]
+                errors += self.errors[position]
+                total += self.sums[position]
+                peak = max(peak, self.maxes[position])
+        return count, errors, total, peak
+
+
+class SlidingWindowStats:
+    """Count, errors, mean and max of observations over trailing windows.
+
+    Each window is a ring of ``slots`` time slots, so memory is fixed and
+    ``observe`` is O(1) whatever the traffic: it only touches the current
+    slot of each window. Slots older than the window are skipped when
+    reading and reset when their position comes round again. A window
+    therefore covers its length to within one slot, like a Prometheus
+    ``rate()`` over the same range.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, slots=60, clock=time.monotonic):
+        self.windows = tuple(windows)
+        self._rings = {seconds: _Ring(seconds, slots) for seconds in self.windows}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def observe(self, value, error=False):
+        now = self._clock()
+        with self._lock:
+            for ring in self._rings.values():
+                ring.add(now, value, bool(error))
+
+    def window(self, seconds):
+        """{count, errors, sum, mean, max, rate, error_rate} over the last ``seconds``"""
+        now = self._clock()
+        with self._lock:
+            count, errors, total, peak = self._rings[seconds].totals(now)
+        return {
+            'count': count,
+            'errors': errors,
+            'sum': total,
+            'mean': total / count if count else 0.0,
+            'max': peak,
+            'rate': count / seconds,
+            'error_rate': errors / seconds,
+        }
+
+    def summary(self):
+        """Every window's figures, keyed by label ('1m', '5m', ...)"""
+        return {window_label(seconds): self.window(seconds) for seconds in self.windows}
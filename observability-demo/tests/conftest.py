@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The services import the shared package from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,53 @@
+import sys
+import threading
+
+from telemetry import Histogram
+
+
+def test_exemplars_keep_the_slowest_of_each_bucket():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    histogram.observe(0.02, exemplar={'trace_id': 'a'})
+    histogram.observe(0.08, exemplar={'trace_id': 'b'})
+    histogram.observe(0.05, exemplar={'trace_id': 'c'})
+    histogram.observe(0.5)
+
+    exemplars = histogram.exemplars()
+
+    assert list(exemplars) == [0]
+    labels, value, _ = exemplars[0]
+    assert (labels, value) == ({'trace_id': 'b'}, 0.08)
+
+
+def test_exemplars_can_be_read_while_observing():
+    histogram = Histogram()
+    errors = []
+    stop = threading.Event()
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+
+    def observe(index):
+        for _ in range(5000):
+            histogram.observe(0.01, exemplar={'trace_id': str(index)})
+
+    def read():
+        while not stop.is_set():
+            try:
+                histogram.exemplars()
+            except RuntimeError as e:  # deque mutated during iteration
+                errors.append(e)
+
+    try:
+        reader = threading.Thread(target=read)
+        reader.start()
+        writers = [threading.Thread(target=observe, args=(i,)) for i in range(8)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        stop.set()
+        reader.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+    assert histogram.count == 8 * 5000
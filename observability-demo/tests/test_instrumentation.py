@@ -0,0 +1,43 @@
+import multiprocessing
+
+import pytest
+
+from telemetry import MultiProcessCollector, Registry, RequestMetrics
+
+fork = multiprocessing.get_context('fork')
+
+
+def slow_worker(directory):
+    """Body of a forked worker: three 1 s requests, flushed to the shared directory"""
+    registry = Registry()
+    request_metrics = RequestMetrics(registry)
+    for _ in range(3):
+        request_metrics.observe('GET', '/', 200, 1.0)
+    MultiProcessCollector(registry, directory).flush()
+
+
+def test_totals_of_this_process():
+    request_metrics = RequestMetrics(Registry())
+    request_metrics.observe('GET', '/', 200, 0.1)
+    request_metrics.observe('GET', '/error', 503, 0.3)
+
+    requests, errors, mean = request_metrics.totals()
+
+    assert (requests, errors) == (2, 1)
+    assert mean == pytest.approx(0.2)
+
+
+def test_totals_of_a_merged_snapshot_cover_every_worker(tmp_path):
+    registry = Registry()
+    request_metrics = RequestMetrics(registry)
+    request_metrics.observe('GET', '/error', 500, 0.2)
+    worker = fork.Process(target=slow_worker, args=(str(tmp_path),))
+    worker.start()
+    worker.join()
+
+    merged = MultiProcessCollector(registry, str(tmp_path)).collect()
+    requests, errors, mean = request_metrics.totals(merged)
+
+    assert (requests, errors) == (4, 1)
+    assert mean == pytest.approx(0.8)
+    assert request_metrics.totals()[:2] == (1, 1)
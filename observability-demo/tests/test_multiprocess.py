@@ -0,0 +1,58 @@
+import multiprocessing
+
+from telemetry import Exposition, MultiProcessCollector, QuantileSketch, Registry
+from telemetry.multiprocess import mark_process_dead
+
+fork = multiprocessing.get_context('fork')
+
+
+def demo_registry():
+    registry = Registry()
+    latency = registry.histogram('demo_duration_seconds', 'Demo latency', ['route'])
+    quantiles = registry.summary('demo_latency_seconds', 'Demo latency quantiles')
+    return registry, latency.labels(route='/'), quantiles
+
+
+def slow_worker(directory):
+    """Body of a forked worker: slow traced requests, flushed to the shared directory"""
+    registry, latency, quantiles = demo_registry()
+    latency.observe(5.0, exemplar={'trace_id': 'b' * 32})
+    for _ in range(9):
+        quantiles.observe(5.0)
+    MultiProcessCollector(registry, directory).flush()
+
+
+def run_worker(directory):
+    worker = fork.Process(target=slow_worker, args=(str(directory),))
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+    return worker.pid
+
+
+def test_openmetrics_scrape_merges_exemplars_and_created(tmp_path):
+    registry, latency, _ = demo_registry()
+    latency.observe(0.02, exemplar={'trace_id': 'a' * 32})
+    run_worker(tmp_path)
+
+    body = Exposition(MultiProcessCollector(registry, str(tmp_path))).render(openmetrics=True).decode()
+
+    assert 'demo_duration_seconds_count{route="/"} 2' in body
+    assert body.count(' # {trace_id=') == 2
+    assert 'trace_id="' + 'b' * 32 + '"' in body
+    assert body.count('demo_duration_seconds_created{') == 1
+
+
+def test_dead_worker_keeps_totals_but_leaves_the_quantile_window(tmp_path):
+    registry, _, quantiles = demo_registry()
+    quantiles.observe(0.02)
+    pid = run_worker(tmp_path)
+    collector = MultiProcessCollector(registry, str(tmp_path))
+
+    mark_process_dead(pid, str(tmp_path))
+    merged = collector.collect()['demo_latency_seconds'][()]
+
+    window = QuantileSketch()
+    window.load_state({field[1:]: value for field, value in merged.items() if field.startswith('w')})
+    assert merged['count'] == 10
+    assert round(window.quantiles((0.5,))[0.5] * 1000) == 20
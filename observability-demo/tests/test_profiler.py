@@ -0,0 +1,27 @@
+import json
+
+from telemetry import SamplingProfiler
+
+AUTHORIZATION = 'Bearer secret'
+
+
+def test_continuous_reads_reach_back_over_the_whole_history():
+    profiler = SamplingProfiler(token='secret', max_seconds=60, continuous_hz=50,
+                                history_seconds=300).start()
+    try:
+        _, status, _ = profiler.respond({'mode': 'continuous', 'seconds': '300'}, AUTHORIZATION)
+        body, too_far, _ = profiler.respond({'mode': 'continuous', 'seconds': '301'}, AUTHORIZATION)
+    finally:
+        profiler.stop()
+
+    assert status == 200
+    assert too_far == 400
+    assert '300' in json.loads(body)['error']
+
+
+def test_on_demand_profiles_keep_their_own_cap():
+    profiler = SamplingProfiler(token='secret', max_seconds=60, history_seconds=300)
+
+    _, status, _ = profiler.respond({'seconds': '61'}, AUTHORIZATION)
+
+    assert status == 400
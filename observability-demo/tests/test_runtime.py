@@ -0,0 +1,55 @@
+import gc
+import threading
+import tracemalloc
+
+from telemetry import Registry, RuntimeMetrics
+
+
+def gc_pauses(registry):
+    histogram = registry.snapshot()['python_gc_pause_seconds']
+    return sum(value for state in histogram.values() for field, value in state.items() if field != 'sum')
+
+
+def collections_so_far():
+    return sum(generation['collections'] for generation in gc.get_stats())
+
+
+def test_every_gc_pause_is_counted():
+    registry = Registry()
+    runtime = RuntimeMetrics(registry)
+    gc.disable()  # only the collections below, none triggered by reading the counts
+    try:
+        before = gc_pauses(registry), collections_so_far()
+        collections = [threading.Thread(target=lambda: [gc.collect(0) for _ in range(500)])
+                       for _ in range(4)]
+        for thread in collections:
+            thread.start()
+        for thread in collections:
+            thread.join()
+
+        pauses, collections_after = gc_pauses(registry), collections_so_far()
+        assert collections_after - before[1] == 4 * 500
+        assert pauses - before[0] == 4 * 500
+    finally:
+        gc.enable()
+        runtime.close()
+
+
+
+def test_unread_gc_pauses_take_no_memory():
+    registry = Registry()
+    runtime = RuntimeMetrics(registry)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for _ in range(5000):
+            gc.collect(0)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        runtime.close()
+
+    only_runtime = [tracemalloc.Filter(True, '*/telemetry/runtime.py')]
+    growth = sum(stat.size_diff for stat in after.filter_traces(only_runtime).compare_to(
+        before.filter_traces(only_runtime), 'filename'))
+    assert growth < 4096